@@ -0,0 +1,185 @@
+# agents/batch.py
+"""
+Bulk plan generation for whole cohorts.
+
+Reads ScheduleState inputs from JSONL, runs the deterministic score/allocate
+steps in a process pool, sends the tips (LLM) step through a
+concurrency-limited async pool, and appends each finished plan to the output
+JSONL as soon as it completes. Re-running with the same output file skips
+plans already written with status "ok", so a crashed run resumes where it
+stopped.
+
+    python -m agents.batch students.jsonl -o plans.jsonl --workers 4 --llm-concurrency 8
+"""
+import asyncio, hashlib, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+import agents.schedule_agent as sa
+from utils.response_cache import get_response_cache
+from utils import telemetry
+
+def _line_key(n: int, line: str) -> str:
+    """Resume key of a malformed line: its number and content (fixing the line makes it new work)."""
+    return f"line-{n}:{hashlib.sha256(line.encode('utf-8')).hexdigest()[:16]}"
+
+def _read_inputs(path: str) -> Iterator[Tuple[str, Optional[Dict], Optional[str]]]:
+    """
+    (id, state, None) per input line, or (line-N, None, error) for a line that
+    isn't a JSON object, where the error record's resume key is _line_key(N, line).
+    """
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                state = json.loads(line)
+            except ValueError as e:
+                yield _line_key(n, line), None, f"{type(e).__name__}: {e}"
+                continue
+            if not isinstance(state, dict):
+                yield _line_key(n, line), None, f"TypeError: expected a JSON object, got {type(state).__name__}"
+                continue
+            yield str(state.pop("id", f"line-{n}")), state, None
+
+def _done_ids(path: str) -> Set[str]:
+    """Ids written with status "ok", plus the keys of malformed lines already reported."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:  # torn last line from a crash
+                continue
+            if rec.get("status") == "ok":
+                done.add(rec["id"])
+            elif "input_key" in rec:  # rerunning can't fix a bad input line
+                done.add(rec["input_key"])
+    return done
+
+def plan_deterministic(state: Dict) -> Dict:
+    """score -> allocate for one input (runs in worker processes)."""
+    state = {**state, **sa.score_node(state)}
+    return {**state, **sa.allocate_node(state)}
+
+class _Stage:
+    def __init__(self):
+        self.count, self.busy = 0, 0.0
+
+    def as_dict(self, wall: float) -> Dict:
+        return {"count": self.count, "busy_seconds": round(self.busy, 4),
+                "per_sec": round(self.count / wall, 2) if wall > 0 else 0.0}
+
+async def run_batch_async(
+    input_path: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    llm_concurrency: int = 8,
+    max_in_flight: int = 256,
+    skip_tips: bool = False,
+    retrieve: bool = False,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Generate plans for every input line not already in output_path.
+    Output records: {"id", "status": "ok" | "error", "state", "error"?}.
+    Lines that aren't JSON objects get an error record (no state) and the run goes on;
+    they aren't reported again on resume. A repeated input id is planned once.
+    Returns run stats with per-stage counts, busy time and throughput.
+    """
+    loop = asyncio.get_running_loop()
+    done = _done_ids(output_path)
+    llm_slots = asyncio.Semaphore(max(1, llm_concurrency))
+    in_flight = asyncio.Semaphore(max(1, max_in_flight))
+    stages = {"plan": _Stage(), "retrieve": _Stage(), "tips": _Stage()}
+    totals = {"ok": 0, "error": 0, "skipped": 0}
+    t0 = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, "a", encoding="utf-8") as out:
+        def write(rec: Dict):
+            out.write(json.dumps(rec) + "\n")
+            out.flush()  # each finished plan is durable before the next one
+            totals[rec["status"]] += 1
+            if progress:
+                progress(dict(totals, wall_seconds=round(time.perf_counter() - t0, 2)))
+
+        async def one(pid: str, state: Dict):
+            try:
+                t = time.perf_counter()
+                state = await loop.run_in_executor(pool, plan_deterministic, state)
+                stages["plan"].busy += time.perf_counter() - t
+                stages["plan"].count += 1
+                if retrieve:
+                    t = time.perf_counter()
+                    names = [s["name"] for s in state["subjects_enriched"]]
+                    state = {**state, "contexts": await asyncio.to_thread(sa.retrieve_contexts, names)}
+                    stages["retrieve"].busy += time.perf_counter() - t
+                    stages["retrieve"].count += 1
+                if not skip_tips:
+                    async with llm_slots:
+                        t = time.perf_counter()
+                        state = {**state, **await sa.tips_node_async(state)}
+                        stages["tips"].busy += time.perf_counter() - t
+                        stages["tips"].count += 1
+                write({"id": pid, "status": "ok", "state": state})
+            except Exception as e:
+                write({"id": pid, "status": "error", "error": f"{type(e).__name__}: {e}", "state": state})
+            finally:
+                in_flight.release()
+
+        tasks = set()
+        for pid, state, error in _read_inputs(input_path):
+            if pid in done:  # finished in an earlier run, or a repeated id in this one
+                totals["skipped"] += 1
+                continue
+            done.add(pid)
+            if error is not None:  # a bad line fails only its own record
+                write({"id": pid.split(":")[0], "status": "error", "error": error, "input_key": pid})
+                continue
+            await in_flight.acquire()  # bounds memory: inputs are read only as slots free up
+            task = asyncio.create_task(one(pid, state))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    wall = time.perf_counter() - t0
+    cache = get_response_cache()
+    return {
+        **totals,
+        "wall_seconds": round(wall, 4),
+        "plans_per_sec": round((totals["ok"] + totals["error"]) / wall, 2) if wall > 0 else 0.0,
+        "stages": {k: v.as_dict(wall) for k, v in stages.items() if v.count or k != "retrieve"},
+        "llm_cache": cache.stats() if cache is not None else None,
+        "spans": telemetry.summary(),  # main-process spans (LLM calls, retrieval)
+    }
+
+def run_batch(input_path: str, output_path: str, **kwargs) -> Dict:
+    """Blocking wrapper around run_batch_async (same arguments)."""
+    return asyncio.run(run_batch_async(input_path, output_path, **kwargs))
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Generate study plans for a JSONL file of ScheduleState inputs.")
+    ap.add_argument("input")
+    ap.add_argument("-o", "--output", required=True)
+    ap.add_argument("--workers", type=int, default=None, help="processes for score/allocate (default: CPU count)")
+    ap.add_argument("--llm-concurrency", type=int, default=8)
+    ap.add_argument("--max-in-flight", type=int, default=256)
+    ap.add_argument("--skip-tips", action="store_true")
+    ap.add_argument("--retrieve", action="store_true", help="run RAG retrieval against the configured index")
+    args = ap.parse_args()
+
+    def show(p):
+        print(f"ok={p['ok']} error={p['error']} skipped={p['skipped']} t={p['wall_seconds']}s", flush=True)
+
+    stats = run_batch(args.input, args.output, workers=args.workers, llm_concurrency=args.llm_concurrency,
+                      max_in_flight=args.max_in_flight, skip_tips=args.skip_tips, retrieve=args.retrieve,
+                      progress=show)
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# agents/replan.py
+"""
+Incremental replanning from logged progress.
+
+    plan = StudyPlan.from_state(agent.invoke(inputs))    # or StudyPlan.build(subjects, 30, 4.0)
+    plan.log_progress(1, {"Math": 2.0, "Physics": 0.5})  # hours actually studied on day 1
+    diff = plan.replan()                                  # days 2.. re-allocated from what's left
+
+Only the days after the last logged day are recomputed, from the vector of
+hours still remaining per subject (one vectorized allocation, no scoring or
+retrieval). Plans with constraints (availability, exam_day, max_hours_per_day,
+review) are replanned with tools.scheduler over the open days, with exam days
+shifted into that window and reviews kept on the days their subject's first
+logged study session puts them. Tips are regenerated only when the change is material: the
+overbooked flag flips, or the hours gap moves by more than
+REPLAN_TIPS_GAP_HOURS (default 2.0) since the tips were written.
+Plans round-trip through to_dict()/from_dict(), so a cohort can be kept as
+JSONL and replanned daily.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+from tools.priority_score import build_priorities
+from tools.allocate_time import allocate_time_vectorized
+from tools.plan_table import PlanTable
+from tools.scheduler import has_constraints, schedule
+from tools.tips_writer import write_tips
+from utils.telemetry import span
+
+ROUNDING_H = 0.1  # blocks are rounded to 0.1h; moves this small are rounding drift, not changes
+
+def _day_changed(before: List[Dict], after: List[Dict]) -> bool:
+    a = {b["subject"]: b["hours"] for b in before}
+    b = {x["subject"]: x["hours"] for x in after}
+    return any(abs(a.get(n, 0.0) - b.get(n, 0.0)) > ROUNDING_H + 1e-9 for n in set(a) | set(b))
+
+class StudyPlan:
+    def __init__(
+        self,
+        subjects: List[Dict[str, Any]],
+        days_left: int,
+        hours_per_day: float,
+        timetable: List[Dict[str, Any]],
+        tips: Optional[Dict[str, Any]] = None,
+        contexts: Optional[Dict[str, List[Dict]]] = None,
+        tips_gap_threshold: Optional[float] = None,
+        availability: Optional[List[float]] = None,
+        review: Optional[Dict[str, Any]] = None,
+        unmet_hours: Optional[Dict[str, float]] = None,
+    ):
+        """
+        subjects: enriched subjects (name, weight, required_hours, exam_day?, max_hours_per_day?)
+        as produced by score_node; availability and review as in the schedule graph's state.
+        """
+        self.subjects = subjects
+        self.days_left = int(days_left)
+        self.hours_per_day = float(hours_per_day)
+        self.availability = [float(h) for h in availability] if availability else None
+        self.review = review or None
+        self.unmet_hours = dict(unmet_hours or {})
+        self.timetable = timetable
+        self.tips = tips
+        self.contexts = contexts or {}
+        self.tips_gap_threshold = (float(os.getenv("REPLAN_TIPS_GAP_HOURS", "2.0"))
+                                   if tips_gap_threshold is None else tips_gap_threshold)
+        self.done: Dict[str, float] = {}         # hours logged per subject, all days
+        self.progress: Dict[int, Dict[str, float]] = {}  # day -> {subject: hours}
+        self.next_day = 1                         # first day that is still open for planning
+        self.overbooked, self.hours_gap = self._balance()
+        # the (overbooked, hours_gap) the current tips were written for
+        self.tips_basis = (self.overbooked, self.hours_gap) if tips is not None else None
+
+    # ----- construction -----
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], **kw) -> "StudyPlan":
+        """From a schedule graph result (subjects_enriched, timetable, tips, contexts, ...)."""
+        return cls(state["subjects_enriched"], state["days_left"], state["hours_per_day"], state["timetable"],
+                   tips=state.get("tips"), contexts=state.get("contexts"), availability=state.get("availability"),
+                   review=state.get("review"), unmet_hours=state.get("unmet_hours"), **kw)
+
+    @classmethod
+    def build(cls, subjects: List[Dict[str, Any]], days_left: int, hours_per_day: float,
+              availability: Optional[List[float]] = None, review: Optional[Dict[str, Any]] = None,
+              **kw) -> "StudyPlan":
+        """Score and allocate from raw subjects (no tips yet; the first replan writes them)."""
+        enriched = build_priorities(subjects, days_left)["subjects"]
+        if has_constraints(enriched, availability, review):
+            alloc = schedule(enriched, days_left, hours_per_day, availability, review)
+        else:
+            alloc = allocate_time_vectorized(enriched, days_left, hours_per_day)
+        return cls(enriched, days_left, hours_per_day, alloc["timetable"], availability=availability,
+                   review=review, unmet_hours=alloc.get("unmet_hours"), **kw)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "subjects": self.subjects, "days_left": self.days_left, "hours_per_day": self.hours_per_day,
+            "timetable": self.timetable, "tips": self.tips, "contexts": self.contexts,
+            "tips_gap_threshold": self.tips_gap_threshold, "progress": {str(d): h for d, h in self.progress.items()},
+            "next_day": self.next_day, "tips_basis": list(self.tips_basis) if self.tips_basis else None,
+            "availability": self.availability, "review": self.review, "unmet_hours": self.unmet_hours,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "StudyPlan":
+        plan = cls(d["subjects"], d["days_left"], d["hours_per_day"], d["timetable"], tips=d.get("tips"),
+                   contexts=d.get("contexts"), tips_gap_threshold=d.get("tips_gap_threshold"),
+                   availability=d.get("availability"), review=d.get("review"), unmet_hours=d.get("unmet_hours"))
+        for day, hours in sorted((int(k), v) for k, v in (d.get("progress") or {}).items()):
+            plan.log_progress(day, hours)
+        plan.next_day = int(d.get("next_day", plan.next_day))
+        plan.overbooked, plan.hours_gap = plan._balance()
+        plan.tips_basis = tuple(d["tips_basis"]) if d.get("tips_basis") else None
+        return plan
+
+    # ----- progress -----
+    @property
+    def remaining(self) -> Dict[str, float]:
+        """Hours each subject still needs (required minus logged, never below 0)."""
+        return {s["name"]: round(max(0.0, float(s["required_hours"]) - self.done.get(s["name"], 0.0)), 1)
+                for s in self.subjects}
+
+    def log_progress(self, day: int, hours: Dict[str, float]) -> None:
+        """
+        Record hours actually studied on `day` (1-based); calling again for the
+        same day replaces that day's log. Skipped blocks are simply not logged.
+        """
+        if not 1 <= day <= self.days_left:
+            raise RuntimeError(f"Day {day} is outside the plan (1..{self.days_left}).")
+        for name, h in self.progress.get(day, {}).items():
+            self.done[name] = self.done.get(name, 0.0) - h
+        self.progress[day] = {n: float(h) for n, h in hours.items() if float(h) > 0}
+        for name, h in self.progress[day].items():
+            self.done[name] = self.done.get(name, 0.0) + h
+        self.next_day = max(self.next_day, day + 1)
+
+    def _capacity(self, start: int) -> float:
+        """Hours available on days start..days_left."""
+        if self.availability:
+            return sum(self.availability[start - 1:])
+        return max(0, self.days_left - start + 1) * self.hours_per_day
+
+    def _balance(self):
+        """(overbooked, hours_gap) of the open days against what is still remaining."""
+        gap = round(sum(self.remaining.values()) - self._capacity(self.next_day), 1)
+        return gap > 0 or bool(self.unmet_hours), gap
+
+    def _reallocate(self, start: int, open_days: int, left: Dict[str, float]) -> Dict[str, Any]:
+        """Allocate the remaining hours over days start..days_left (day 1 of the result = start)."""
+        availability = self.availability[start - 1:] if self.availability else None
+        if not has_constraints(self.subjects, availability, self.review):
+            active = [{**s, "required_hours": left[s["name"]]} for s in self.subjects if left[s["name"]] > 0]
+            return allocate_time_vectorized(active, open_days, self.hours_per_day)
+        shift = start - 1
+        # finished subjects stay in: their spaced reviews can still be due
+        subjects = [{**s, "required_hours": left[s["name"]],
+                     **({"exam_day": max(1, int(s["exam_day"]) - shift)} if s.get("exam_day") else {})}
+                    for s in self.subjects]
+        first = {}
+        for day in sorted(self.progress):
+            for name in self.progress[day]:
+                first.setdefault(name, day - shift)
+        return schedule(subjects, open_days, self.hours_per_day, availability, self.review, started=first)
+
+    # ----- replanning -----
+    def replan(self, regenerate_tips: bool = True) -> Dict[str, Any]:
+        """
+        Re-allocate the open days (next_day..days_left) from `remaining`.
+        Returns a diff:
+          {"from_day", "changed_days": [{"day", "before", "after"}], "overbooked": (old, new),
+           "hours_gap": (old, new), "tips_regenerated", "tips_reason"}
+        Days before next_day are kept as planned (their actual hours are in `progress`);
+        a day only counts as changed if some subject moved by more than ROUNDING_H.
+        """
+        start = self.next_day
+        open_days = max(0, self.days_left - start + 1)
+        with span("replan", subjects=len(self.subjects), days=open_days) as sp:
+            left = self.remaining
+            active = [{**s, "required_hours": left[s["name"]]} for s in self.subjects if left[s["name"]] > 0]
+            alloc = self._reallocate(start, open_days, left)
+            self.unmet_hours = alloc.get("unmet_hours", {})
+            new_days = [{"day": start + i, "blocks": d["blocks"]} for i, d in enumerate(alloc["timetable"])]
+            old_days = {d["day"]: d["blocks"] for d in self.timetable if d["day"] >= start}
+            changed = []
+            for d in new_days:
+                prev = old_days.get(d["day"], [])
+                if prev != d["blocks"] and _day_changed(prev, d["blocks"]):
+                    changed.append({"day": d["day"], "before": prev, "after": d["blocks"]})
+            self.timetable = [d for d in self.timetable if d["day"] < start] + new_days
+
+            before = (self.overbooked, self.hours_gap)
+            self.overbooked, self.hours_gap = self._balance()
+            reason = self._tips_reason()
+            regenerated = False
+            if reason and regenerate_tips:
+                self.tips = write_tips(subjects=active or self.subjects, timetable=new_days,
+                                       overbooked=self.overbooked, hours_gap=self.hours_gap, contexts=self.contexts)
+                self.tips_basis = (self.overbooked, self.hours_gap)
+                regenerated = True
+            sp["changed_days"] = len(changed)
+            sp["tips_regenerated"] = int(regenerated)
+        return {
+            "from_day": start,
+            "changed_days": changed,
+            "overbooked": (before[0], self.overbooked),
+            "hours_gap": (before[1], self.hours_gap),
+            "tips_regenerated": regenerated,
+            "tips_reason": reason,
+        }
+
+    def _tips_reason(self) -> Optional[str]:
+        """Why the current tips are stale, or None if they still fit the plan."""
+        if self.tips_basis is None:
+            return "no_tips"
+        overbooked, gap = self.tips_basis
+        if overbooked != self.overbooked:
+            return "overbooked_flipped"
+        if abs(self.hours_gap - gap) > self.tips_gap_threshold:
+            return "hours_gap_moved"
+        return None
+
+    def to_state(self) -> Dict[str, Any]:
+        """The plan in the schedule graph's state shape (for rendering / JSON export)."""
+        plan = PlanTable.from_timetable(self.timetable, [s["name"] for s in self.subjects])
+        state = {
+            "days_left": self.days_left, "hours_per_day": self.hours_per_day,
+            "subjects_enriched": self.subjects,
+            "total_required_hours": round(sum(float(s["required_hours"]) for s in self.subjects), 1),
+            "total_available_hours": round(self._capacity(1), 1),
+            "timetable": self.timetable, "plan": plan.to_record(), "per_subject_allocation": plan.per_subject(),
+            "overbooked": self.overbooked, "hours_gap": self.hours_gap,
+            "contexts": self.contexts, "tips": self.tips, "progress": self.progress,
+        }
+        for key in ("availability", "review"):
+            if getattr(self, key):
+                state[key] = getattr(self, key)
+        if has_constraints(self.subjects, self.availability, self.review):
+            state["unmet_hours"] = self.unmet_hours
+        return state
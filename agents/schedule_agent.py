@@ -1,35 +1,56 @@
 # agents/schedule_agent.py
-from typing import List, Dict, Any
-from typing_extensions import TypedDict, NotRequired
-from langgraph.graph import StateGraph, START, END
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional, Tuple
+from typing_extensions import Annotated, TypedDict, NotRequired
+
+# langgraph is imported where the graph is built / streamed, so importing the
+# node functions (batch workers, tests, app start-up) stays cheap
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
 
 from tools.priority_score import build_priorities
-from tools.allocate_time import allocate_time
-from tools.tips_writer import write_tips
-from tools.rag_store import search as rag_search  # RAG search
+from tools.allocate_time import allocate_time_columnar
+from tools.plan_table import PlanTable
+from tools.scheduler import has_constraints, schedule
+from tools.tips_writer import write_tips, write_tips_async, stream_tips
+from tools.rag_store import search_many as rag_search_many  # batched RAG search
+from tools.rag_store import prefetch_queries as rag_prefetch
+from utils.telemetry import span
+
+def _merge(a: Optional[Dict], b: Optional[Dict]) -> Dict:
+    """Reducer for keys written by parallel branches."""
+    return {**(a or {}), **(b or {})}
 
 # ----- State schema -----
 class ScheduleState(TypedDict, total=False):
     # inputs
     days_left: int
     hours_per_day: float
-    subjects: List[Dict[str, Any]]  # {name, difficulty (1-5), target_hours?}
+    subjects: List[Dict[str, Any]]  # {name, difficulty (1-5), target_hours?, exam_day?, max_hours_per_day?}
+    availability: NotRequired[List[float]]  # hours per day, overrides hours_per_day
+    review: NotRequired[Dict[str, Any]]     # spaced repetition {"hours", "intervals"}
 
     # derived
     subjects_enriched: NotRequired[List[Dict[str, Any]]]  # +score, weight, required_hours
     total_required_hours: NotRequired[float]
     total_available_hours: NotRequired[float]
     timetable: NotRequired[List[Dict[str, Any]]]          # per-day plan
+    plan: NotRequired[Dict[str, Any]]                     # the same plan in columns (PlanTable.to_record())
     per_subject_allocation: NotRequired[Dict[str, float]]
     overbooked: NotRequired[bool]
     hours_gap: NotRequired[float]
+    unmet_hours: NotRequired[Dict[str, float]]            # constrained plans only: hours that didn't fit
 
-    # RAG
-    contexts: NotRequired[Dict[str, List[Dict[str, str]]]]  # subject -> [{id,path,text}]
+    # RAG (one parallel retrieve branch per subject, merged)
+    subject: NotRequired[str]                                                   # payload of a retrieve branch
+    contexts: NotRequired[Annotated[Dict[str, List[Dict[str, Any]]], _merge]]  # subject -> [{id,path,text,score}]
 
     # LLM output
     tips: NotRequired[Dict[str, Any]]
 
+    # seconds spent in each node ("retrieve:<subject>" per branch)
+    timings: NotRequired[Annotated[Dict[str, float], _merge]]
+
 # ----- Nodes -----
 def score_node(state: ScheduleState) -> ScheduleState:
     out = build_priorities(state["subjects"], state["days_left"])
@@ -39,33 +60,68 @@ def score_node(state: ScheduleState) -> ScheduleState:
     }
 
 def allocate_node(state: ScheduleState) -> ScheduleState:
-    alloc = allocate_time(
-        subjects=state["subjects_enriched"],
-        days_left=state["days_left"],
-        hours_per_day=state["hours_per_day"],
-    )
-    return {
-        "timetable": alloc["timetable"],
+    subjects, availability, review = state["subjects_enriched"], state.get("availability"), state.get("review")
+    if has_constraints(subjects, availability, review):
+        alloc = schedule(subjects, state["days_left"], state["hours_per_day"], availability, review)
+        plan = PlanTable.from_timetable(alloc["timetable"], [s["name"] for s in subjects])
+    else:
+        # columnar straight from the allocator; the per-day dicts are derived from it
+        alloc = allocate_time_columnar(
+            subjects=subjects,
+            days_left=state["days_left"],
+            hours_per_day=state["hours_per_day"],
+        )
+        plan = alloc["plan"]
+    out = {
+        "timetable": alloc["timetable"] if "timetable" in alloc else plan.to_timetable(),
+        "plan": plan.to_record(),
         "per_subject_allocation": alloc["per_subject_allocation"],
         "total_available_hours": alloc["total_available_hours"],
-        "overbooked": alloc["total_available_hours"] < state["total_required_hours"],
+        "overbooked": alloc["total_available_hours"] < state["total_required_hours"] or bool(alloc.get("unmet_hours")),
         "hours_gap": round(state["total_required_hours"] - alloc["total_available_hours"], 1),
     }
+    if "unmet_hours" in alloc:
+        out["unmet_hours"] = alloc["unmet_hours"]
+    return out
+
+def retrieve_contexts(names: List[str], k: int = 4) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    One RAG query per subject, batched into a single embedding call and a
+    single index search (outside the graph, e.g. agents.batch). If no index is
+    built yet, every subject gets [] (tips still work, just without citations).
+    """
+    results = rag_search_many([_query(name) for name in names], k=k) if names else []
+    return {name: _context_hits(hits) for name, hits in zip(names, results)}
 
-def retrieve_node(state: ScheduleState) -> ScheduleState:
+def retrieve_subject_node(state: ScheduleState) -> ScheduleState:
     """
-    For each subject, run a simple RAG query. If no index is built yet, hits=[]
-    and contexts will just be empty (tips will still work, just without citations).
+    One graph branch per subject (state is the Send payload {"subject": name}).
+    The query vector was embedded with the others' in _after_score, so this is
+    only the index search.
     """
-    contexts: Dict[str, List[Dict[str, str]]] = {}
-    for s in state.get("subjects_enriched", []):
-        name = s["name"]
-        q = f"{name} key formulas concepts summaries"
-        hits = rag_search(q, k=4) or []
-        contexts[name] = [{"id": h["id"], "path": h["path"], "text": h["text"]} for h in hits]
-    return {"contexts": contexts}
-
-def tips_node(state: ScheduleState) -> ScheduleState:
+    name = state["subject"]
+    return {"contexts": {name: _context_hits(rag_search_many([_query(name)], k=4)[0])}}
+
+def _query(name: str) -> str:
+    return f"{name} key formulas concepts summaries"
+
+def _context_hits(hits: List[Dict]) -> List[Dict[str, Any]]:
+    return [{"id": h["id"], "path": h["path"], "text": h["text"], "score": h["score"]} for h in hits or []]
+
+def tips_node(state: ScheduleState, config: "Optional[RunnableConfig]" = None) -> ScheduleState:
+    """
+    With config {"configurable": {"stream_tips": True}} the tips are streamed:
+    each finished field is also emitted as a custom stream event
+    {"tips_field": (key, value)} (graph.stream(..., stream_mode="custom")).
+    """
+    if ((config or {}).get("configurable") or {}).get("stream_tips"):
+        from langgraph.config import get_stream_writer
+        writer = get_stream_writer()
+        tips: Dict[str, Any] = {}
+        for key, value in tips_node_stream(state):
+            tips[key] = value
+            writer({"tips_field": (key, value)})
+        return {"tips": tips}
     t = write_tips(
         subjects=state["subjects_enriched"],
         timetable=state["timetable"],
@@ -75,19 +131,71 @@ def tips_node(state: ScheduleState) -> ScheduleState:
     )
     return {"tips": t}
 
+def tips_node_stream(state: ScheduleState) -> Iterator[Tuple[str, Any]]:
+    """tips_node, field by field, for progressive rendering."""
+    return stream_tips(
+        subjects=state["subjects_enriched"],
+        timetable=state["timetable"],
+        overbooked=state["overbooked"],
+        hours_gap=state["hours_gap"],
+        contexts=state.get("contexts", {}),
+    )
+
+async def tips_node_async(state: ScheduleState) -> ScheduleState:
+    t = await write_tips_async(
+        subjects=state["subjects_enriched"],
+        timetable=state["timetable"],
+        overbooked=state["overbooked"],
+        hours_gap=state["hours_gap"],
+        contexts=state.get("contexts", {}),
+    )
+    return {"tips": t}
+
 # ----- Graph -----
+def _timed(name: str, node, needs_config: bool = False):
+    """
+    Wrap a node so its wall time lands in state["timings"] and it runs inside a
+    "node.<name>" telemetry span (embedding / search / LLM spans nest under it).
+    needs_config: the node takes the RunnableConfig as a second argument.
+    """
+    def run(state: ScheduleState, config: "RunnableConfig") -> ScheduleState:
+        label = f"{name}:{state['subject']}" if name == "retrieve" else name
+        t = time.perf_counter()
+        with span(f"node.{name}", **({"subject": state["subject"]} if name == "retrieve" else {})):
+            out = node(state, config) if needs_config else node(state)
+        return {**out, "timings": {label: round(time.perf_counter() - t, 4)}}
+    return run
+
+def _after_score(state: ScheduleState) -> List:
+    """
+    Fan out: allocation plus one retrieve branch per subject, all in the same
+    step. The subjects' query vectors are embedded here first, in one call, so
+    the branches don't make one embedding request each.
+    """
+    from langgraph.types import Send
+    names = [s["name"] for s in state.get("subjects_enriched", [])]
+    rag_prefetch([_query(n) for n in names])
+    return ["allocate", *(Send("retrieve", {"subject": n}) for n in names)]
+
 def build_schedule_agent():
+    """
+    START → score ─┬→ allocate ─────────────┬→ tips → END
+                   └→ retrieve (per subject) ┘
+    allocate and the retrieve branches run in parallel; tips runs once all of them finished.
+    """
+    from langgraph.graph import StateGraph, START, END
     graph = StateGraph(ScheduleState)
 
-    graph.add_node("score", score_node)
-    graph.add_node("allocate", allocate_node)
-    graph.add_node("retrieve", retrieve_node)  # NEW
-    graph.add_node("tips", tips_node)
+    graph.add_node("score", _timed("score", score_node))
+    graph.add_node("allocate", _timed("allocate", allocate_node))
+    graph.add_node("retrieve", _timed("retrieve", retrieve_subject_node))
+    graph.add_node("tips", _timed("tips", tips_node, needs_config=True))
 
     graph.add_edge(START, "score")
-    graph.add_edge("score", "allocate")
-    graph.add_edge("allocate", "retrieve")     # allocate → retrieve
-    graph.add_edge("retrieve", "tips")         # retrieve → tips
+    graph.add_conditional_edges("score", _after_score, ["allocate", "retrieve"])
+    # separate edges (not a join on both) so tips still runs when there are no subjects to retrieve for
+    graph.add_edge("allocate", "tips")
+    graph.add_edge("retrieve", "tips")
     graph.add_edge("tips", END)
 
     return graph.compile()
@@ -0,0 +1,282 @@
+# agents/service.py
+"""
+Headless plan-serving API (ASGI) around the compiled schedule graph.
+
+    uvicorn agents.service:app --port 8000      # or: python -m agents.service --port 8000
+
+    POST /plan          ScheduleState inputs (+ optional "tenant" for a private RAG index) -> final state
+    GET  /healthz       liveness
+    GET  /metrics       Prometheus text: span histograms + service counters/latency quantiles
+    GET  /metrics.json  the same service numbers as JSON
+
+Handlers are async; the graph itself (scoring, allocation, retrieval, the
+tips call) runs in a bounded thread pool, so the event loop only parses,
+coalesces and queues requests. Identical requests that arrive while one is
+in flight share its result ("singleflight"): a burst of the same plan costs
+one graph run and one LLM call. At most SERVICE_MAX_CONCURRENCY (default 8)
+graph runs execute at once; up to SERVICE_MAX_QUEUE (default 64) more wait
+for a slot, at most SERVICE_QUEUE_TIMEOUT_S (default 30) seconds. Anything
+beyond that is turned away with 503 + Retry-After instead of piling up.
+Unexpected failures are logged with their traceback; the client only gets a
+generic 500.
+"""
+import asyncio, contextvars, hashlib, json, logging, math, os, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from utils import telemetry
+from utils.telemetry import span
+
+log = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 4096  # most recent requests kept for exact percentiles
+REQUEST_KEYS = ("days_left", "hours_per_day", "subjects", "availability", "review", "tenant")
+SUBJECT_NUMBERS = ("difficulty", "target_hours", "required_hours", "exam_day", "max_hours_per_day")
+
+class Overloaded(Exception):
+    """No slot and no room in the queue (or waited too long for a slot)."""
+
+class Singleflight:
+    """Concurrent calls with the same key share one execution of fn."""
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is None:
+            self.leaders += 1
+            fut = self._inflight[key] = asyncio.ensure_future(fn())
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: a caller that disconnects must not cancel the run the others wait on
+        return await asyncio.shield(fut)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+class Admission:
+    """Concurrency limit with a bounded, time-limited wait queue."""
+    def __init__(self, max_concurrency: int, max_queue: int, timeout_s: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.timeout_s = timeout_s
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def __aenter__(self):
+        # counted before the first await, so a burst can't all slip past the check
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"queue full ({self.waiting} waiting)")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout_s)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(f"no slot within {self.timeout_s:g}s") from None
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.running -= 1
+        self._slots.release()
+
+class LatencyWindow:
+    """Exact quantiles over the last `size` observations (seconds)."""
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._values: "deque[float]" = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        with self._lock:
+            self._values.append(v)
+            self.count += 1
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)) -> Dict[str, float]:
+        with self._lock:
+            xs = sorted(self._values)
+        # nearest rank: the smallest value with at least q of the window at or below it
+        return {f"p{round(q * 100)}": xs[max(0, math.ceil(q * len(xs)) - 1)] if xs else 0.0 for q in qs}
+
+def request_key(body: Dict) -> str:
+    """Canonical hash of the fields that determine the plan."""
+    canon = json.dumps({k: body.get(k) for k in REQUEST_KEYS}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+def _validate(body: Any) -> Optional[str]:
+    if not isinstance(body, dict):
+        return "body must be a JSON object"
+    if not isinstance(body.get("subjects"), list) or not body["subjects"]:
+        return "subjects must be a non-empty list"
+    for i, s in enumerate(body["subjects"]):
+        if not isinstance(s, dict):
+            return f"subjects[{i}] must be an object"
+        if not isinstance(s.get("name"), str) or not s["name"].strip():
+            return f"subjects[{i}].name must be a non-empty string"
+        for k in SUBJECT_NUMBERS:
+            v = s.get(k)
+            if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v)):
+                return f"subjects[{i}].{k} must be a number"
+    availability = body.get("availability")
+    if availability is not None and not (isinstance(availability, list) and all(
+            isinstance(h, (int, float)) and not isinstance(h, bool) for h in availability)):
+        return "availability must be a list of hours"
+    try:
+        if int(body.get("days_left", 0)) < 1 or float(body.get("hours_per_day", 0)) <= 0:
+            return "days_left must be >= 1 and hours_per_day > 0"
+    except (TypeError, ValueError):
+        return "days_left and hours_per_day must be numbers"
+    return None
+
+class PlanService:
+    def __init__(self, agent=None, workers: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 max_queue: Optional[int] = None, queue_timeout_s: Optional[float] = None):
+        self._agent = agent
+        self._agent_lock = threading.Lock()
+        max_concurrency = max_concurrency or int(os.getenv("SERVICE_MAX_CONCURRENCY", "8"))
+        # one thread per running plan (the tips call blocks its thread while waiting on the model)
+        self.pool = ThreadPoolExecutor(max_workers=workers or int(os.getenv("SERVICE_WORKERS", "0")) or max_concurrency,
+                                       thread_name_prefix="plan")
+        self.admission = Admission(
+            max_concurrency,
+            int(os.getenv("SERVICE_MAX_QUEUE", "64")) if max_queue is None else max_queue,
+            float(os.getenv("SERVICE_QUEUE_TIMEOUT_S", "30")) if queue_timeout_s is None else queue_timeout_s,
+        )
+        self.singleflight = Singleflight()
+        self.latency = LatencyWindow()
+        self.responses: Dict[int, int] = {}
+
+    def agent(self):
+        """Compiled graph, built on first use (keeps start-up and health checks cheap)."""
+        with self._agent_lock:
+            if self._agent is None:
+                from agents.schedule_agent import build_schedule_agent
+                self._agent = build_schedule_agent()
+            return self._agent
+
+    def _run_graph(self, body: Dict) -> Dict:
+        """Runs in a pool thread: the whole graph, inside the request's RAG tenant (if any)."""
+        from contextlib import nullcontext
+        import tools.rag_store as rs
+        state = {k: body[k] for k in REQUEST_KEYS if k in body and k != "tenant"}
+        with (rs.tenant_scope(body["tenant"]) if body.get("tenant") else nullcontext()), \
+                span("service.plan", subjects=len(state["subjects"])):
+            return self.agent().invoke(state)
+
+    async def plan(self, body: Dict) -> Dict:
+        async def run():
+            async with self.admission:
+                # run_in_executor doesn't carry contextvars over: copy them so the graph's spans
+                # join the request's trace
+                ctx = contextvars.copy_context()
+                return await asyncio.get_running_loop().run_in_executor(self.pool, ctx.run, self._run_graph, body)
+        return await self.singleflight.do(request_key(body), run)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.latency.count,
+            "responses": dict(self.responses),
+            "running": self.admission.running,
+            "queued": self.admission.waiting,
+            "rejected": self.admission.rejected,
+            "in_flight_keys": self.singleflight.in_flight(),
+            "graph_runs": self.singleflight.leaders,
+            "coalesced": self.singleflight.coalesced,
+            "latency_ms": {k: round(v * 1000, 3) for k, v in self.latency.quantiles().items()},
+            "max_concurrency": self.admission.max_concurrency,
+            "max_queue": self.admission.max_queue,
+        }
+
+    def prometheus_text(self) -> str:
+        s = self.stats()
+        lines = ["# HELP study_service_request_latency_seconds Plan request latency (recent window).",
+                 "# TYPE study_service_request_latency_seconds summary"]
+        lines += [f'study_service_request_latency_seconds{{quantile="{int(k[1:]) / 100:g}"}} {v / 1000:g}'
+                  for k, v in s["latency_ms"].items()]
+        lines.append(f"study_service_request_latency_seconds_count {s['requests']}")
+        for name, kind, value in (("running", "gauge", s["running"]), ("queued", "gauge", s["queued"]),
+                                  ("rejected_total", "counter", s["rejected"]),
+                                  ("graph_runs_total", "counter", s["graph_runs"]),
+                                  ("coalesced_total", "counter", s["coalesced"])):
+            lines += [f"# TYPE study_service_{name} {kind}", f"study_service_{name} {value}"]
+        lines.append("# TYPE study_service_responses_total counter")
+        lines += [f'study_service_responses_total{{code="{c}"}} {n}' for c, n in sorted(s["responses"].items())]
+        return telemetry.prometheus_text() + "\n".join(lines) + "\n"
+
+    # ----- handlers -----
+    async def handle_plan(self, request: Request):
+        t = time.perf_counter()
+        try:
+            body = json.loads(await request.body() or b"null")
+        except ValueError:
+            body = None
+        error = _validate(body)
+        if error:
+            resp = JSONResponse({"error": error}, status_code=400)
+        else:
+            try:
+                with span("service.request"):
+                    resp = JSONResponse(await self.plan(body))
+            except Overloaded as e:
+                resp = JSONResponse({"error": f"overloaded: {e}"}, status_code=503, headers={"Retry-After": "1"})
+            except Exception:
+                log.exception("plan request failed")
+                resp = JSONResponse({"error": "internal error"}, status_code=500)
+        self.responses[resp.status_code] = self.responses.get(resp.status_code, 0) + 1
+        self.latency.observe(time.perf_counter() - t)
+        return resp
+
+    async def handle_health(self, request: Request):
+        return JSONResponse({"ok": True})
+
+    async def handle_metrics(self, request: Request):
+        return PlainTextResponse(self.prometheus_text())
+
+    async def handle_metrics_json(self, request: Request):
+        return JSONResponse(self.stats())
+
+def create_app(service: Optional[PlanService] = None) -> Starlette:
+    service = service or PlanService()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        service.pool.shutdown(wait=False)
+
+    app = Starlette(routes=[
+        Route("/plan", service.handle_plan, methods=["POST"]),
+        Route("/healthz", service.handle_health),
+        Route("/metrics", service.handle_metrics),
+        Route("/metrics.json", service.handle_metrics_json),
+    ], lifespan=lifespan)
+    app.state.service = service
+    return app
+
+app = create_app()
+
+def main():
+    import argparse
+    import uvicorn
+    ap = argparse.ArgumentParser(description="Serve study plans over HTTP.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    args = ap.parse_args()
+    uvicorn.run("agents.service:app", host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,12 @@
 # app.py
-import os, json
-import pandas as pd
+import os, json, uuid
+from contextlib import nullcontext
 import streamlit as st
 
-from agents.schedule_agent import (
-    build_schedule_agent,
-    score_node, allocate_node, retrieve_node, tips_node,
-)
+from utils import telemetry
 
-# (optional import guard; works even if faiss not installed yet)
-try:
-    from tools.rag_store import build_ephemeral_index
-except Exception:
-    build_ephemeral_index = None
+# pandas, langgraph, google.generativeai and faiss are imported lazily (inside the
+# functions below) so the page renders before they load on a cold start.
 
 st.set_page_config(
     page_title="Study Schedule Generator (LangGraph + Gemini + RAG)",
@@ -21,35 +15,105 @@ st.set_page_config(
 )
 st.title(" Study Schedule Generator")
 
+@st.cache_resource(show_spinner=False)
+def get_agent():
+    """Compiled graph, built once per server process instead of on every rerun."""
+    from agents.schedule_agent import build_schedule_agent
+    return build_schedule_agent()
+
+def rag_store_module():
+    # (optional import guard; works even if faiss not installed yet)
+    try:
+        import tools.rag_store as rag
+        return rag
+    except Exception:
+        return None
+
+# Each browser session gets its own RAG index; the process-wide registry in
+# tools.rag_store keeps open indexes within RAG_MEMORY_BUDGET_MB.
+if "rag_tenant" not in st.session_state:
+    st.session_state.rag_tenant = uuid.uuid4().hex[:16]
+
+def session_rag():
+    """Context in which RAG reads/writes (including graph nodes) use this session's index."""
+    rag = rag_store_module()
+    return rag.tenant_scope(st.session_state.rag_tenant) if rag else nullcontext()
+
 # ---------------- Sidebar ----------------
 with st.sidebar:
     st.header("Plan Settings")
     days_left = st.number_input("Days left", min_value=1, max_value=60, value=7)
     hours_per_day = st.slider("Available hours per day", 1.0, 12.0, 4.0, 0.5)
     explain = st.checkbox("Explain mode (show raw agent states)", value=False)
-    st.caption("LangGraph orchestrates: scoring → allocation → retrieval (RAG) → tips.")
+    st.caption("LangGraph orchestrates: scoring → allocation ‖ retrieval (RAG, per subject) → tips.")
 
     st.divider()
     st.header("RAG (paste notes)")
-    st.caption("Paste any study notes / formulas / summaries. Built in-memory for this session.")
+    st.caption("Paste any study notes / formulas / summaries. Saved to a local index that survives restarts.")
+    rag = rag_store_module()
+    if rag:
+        try:
+            with session_rag():
+                info = rag.index_info()
+            if info["chunks"]:
+                st.caption(f"Your notes: {info['chunks']} chunks from {len(info['sources'])} source(s).")
+            for name, n in info["shared"].items():
+                st.caption(f"Shared corpus '{name}': {n} chunks.")
+        except Exception:
+            pass
     notes = st.text_area(
         "Notes to index:",
         height=160,
         placeholder="e.g.\nKinematics: v = u + at, s = ut + 1/2 a t^2 ...\nEssay: claim → evidence → reasoning ...",
     )
     if st.button(" Build RAG from pasted notes"):
-        if not build_ephemeral_index:
+        if not rag:
             st.error("RAG builder unavailable (install faiss-cpu).")
         else:
             try:
-                chunks, dim = build_ephemeral_index([notes] if notes.strip() else [])
+                with session_rag():
+                    chunks, dim = rag.build_ephemeral_index([notes] if notes.strip() else [])
                 if chunks > 0:
-                    st.success(f"Built ephemeral index: {chunks} chunks (dim={dim}).")
+                    stats = rag.last_build_stats()
+                    st.success(
+                        f"Indexed notes: {chunks} chunks (dim={dim}) "
+                        f"in {stats.get('total_seconds', 0):.2f}s ({stats.get('chunks_per_sec', 0):.0f} chunks/s, "
+                        f"{stats.get('cache_hits', 0)} cached / {stats.get('cache_misses', 0)} embedded, "
+                        f"{stats.get('duplicates', 0)} near-duplicates skipped)."
+                    )
                 else:
                     st.info("Cleared RAG (no notes).")
             except Exception as e:
                 st.error(f"RAG build failed: {e}")
 
+    uploads = st.file_uploader("…or index files (PDF / Markdown / text):",
+                               type=["pdf", "md", "markdown", "txt"], accept_multiple_files=True)
+    if uploads and st.button(" Index uploaded files"):
+        if not rag:
+            st.error("RAG builder unavailable (install faiss-cpu).")
+        else:
+            import tempfile
+            from tools.ingest import ingest_paths
+            status = st.empty()
+            try:
+                with tempfile.TemporaryDirectory() as tmp, session_rag():
+                    paths = []
+                    for up in uploads:
+                        paths.append(os.path.join(tmp, os.path.basename(up.name)))
+                        with open(paths[-1], "wb") as f:
+                            f.write(up.getbuffer())
+                    stats = ingest_paths(
+                        paths,
+                        base_dir=tmp,  # source names = uploaded file names
+                        progress=lambda s: status.caption(
+                            f"{s['stage']}: {s['source']} · pages={s['pages']} chunks={s['chunks']}"),
+                    )
+                status.success(f"Indexed {stats['files']} file(s): {stats['pages']} pages, "
+                               f"{stats['chunks']} chunks ({stats['chunks_per_sec']:.0f} chunks/s, "
+                               f"{stats.get('duplicates', 0)} near-duplicates skipped).")
+            except Exception as e:
+                st.error(f"Ingestion failed: {e}")
+
 # ---------------- Subjects form ----------------
 if "subjects" not in st.session_state:
     st.session_state.subjects = []
@@ -74,118 +138,151 @@ with st.form("add_subject", clear_on_submit=True):
 
 if st.session_state.subjects:
     st.write("**Current Subjects:**")
-    st.dataframe(pd.DataFrame(st.session_state.subjects), use_container_width=True)
+    st.dataframe(st.session_state.subjects, use_container_width=True)
 else:
     st.info("Add a few subjects to begin.")
 
 go = st.button(" Generate Study Plan", use_container_width=True)
 
-# ---------------- Run agent steps ----------------
-if go and st.session_state.subjects:
-    _ = build_schedule_agent()  # compile once (we call node funcs directly)
-
-    base_state = {
-        "days_left": int(days_left),
-        "hours_per_day": float(hours_per_day),
-        "subjects": st.session_state.subjects
-    }
-
-    # 1) score/priorities
-    s1 = {**base_state, **score_node(base_state)}
-
-    # 2) allocate time
-    s2 = {**s1, **allocate_node(s1)}
+# display order of the streamed tip fields
+TIP_FIELDS = ("study_principles", "focus_order", "breaks", "daily_checklist",
+              "if_overbooked", "rag_suggestions", "citations")
 
-    # 3) retrieve (RAG) — searches the ephemeral index if you built it
-    sR = {**s2, **retrieve_node(s2)}
+def render_tip_field(key, value):
+    if key == "study_principles":
+        st.markdown("**Principles:** " + ", ".join(value))
+    elif key == "focus_order":
+        st.markdown("**Daily Focus Order:** " + " → ".join(value))
+    elif key == "breaks":
+        st.markdown(f"**Work/Break:** {value.get('work', 50)} / {value.get('break', 10)} minutes")
+    elif key == "daily_checklist":
+        st.markdown("**Checklist:**")
+        for item in value:
+            st.write(f"• {item}")
+    elif key == "if_overbooked":
+        st.warning(f"Overbooked — Strategy: **{value.get('strategy','')}**")
+        for action in value.get("actions", []):
+            st.write(f"• {action}")
+    elif key == "rag_suggestions":
+        st.markdown("**RAG Suggestions (from your pasted notes):**")
+        for x in value:
+            st.write(f"• {x}")
+    elif key == "citations":
+        st.markdown("**Sources:** " + ", ".join(value))
 
-    # 4) tips (Gemini)
-    try:
-        s3 = {**sR, **tips_node(sR)}
-    except Exception as e:
-        s3 = {**sR, "tips": {}}
-        st.error("Gemini call failed (tips disabled). Check GOOGLE_API_KEY in your .env.")
-        st.exception(e)
-
-    # ---------------- Pretty render ----------------
+def render_plan(state, plan):
+    import pandas as pd
     c1, c2, c3 = st.columns(3)
-    c1.metric("Total Required Hours", f"{s1['total_required_hours']:.1f}h")
-    c2.metric("Total Available Hours", f"{s2['total_available_hours']:.1f}h")
-    gap = s1['total_required_hours'] - s2['total_available_hours']
+    c1.metric("Total Required Hours", f"{state['total_required_hours']:.1f}h")
+    c2.metric("Total Available Hours", f"{state['total_available_hours']:.1f}h")
+    gap = state['total_required_hours'] - state['total_available_hours']
     c3.metric("Gap (req - avail)", f"{gap:+.1f}h")
 
     st.subheader("Subjects & Priorities")
-    st.dataframe(pd.DataFrame(s1["subjects_enriched"]), use_container_width=True)
+    st.dataframe(pd.DataFrame(state["subjects_enriched"]), use_container_width=True)
 
     st.subheader("Timetable")
-    rows = []
-    for d in s2["timetable"]:
-        for b in d["blocks"]:
-            rows.append({"Day": d["day"], "Subject": b["subject"], "Hours": b["hours"]})
-    if rows:
-        tt_df = pd.DataFrame(rows)
+    if len(plan):
+        tt_df = plan.to_pandas().rename(columns={"day": "Day", "subject": "Subject", "hours": "Hours"})
+        if not plan.review.any():
+            tt_df = tt_df.drop(columns="review")
         st.dataframe(tt_df, use_container_width=True)
         st.bar_chart(tt_df.groupby("Subject")["Hours"].sum())
     else:
         st.warning("No time allocated yet—try increasing hours/day or days_left.")
 
-    st.subheader("Study Tips & Checklist")
-    tips = s3.get("tips", {}) or {}
-    if tips:
-        principles = tips.get("study_principles", [])
-        focus_order = tips.get("focus_order", [])
-        breaks = tips.get("breaks", {})
-        checklist = tips.get("daily_checklist", [])
-        over = tips.get("if_overbooked")
-        cites = tips.get("citations", [])
-        rag_sugs = tips.get("rag_suggestions", [])
-
-        if principles:
-            st.markdown("**Principles:** " + ", ".join(principles))
-        if focus_order:
-            st.markdown("**Daily Focus Order:** " + " → ".join(focus_order))
-        if breaks:
-            st.markdown(f"**Work/Break:** {breaks.get('work', 50)} / {breaks.get('break', 10)} minutes")
-        if checklist:
-            st.markdown("**Checklist:**")
-            for item in checklist:
-                st.write(f"• {item}")
-        if over:
-            st.warning(f"Overbooked — Strategy: **{over.get('strategy','')}**")
-            for action in over.get("actions", []):
-                st.write(f"• {action}")
-        if rag_sugs:
-            st.markdown("**RAG Suggestions (from your pasted notes):**")
-            for x in rag_sugs:
-                st.write(f"• {x}")
-        if cites:
-            st.markdown("**Sources:** " + ", ".join(cites))
-    else:
+# ---------------- Run agent graph ----------------
+if go and st.session_state.subjects:
+    agent = get_agent()
+
+    base_state = {
+        "days_left": int(days_left),
+        "hours_per_day": float(hours_per_day),
+        "subjects": st.session_state.subjects
+    }
+
+    # score → (allocate ‖ retrieve per subject) → tips. "values" events carry the merged
+    # state after each step, so the plan renders as soon as allocation is done; "custom"
+    # events carry each tips field as the model finishes it.
+    from tools.plan_table import PlanTable
+    state, slots, tips, plan = dict(base_state), None, {}, None
+    try:
+        with st.spinner("Planning..."), session_rag(), telemetry.span("plan", subjects=len(base_state["subjects"])):
+            trace_id = telemetry.current_trace_id()
+            for mode, event in agent.stream(base_state, config={"configurable": {"stream_tips": True}},
+                                            stream_mode=["values", "custom"]):
+                if mode == "values":
+                    state = event
+                    if slots is None and "plan" in state:
+                        plan = PlanTable.from_record(state["plan"])  # the one columnar copy, reused below
+                        render_plan(state, plan)
+                        st.subheader("Study Tips & Checklist")
+                        slots = {k: st.empty() for k in TIP_FIELDS}
+                elif "tips_field" in event and slots is not None:
+                    key, value = event["tips_field"]
+                    tips[key] = value
+                    if key in slots and value:
+                        with slots[key].container():
+                            render_tip_field(key, value)
+    except Exception as e:
+        if slots is None:
+            raise  # failed before a plan existed (score/allocate), nothing to show
+        st.error("Gemini call failed (tips disabled). Check GOOGLE_API_KEY in your .env.")
+        st.exception(e)
+    tips = state.get("tips", tips) or tips
+    if not tips:
         st.info("No tips returned.")
+    if explain and "timetable" in state:
+        from tools.tips_writer import prompt_stats
+        ps = prompt_stats(state["subjects_enriched"], state["timetable"], state["overbooked"],
+                          state["hours_gap"], state.get("contexts", {}))
+        st.caption(f"Prompt ≈ {ps['tokens_after']} tokens (was ≈ {ps['tokens_before']}); "
+                   f"{ps['context_chunks_kept']}/{ps['context_chunks']} context chunks kept")
 
-    # Downloads
+    # Downloads: the timetable as columns and contexts as references (the chunk texts
+    # are already in the index), so the file doesn't carry several copies of the plan
     st.divider()
     final_report = {
         "inputs": base_state,
-        "subjects_enriched": s1["subjects_enriched"],
-        "timetable": s2["timetable"],
-        "per_subject_allocation": s2["per_subject_allocation"],
-        "overbooked": s2["overbooked"],
-        "hours_gap": s2["hours_gap"],
-        "contexts": sR.get("contexts", {}),
+        "subjects_enriched": state["subjects_enriched"],
+        "timetable": plan.to_record(),
+        "per_subject_allocation": state["per_subject_allocation"],
+        "overbooked": state["overbooked"],
+        "hours_gap": state["hours_gap"],
+        "contexts": {s: [{k: h.get(k) for k in ("id", "path", "score")} for h in hits]
+                     for s, hits in state.get("contexts", {}).items()},
         "tips": tips
     }
-    st.download_button(
+    d1, d2 = st.columns(2)
+    d1.download_button(
         "Download JSON Plan",
-        data=json.dumps(final_report, indent=2),
+        data=json.dumps(final_report, separators=(",", ":")),
         file_name="study_plan.json",
         mime="application/json",
         use_container_width=True,
     )
+    d2.download_button(
+        "Download Timetable (CSV)",
+        data=plan.to_pandas().to_csv(index=False),
+        file_name="study_timetable.csv",
+        mime="text/csv",
+        use_container_width=True,
+    )
 
     if explain:
-        with st.expander("Raw States (for debugging)"):
-            st.json({"score": s1, "allocate": s2, "retrieve": sR, "tips": s3})
+        with st.expander("Timing breakdown"):
+            trace = telemetry.spans(trace_id)
+            if trace:
+                import pandas as pd
+                st.dataframe(pd.DataFrame([
+                    {"span": sp["name"], "ms": sp["duration_ms"], "status": sp["status"],
+                     **{k: v for k, v in sp["attributes"].items() if k != "model"}}
+                    for sp in trace
+                ]), use_container_width=True)
+            else:
+                st.caption("Telemetry is off (TELEMETRY=0).")
+        with st.expander("Raw State (for debugging)"):
+            st.json({**state, "tips": tips})
 
 elif go and not st.session_state.subjects:
     st.error("Add at least one subject first.")
@@ -0,0 +1,50 @@
+# benchmarks/bench_allocate.py
+"""
+Loop allocator vs closed-form allocator across (days x subjects) grid sizes.
+
+    python -m benchmarks.bench_allocate --days 7,30,120,365 --subjects 5,20,50
+"""
+import argparse, json, random, time
+
+from tools.priority_score import build_priorities
+from tools.allocate_time import allocate_time, allocate_time_vectorized
+
+def synthetic_subjects(n: int, days_left: int, seed: int = 0):
+    rng = random.Random(seed)
+    raw = [{"name": f"Subject {i}", "difficulty": rng.randint(1, 5),
+            "target_hours": rng.choice([None, round(rng.uniform(2, 80), 1)])} for i in range(n)]
+    return build_priorities(raw, days_left)["subjects"]
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        if best > 1.0:  # the loop allocator can take tens of seconds on some grids
+            break
+    return best
+
+def run(days_list, subjects_list, hours_per_day=4.0, repeat=3):
+    rows = []
+    for d in days_list:
+        for s in subjects_list:
+            subs = synthetic_subjects(s, d)
+            loop_s = _best_of(lambda: allocate_time(subs, d, hours_per_day), repeat)
+            fast_s = _best_of(lambda: allocate_time_vectorized(subs, d, hours_per_day), repeat)
+            rows.append({"days": d, "subjects": s, "loop_ms": round(loop_s * 1000, 3),
+                         "vectorized_ms": round(fast_s * 1000, 3),
+                         "speedup": round(loop_s / fast_s, 1) if fast_s else None})
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--days", default="7,30,120,365")
+    ap.add_argument("--subjects", default="5,20,50")
+    ap.add_argument("--hours-per-day", type=float, default=4.0)
+    args = ap.parse_args()
+    rows = run([int(x) for x in args.days.split(",")], [int(x) for x in args.subjects.split(",")], args.hours_per_day)
+    print(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
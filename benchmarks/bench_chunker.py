@@ -0,0 +1,57 @@
+# benchmarks/bench_chunker.py
+"""
+Chunker micro-benchmark: the original whole-document normalize-and-slice
+chunker vs the single-pass span chunker (time and peak allocations).
+
+    python -m benchmarks.bench_chunker --sizes 1,4,16
+"""
+import argparse, json, time, tracemalloc
+
+from tools.chunker import iter_spans, chunk_text
+
+def legacy_chunk(text: str, max_chars=900, overlap=120):
+    """The pre-span implementation of tools.rag_store._chunk, kept for comparison."""
+    text = " ".join(text.split())
+    chunks, i = [], 0
+    while i < len(text):
+        chunks.append(text[i:i+max_chars])
+        i += max_chars - overlap
+    return [c for c in chunks if c.strip()]
+
+def synthetic_notes(mb: float) -> str:
+    para = ("Kinematics describes motion: v = u + at and s = ut + 1/2 a t^2. "
+            "Momentum is conserved in closed systems!  Why? Newton's third law.\n") * 6
+    reps = int(mb * 1_000_000 / (len(para) + 2)) + 1
+    return (para + "\n") * reps
+
+def _measure(fn, text):
+    t0 = time.perf_counter()
+    n = fn(text)
+    secs = time.perf_counter() - t0
+    tracemalloc.start()  # separate run: tracing slows allocation-heavy code a lot
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"chunks": n, "seconds": round(secs, 4), "peak_mb": round(peak / 1e6, 2),
+            "mb_per_sec": round(len(text) / 1e6 / secs, 1) if secs else None}
+
+def run(sizes_mb):
+    out = []
+    for mb in sizes_mb:
+        text = synthetic_notes(mb)
+        out.append({
+            "size_mb": round(len(text) / 1e6, 2),
+            "legacy": _measure(lambda t: len(legacy_chunk(t)), text),
+            "spans": _measure(lambda t: sum(1 for _ in iter_spans(t)), text),
+            "spans_materialized": _measure(lambda t: len(chunk_text(t)), text),
+        })
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--sizes", default="1,4,16", help="comma-separated input sizes in MB")
+    args = ap.parse_args()
+    print(json.dumps(run([float(x) for x in args.sizes.split(",")]), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# benchmarks/bench_index.py
+"""
+Recall / latency / memory of each FAISS index kind on synthetic clustered vectors.
+
+    python -m benchmarks.bench_index --n 50000 --dim 768 --queries 500 --k 10
+"""
+import argparse, json
+
+import numpy as np
+
+from tools.index_store import compare_kinds, INDEX_KINDS, auto_kind
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 64, seed: int = 0):
+    """Gaussian blobs around random centers (closer to real embeddings than uniform noise)."""
+    import faiss
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(clusters, dim).astype("float32")
+    x = centers[rng.randint(0, clusters, n)] + 0.35 * rng.randn(n, dim).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--kinds", default=",".join(INDEX_KINDS))
+    args = ap.parse_args()
+
+    x = synthetic_vectors(args.n + args.queries, args.dim)
+    xb, xq = x[:args.n], x[args.n:]  # queries from the same distribution, not in the index
+    rows = compare_kinds(xb, xq, args.k, tuple(args.kinds.split(",")))
+    print(json.dumps({"n": args.n, "dim": args.dim, "auto_kind": auto_kind(args.n), "results": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_retrieval.py
+"""
+Latency and hit quality of the three retrieval modes (vector | hybrid | lexical).
+
+A synthetic corpus gets needle chunks planted in it: formulas that differ
+only in operators ("v = u + a t" vs "v = u - a t") and rare keywords. Each
+needle is queried verbatim; hit@k and MRR say how often the planted chunk
+comes back and how high. Runs offline on the hash embedder.
+
+    python -m benchmarks.bench_retrieval --n 20000 --needles 200 --k 5
+"""
+import argparse, json, os, random, statistics, tempfile, time
+from typing import Dict, List, Tuple
+
+from benchmarks.suite import synthetic_chunks
+
+_VARS = "abcdfghmpqrstuvwxyz"
+_OPS = "+-*/"
+
+def needles(n: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """(kind, text) pairs: unique formulas over a small alphabet, and unique rare keywords."""
+    rng = random.Random(seed)
+    out, seen = [], set()
+    while len(out) < n:
+        if len(out) % 2 == 0:
+            a, b, c, d = rng.sample(_VARS, 4)
+            text = f"{a} = {b} {rng.choice(_OPS)} {c} {rng.choice(_OPS)} {d}"
+            kind = "formula"
+        else:
+            text = f"{rng.choice(['zeta', 'quark', 'lemma', 'axiom'])}{rng.randint(0, 10**6)}"
+            kind = "keyword"
+        if text not in seen:
+            seen.add(text)
+            out.append((kind, text))
+    return out
+
+def evaluate(n: int, n_needles: int, k: int, modes=("vector", "hybrid", "lexical")) -> Dict:
+    import tools.rag_store as rs
+    from tools.index_store import IndexStore, auto_kind
+    store = IndexStore(f"retrieval-{n}", kind=auto_kind(n))
+    store.clear()
+    texts = synthetic_chunks(n)
+    planted = needles(n_needles)
+    rng = random.Random(1)
+    where = rng.sample(range(n), n_needles)
+    for (_, needle), i in zip(planted, where):
+        words = texts[i].split()
+        pos = rng.randint(0, len(words))
+        texts[i] = " ".join(words[:pos] + [needle] + words[pos:])
+    t0 = time.perf_counter()
+    for j in range(0, n, 50_000):
+        part = texts[j:j + 50_000]
+        store.add_documents("bench", part, vectors=rs._embed_texts(part))
+    build_s = time.perf_counter() - t0
+    rs._REGISTRY.put(store)
+    os.environ["RAG_INDEX_NAME"] = store.name
+
+    label = {i: f"bench#{i + 1}" for i in where}
+    out = {"n": n, "needles": n_needles, "k": k, "build_s": round(build_s, 2), "modes": {}}
+    for mode in modes:
+        rs.search_many([planted[0][1]], k, mode)  # warm up (BM25 doc lengths, FAISS pages)
+        rows: Dict[str, List[float]] = {}
+        lat = []
+        for (kind, needle), i in zip(planted, where):
+            rs._QUERY_MEMO.clear()  # keep query embedding in the measurement
+            t = time.perf_counter()
+            hits = rs.search(needle, k, mode)
+            lat.append((time.perf_counter() - t) * 1000)
+            ids = [h["id"] for h in hits]
+            rr = 1.0 / (ids.index(label[i]) + 1) if label[i] in ids else 0.0
+            rows.setdefault(kind, []).append(rr)
+        out["modes"][mode] = {
+            "median_ms": round(statistics.median(lat), 3),
+            "p95_ms": round(sorted(lat)[int(0.95 * (len(lat) - 1))], 3),
+            **{f"{kind}_hit@{k}": round(sum(r > 0 for r in rr) / len(rr), 3) for kind, rr in rows.items()},
+            **{f"{kind}_mrr": round(sum(rr) / len(rr), 3) for kind, rr in rows.items()},
+        }
+    os.environ.pop("RAG_INDEX_NAME", None)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--needles", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+    os.environ.update({"EMBED_BACKEND": "hash", "EMBED_CACHE": "0", "TELEMETRY": "0",
+                       "RAG_INDEX_DIR": os.path.join(tempfile.mkdtemp(prefix="bench-"), "rag_index")})
+    print(json.dumps(evaluate(args.n, args.needles, args.k), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/loadtest.py
+"""
+Concurrency load test of the full schedule graph against the local API
+stand-ins (utils.fake_backend), so a deployment can be sized without quota.
+
+    python -m benchmarks.loadtest --plans 500 --concurrency 32 \
+        --llm-latency lognormal:900,0.4 --llm-429-rate 0.05 --llm-rps 20 --embed-latency lognormal:120,0.3
+
+Runs N plans (score -> allocate || retrieve per subject -> tips) through the
+compiled graph from `concurrency` threads, each with its own subject names so
+query embeddings aren't memoized away, against a small pre-built notes index.
+Reports plans/sec, end-to-end and per-node p50/p95/p99 latency, errors, and
+retry counts (LLM and embedding backoffs) plus what the fakes injected.
+"""
+import argparse, json, math, os, random, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.suite import _VOCAB, synthetic_text
+
+def percentiles(xs: List[float], qs=(0.5, 0.95, 0.99)) -> Dict[str, float]:
+    """Nearest-rank percentiles, in ms (xs in seconds)."""
+    xs = sorted(xs)
+    return {f"p{round(q * 100)}_ms": round(xs[max(0, math.ceil(q * len(xs)) - 1)] * 1000, 2) if xs else 0.0
+            for q in qs}
+
+def _inputs(n: int, subjects: int, days: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    return [{"days_left": days, "hours_per_day": rng.choice([2.0, 3.0, 4.0, 6.0]),
+             "subjects": [{"name": f"{rng.choice(_VOCAB).capitalize()} {i}-{j}", "difficulty": rng.randint(1, 5)}
+                          for j in range(subjects)]}
+            for i in range(n)]
+
+def run(plans: int = 100, concurrency: int = 16, subjects: int = 4, days: int = 14, notes_chunks: int = 200,
+        fakes: Optional[Dict[str, str]] = None, seed: int = 0, workdir: Optional[str] = None) -> Dict:
+    """
+    fakes: FAKE_* settings (see utils.fake_backend), e.g. {"FAKE_LLM_LATENCY_MS": "lognormal:800,0.4"}.
+    The environment is restored afterwards.
+    """
+    env = {"GEMINI_MODEL": "fake", "EMBED_BACKEND": "gemini", "EMBED_MODEL": "fake", "LLM_CACHE": "0",
+           "EMBED_CACHE": "0", "TELEMETRY": "1", "FAKE_SEED": str(seed),
+           "RAG_INDEX_DIR": os.path.join(workdir or tempfile.mkdtemp(prefix="loadtest-"), "rag_index"),
+           **(fakes or {})}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    import utils.llm_client as llm
+    from utils import fake_backend, telemetry
+    real_model, llm._GEMINI_MODEL = llm._GEMINI_MODEL, "fake"  # read at import time
+    try:
+        import tools.rag_store as rs
+        from agents.schedule_agent import build_schedule_agent
+        fake_backend.reset()
+        rs._REGISTRY.clear()
+        rs.build_ephemeral_index([synthetic_text(notes_chunks * 780, seed=seed)])
+        telemetry.reset()
+        fake_backend.reset()  # count only the load, not the index build
+        agent = build_schedule_agent()
+
+        def one(state: Dict) -> Dict:
+            t = time.perf_counter()
+            try:
+                out = agent.invoke(state)
+                return {"ok": True, "seconds": time.perf_counter() - t, "timings": out.get("timings", {})}
+            except Exception as e:
+                return {"ok": False, "seconds": time.perf_counter() - t, "error": type(e).__name__}
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            results = list(pool.map(one, _inputs(plans, subjects, days, seed)))
+        wall = time.perf_counter() - t0
+    finally:
+        llm._GEMINI_MODEL = real_model
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+    nodes: Dict[str, List[float]] = {}
+    for r in results:
+        for label, s in r.get("timings", {}).items():
+            nodes.setdefault(label.split(":")[0], []).append(s)
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    counts = telemetry.counters()
+    return {
+        "plans": plans, "concurrency": concurrency, "subjects": subjects, "days": days,
+        "ok": sum(r["ok"] for r in results), "errors": errors,
+        "wall_seconds": round(wall, 3), "plans_per_sec": round(plans / wall, 2) if wall > 0 else 0.0,
+        "latency": percentiles([r["seconds"] for r in results if r["ok"]]),
+        "nodes": {n: {"calls": len(xs), **percentiles(xs)} for n, xs in sorted(nodes.items())},
+        "retries": {"llm": counts.get("retry.llm", 0), "embed": counts.get("retry.embed", 0)},
+        "injected": fake_backend.stats(),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--plans", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--subjects", type=int, default=4)
+    ap.add_argument("--days", type=int, default=14)
+    ap.add_argument("--notes-chunks", type=int, default=200, help="size of the pre-built notes index")
+    ap.add_argument("--seed", type=int, default=0)
+    for api, latency in (("llm", "lognormal:800,0.4"), ("embed", "lognormal:100,0.3")):
+        ap.add_argument(f"--{api}-latency", default=latency, help="const:ms | uniform:a,b | normal:mu,sd | lognormal:median,sigma")
+        ap.add_argument(f"--{api}-error-rate", type=float, default=0.0, help="fraction of calls failing with 503")
+        ap.add_argument(f"--{api}-429-rate", type=float, default=0.0, help="fraction of calls failing with 429")
+        ap.add_argument(f"--{api}-rps", type=float, default=0.0, help="rate limit (0 = none); excess calls get 429")
+    ap.add_argument("--out", default="", help="also write the report as JSON here")
+    args = ap.parse_args()
+
+    fakes = {}
+    for api in ("llm", "embed"):
+        a = {k: getattr(args, f"{api}_{k}") for k in ("latency", "error_rate", "429_rate", "rps")}
+        fakes.update({f"FAKE_{api.upper()}_LATENCY_MS": a["latency"], f"FAKE_{api.upper()}_ERROR_RATE": str(a["error_rate"]),
+                      f"FAKE_{api.upper()}_429_RATE": str(a["429_rate"]), f"FAKE_{api.upper()}_RATE_LIMIT_RPS": str(a["rps"])})
+    report = run(args.plans, args.concurrency, args.subjects, args.days, args.notes_chunks, fakes, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+# benchmarks/suite.py
+"""
+Regression benchmarks for the planning and retrieval hot paths.
+
+Runs offline: embeddings come from the deterministic hash embedder, the LLM
+is mocked, and indexes live in a temp dir. Results are written as JSON and
+compared against a stored baseline; any case whose median got slower than
+the threshold fails the run (exit code 1).
+
+    python -m benchmarks.suite                          # quick tier vs benchmarks/baseline.json
+    python -m benchmarks.suite --tier full --out bench.json
+    python -m benchmarks.suite --update-baseline        # after an intentional change
+
+Tiers: smoke (seconds, used by the tests), quick (~a minute, the CI default),
+full (1-500 subjects, 1-365 days, 1K-1M chunks; minutes and a few GB of RAM).
+"""
+import argparse, json, os, platform, random, statistics, sys, tempfile, time
+from typing import Callable, Dict, List, Optional, Tuple
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+TIERS = {
+    "smoke": {"subjects": [1, 20], "plans": [(5, 7)], "chunks": [200], "search": [1_000], "e2e": [5],
+              "cohort": [10], "schedules": [(20, 30)]},
+    "quick": {"subjects": [1, 50, 500], "plans": [(1, 1), (20, 90), (500, 365)], "chunks": [1_000, 20_000],
+              "search": [1_000, 20_000], "e2e": [5, 50], "cohort": [100, 1_000], "schedules": [(100, 365)]},
+    "full": {"subjects": [1, 50, 500], "plans": [(1, 1), (20, 90), (100, 180), (500, 365)],
+             "chunks": [1_000, 100_000], "streamed_builds": [1_000_000], "search": [1_000, 100_000, 1_000_000],
+             "e2e": [5, 50, 500], "cohort": [1_000, 10_000], "schedules": [(100, 365), (500, 365)]},
+}
+
+_VOCAB = ("derivative integral limit vector matrix eigenvalue momentum energy entropy enzyme cell mitosis "
+          "protein reaction equilibrium mole acid base revolution treaty empire theorem proof lemma graph "
+          "tree sorting recursion algorithm memory voltage current resistance wave photon orbit").split()
+
+# ----- synthetic workloads -----
+def synthetic_raw_subjects(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [{"name": f"Subject {i}", "difficulty": rng.randint(1, 5),
+             **({"target_hours": round(rng.uniform(2, 80), 1)} if rng.random() < 0.3 else {})} for i in range(n)]
+
+def synthetic_text(n_chars: int, seed: int = 0) -> str:
+    """Sentences and paragraphs of course vocabulary, ~n_chars long."""
+    rng = random.Random(seed)
+    out, size = [], 0
+    while size < n_chars:
+        sent = " ".join(rng.choice(_VOCAB) for _ in range(rng.randint(6, 18))).capitalize() + ". "
+        if rng.random() < 0.1:
+            sent += "\n\n"
+        out.append(sent)
+        size += len(sent)
+    return "".join(out)
+
+def synthetic_chunks(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(_VOCAB) for _ in range(rng.randint(20, 60))) for _ in range(n)]
+
+# ----- timing -----
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None,
+            budget_s: float = 10.0) -> Dict:
+    """Run fn up to `repeat` times (fewer if a run exhausts budget_s). Times exclude setup."""
+    times = []
+    t_end = time.perf_counter() + budget_s
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+        if time.perf_counter() > t_end:
+            break
+    return {"min_ms": round(min(times) * 1000, 3), "median_ms": round(statistics.median(times) * 1000, 3),
+            "runs": len(times)}
+
+# ----- cases -----
+def _bench_priorities(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    from tools.priority_score import build_priorities
+    out = {}
+    for n in tier["subjects"]:
+        raw = synthetic_raw_subjects(n)
+        out[f"priorities/subjects={n}"] = measure(lambda: build_priorities(raw, 30), repeat * 10)
+    return out
+
+def _bench_allocate(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    from tools.priority_score import build_priorities
+    from tools.allocate_time import allocate_time_vectorized
+    out = {}
+    for n, days in tier["plans"]:
+        subs = build_priorities(synthetic_raw_subjects(n), days)["subjects"]
+        out[f"allocate/subjects={n},days={days}"] = measure(lambda: allocate_time_vectorized(subs, days, 4.0), repeat)
+    return out
+
+def _bench_schedule(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    """Constrained scheduler: exam days, per-subject daily caps, uneven availability and spaced reviews."""
+    from tools.priority_score import build_priorities
+    from tools.scheduler import schedule
+    out = {}
+    for n, days in tier["schedules"]:
+        rng = random.Random(0)
+        raw = [{**s, "exam_day": rng.randint(days // 10 + 1, days + 1), "max_hours_per_day": 2.0}
+               for s in synthetic_raw_subjects(n)]
+        subs = build_priorities(raw, days)["subjects"]
+        availability = [rng.choice([0.0, 2.0, 4.0, 6.0, 8.0]) for _ in range(days)]
+        out[f"schedule/subjects={n},days={days}"] = measure(
+            lambda: schedule(subs, days, 4.0, availability=availability, review={"hours": 0.5}), repeat)
+    return out
+
+def _bench_chunk(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    from tools.rag_store import _chunk
+    out = {}
+    for n in tier["chunks"]:
+        text = synthetic_text(n * 780)  # ~n chunks at 900 chars with 120 overlap
+        out[f"chunk/chunks={n}"] = measure(lambda: _chunk(text), repeat)
+    return out
+
+def _bench_build(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    import tools.rag_store as rs
+    out = {}
+    for n in tier["chunks"]:
+        notes = [synthetic_text(780 * min(n, 50), seed=i) for i in range(max(1, n // 50))]
+
+        def reset():
+            rs._REGISTRY.clear()
+            rs.get_store().clear()
+
+        out[f"build_index/chunks={n}"] = measure(lambda: rs.build_ephemeral_index(notes), max(1, repeat // 2), reset)
+    # build_ephemeral_index holds every chunk in memory, so million-chunk builds go through
+    # the store in slices, like ingest does (the search case then reuses the index)
+    for n in tier.get("streamed_builds", []):
+        out[f"build_index/streamed,chunks={n}"] = measure(lambda: _search_store(n, fresh=True), 1)
+    os.environ.pop("RAG_INDEX_NAME", None)
+    return out
+
+def _search_store(n: int, fresh: bool = False):
+    """A store with n synthetic chunks (rebuilt if fresh), registered as the active RAG index."""
+    import tools.rag_store as rs
+    from tools.index_store import IndexStore, auto_kind
+    name = f"bench-{n}"
+    os.environ["RAG_INDEX_NAME"] = name
+    store = IndexStore(name, kind=auto_kind(n))  # fixed kind: no tier-crossing rebuilds while loading
+    if fresh or store.ntotal != n:
+        store.clear()
+        step = 50_000
+        for i in range(0, n, step):
+            texts = synthetic_chunks(min(step, n - i), seed=i)
+            store.add_documents("bench", texts, vectors=rs._embed_texts(texts))
+    rs._REGISTRY.put(store)
+    return store
+
+def _bench_search(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    import tools.rag_store as rs
+    out = {}
+    queries = [f"{w} key formulas concepts summaries" for w in _VOCAB[:32]]
+    for n in tier["search"]:
+        _search_store(n)
+        # clearing the query memo keeps query embedding in the measurement
+        out[f"search/chunks={n},queries=32"] = measure(lambda: rs.search_many(queries, k=4, mode="vector"),
+                                                      repeat * 3, rs._QUERY_MEMO.clear)
+        out[f"search/chunks={n},queries=1"] = measure(lambda: rs.search(queries[0], k=4, mode="vector"), repeat * 3,
+                                                     rs._QUERY_MEMO.clear)
+        for mode in ("hybrid", "lexical"):
+            out[f"search/chunks={n},queries=32,mode={mode}"] = measure(
+                lambda: rs.search_many(queries, k=4, mode=mode), repeat * 3, rs._QUERY_MEMO.clear)
+    os.environ.pop("RAG_INDEX_NAME", None)
+    return out
+
+def _bench_e2e(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    import agents.schedule_agent as sa
+    import tools.rag_store as rs
+    _search_store(tier["search"][0])
+    real = sa.write_tips
+    sa.write_tips = lambda **kw: {"study_principles": ["mock"], "focus_order": [s["name"] for s in kw["subjects"]]}
+    out = {}
+    try:
+        agent = sa.build_schedule_agent()
+        for n in tier["e2e"]:
+            state = {"days_left": 30, "hours_per_day": 4.0, "subjects": synthetic_raw_subjects(n)}
+            out[f"e2e_graph/subjects={n}"] = measure(lambda: agent.invoke(state), repeat, rs._QUERY_MEMO.clear)
+    finally:
+        sa.write_tips = real
+        os.environ.pop("RAG_INDEX_NAME", None)
+    return out
+
+def _bench_replan(tier: Dict, repeat: int) -> Dict[str, Dict]:
+    """A cohort's daily replan: each student logs day 1 (an hour short) and the open days are re-allocated."""
+    from agents.replan import StudyPlan
+    out = {}
+    for n in tier["cohort"]:
+        plans: List = []
+
+        def setup():
+            plans[:] = []
+            for i in range(n):
+                plan = StudyPlan.build(synthetic_raw_subjects(6, seed=i), 60, 4.0)
+                plan.tips_basis = (plan.overbooked, plan.hours_gap)  # as if tips were written
+                day1 = {b["subject"]: b["hours"] for b in plan.timetable[0]["blocks"]}
+                day1[next(iter(day1))] -= 1.0
+                plan.log_progress(1, day1)
+                plans.append(plan)
+
+        out[f"replan/students={n},days=60"] = measure(lambda: [p.replan(regenerate_tips=False) for p in plans],
+                                                       repeat, setup)
+    return out
+
+CASES = {
+    "priorities": _bench_priorities,
+    "allocate": _bench_allocate,
+    "schedule": _bench_schedule,
+    "chunk": _bench_chunk,
+    "build_index": _bench_build,
+    "search": _bench_search,
+    "e2e": _bench_e2e,
+    "replan": _bench_replan,
+}
+
+def run(tier: str = "quick", only: Optional[List[str]] = None, repeat: int = 5, workdir: Optional[str] = None) -> Dict:
+    """Run the suite in an isolated, offline environment. Returns {"meta", "results"}."""
+    env = {"EMBED_BACKEND": "hash", "EMBED_CACHE": "0", "LLM_CACHE": "0", "TELEMETRY": "0",
+           "RAG_INDEX_DIR": os.path.join(workdir or tempfile.mkdtemp(prefix="bench-"), "rag_index")}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        import tools.rag_store as rs
+        rs._REGISTRY.clear()
+        results = {}
+        for name, fn in CASES.items():
+            if not only or name in only:
+                results.update(fn(TIERS[tier], repeat))
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    import faiss, numpy
+    meta = {"tier": tier, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "numpy": numpy.__version__, "faiss": faiss.__version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+def compare(results: Dict, baseline: Dict, threshold: float = 0.3,
+            min_delta_ms: float = 0.5) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Compare medians case by case. Returns (rows, regressions); a regression is
+    a case more than `threshold` (fraction) and more than min_delta_ms slower
+    than its baseline (the floor keeps microsecond cases from flapping).
+    Cases missing from either side are reported with ratio None and never fail.
+    """
+    rows, regressions = [], []
+    base = baseline.get("results", {})
+    for case, r in sorted(results.get("results", {}).items()):
+        b = base.get(case)
+        ratio = round(r["median_ms"] / b["median_ms"], 3) if b and b["median_ms"] > 0 else None
+        row = {"case": case, "median_ms": r["median_ms"],
+               "baseline_ms": b["median_ms"] if b else None, "ratio": ratio}
+        rows.append(row)
+        if ratio is not None and ratio > 1 + threshold and r["median_ms"] - b["median_ms"] > min_delta_ms:
+            regressions.append(row)
+    return rows, regressions
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tier", choices=sorted(TIERS), default="quick")
+    ap.add_argument("--only", default="", help=f"comma-separated subset of: {','.join(CASES)}")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", default="", help="write results JSON here")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--threshold", type=float, default=0.3, help="allowed slowdown vs baseline (0.3 = 30%%)")
+    ap.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    args = ap.parse_args()
+
+    results = run(args.tier, [x for x in args.only.split(",") if x], args.repeat)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline updated: {args.baseline} ({len(results['results'])} cases)")
+        return
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    rows, regressions = compare(results, baseline, args.threshold)
+    for r in rows:
+        flag = "  REGRESSION" if r in regressions else ""
+        base = f"{r['baseline_ms']:>10.3f}" if r["baseline_ms"] is not None else f"{'-':>10}"
+        ratio = f"{r['ratio']:.2f}x" if r["ratio"] is not None else "new"
+        print(f"{r['case']:<45} {r['median_ms']:>10.3f} ms  base {base} ms  {ratio}{flag}")
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
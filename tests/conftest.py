@@ -0,0 +1,12 @@
+# tests/conftest.py
+import pytest
+
+@pytest.fixture(autouse=True)
+def _isolated_rag_storage(monkeypatch, tmp_path):
+    """Keep on-disk indexes and caches out of the working tree during tests."""
+    monkeypatch.setenv("RAG_INDEX_DIR", str(tmp_path / "rag_index"))
+    monkeypatch.setenv("EMBED_CACHE_PATH", str(tmp_path / "cache" / "embeddings.sqlite"))
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache" / "llm.sqlite"))
+    import tools.rag_store as rs
+    from tools.index_registry import IndexRegistry
+    monkeypatch.setattr(rs, "_REGISTRY", IndexRegistry())
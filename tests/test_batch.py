@@ -0,0 +1,75 @@
+# tests/test_batch.py
+import json
+
+import agents.schedule_agent as sa
+from agents.batch import run_batch
+
+def _inputs(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({
+                "id": f"s{i}", "days_left": 5, "hours_per_day": 3.0,
+                "subjects": [{"name": "Math", "difficulty": 1 + i % 5}, {"name": "Bio", "difficulty": 2}],
+            }) + "\n")
+
+def _records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_batch_streams_and_resumes(tmp_path, monkeypatch):
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _inputs(src, 6)
+
+    async def flaky_tips(subjects, timetable, overbooked, hours_gap, contexts=None):
+        if len(subjects) == 2 and subjects[0]["difficulty"] == 3:
+            raise RuntimeError("quota")
+        return {"tips": ["ok"]}
+
+    monkeypatch.setattr(sa, "write_tips_async", flaky_tips)
+    stats = run_batch(str(src), str(out), workers=2, llm_concurrency=2)
+    assert (stats["ok"], stats["error"], stats["skipped"]) == (5, 1, 0)
+    assert stats["stages"]["plan"]["count"] == 6
+    assert stats["stages"]["tips"]["count"] == 5
+    recs = _records(out)
+    assert {r["id"] for r in recs if r["status"] == "error"} == {"s2"}
+    ok = next(r for r in recs if r["id"] == "s0")
+    assert ok["state"]["tips"] == {"tips": ["ok"]}
+    assert len(ok["state"]["timetable"]) == 5
+
+    # rerun: only the failed plan is regenerated
+    async def fixed_tips(**kw):
+        return {"tips": ["retry"]}
+
+    monkeypatch.setattr(sa, "write_tips_async", fixed_tips)
+    stats = run_batch(str(src), str(out), workers=1)
+    assert (stats["ok"], stats["error"], stats["skipped"]) == (1, 0, 5)
+    assert _records(out)[-1]["id"] == "s2"
+
+def test_batch_reports_malformed_lines_and_keeps_going(tmp_path, monkeypatch):
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _inputs(src, 2)
+    with open(src, "a", encoding="utf-8") as f:
+        f.write('{"id": "s9", "days_left": \n[1, 2]\n')
+    with open(src, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(src, "w", encoding="utf-8") as f:
+        f.writelines([lines[0], lines[2], lines[3], lines[1]])  # bad lines before the last good one
+
+    async def tips(**kw):
+        return {"tips": ["ok"]}
+
+    monkeypatch.setattr(sa, "write_tips_async", tips)
+    stats = run_batch(str(src), str(out), workers=1)
+    assert (stats["ok"], stats["error"]) == (2, 2)
+    recs = {r["id"]: r for r in _records(out)}
+    assert recs["s0"]["status"] == recs["s1"]["status"] == "ok"
+    assert recs["line-2"]["status"] == "error" and recs["line-2"]["error"].startswith("JSONDecodeError")
+    assert recs["line-3"]["status"] == "error" and "JSON object" in recs["line-3"]["error"]
+
+    with open(src, "a", encoding="utf-8") as f:  # a repeated id is planned once, here and on resume
+        f.write(lines[0])
+    for _ in range(2):
+        stats = run_batch(str(src), str(out), workers=1)
+        assert (stats["ok"], stats["error"], stats["skipped"]) == (0, 0, 5)
+    ids = [r["id"] for r in _records(out)]
+    assert sorted(ids) == ["line-2", "line-3", "s0", "s1"]
@@ -0,0 +1,17 @@
+# tests/test_bench_suite.py
+from benchmarks.suite import compare, run
+
+def test_smoke_tier_runs_offline(tmp_path):
+    out = run("smoke", repeat=1, workdir=str(tmp_path))
+    cases = out["results"]
+    for prefix in ("priorities/", "allocate/", "chunk/", "build_index/", "search/", "e2e_graph/"):
+        assert any(c.startswith(prefix) for c in cases), prefix
+    assert all(r["median_ms"] >= r["min_ms"] > 0 for r in cases.values())
+
+def test_compare_flags_only_real_regressions():
+    base = {"results": {"a": {"median_ms": 10.0}, "b": {"median_ms": 0.01}, "c": {"median_ms": 5.0}}}
+    new = {"results": {"a": {"median_ms": 14.0}, "b": {"median_ms": 0.4}, "c": {"median_ms": 5.5},
+                       "d": {"median_ms": 1.0}}}
+    rows, regressions = compare(new, base, threshold=0.3)
+    assert [r["case"] for r in regressions] == ["a"]  # b is 40x but only 0.39 ms; c is within 30%
+    assert next(r for r in rows if r["case"] == "d")["ratio"] is None
@@ -0,0 +1,40 @@
+# tests/test_chunker.py
+import re
+
+from tools.chunker import iter_spans, chunk_text
+
+NOTES = ("Kinematics is the study of motion. It uses v = u + at and s = ut + 1/2 a t^2. " * 30
+         + "\n\nEssays need a claim. Then evidence! Then reasoning? " * 30)
+
+def test_spans_are_offsets_ending_on_sentence_boundaries():
+    spans = list(iter_spans(NOTES, max_chars=400, overlap=60, tolerance=120))
+    assert len(spans) > 5
+    for a, b in spans:
+        assert 0 <= a < b <= len(NOTES) and b - a <= 400
+        assert not NOTES[a].isspace() and not NOTES[b - 1].isspace()
+        assert NOTES[a - 1].isspace() if a else True  # never starts mid-word
+    for a, b in spans[:-1]:
+        assert NOTES[b - 1] in ".!?"
+    # consecutive chunks overlap and together cover every non-space char
+    for (a1, b1), (a2, b2) in zip(spans, spans[1:]):
+        assert a1 < a2 <= b1
+    assert spans[0][0] == 0 and spans[-1][1] == len(NOTES.rstrip())
+
+def test_hard_cut_without_whitespace_and_token_budget():
+    assert list(iter_spans("x" * 2000, max_chars=900, overlap=120)) == [(0, 900), (900, 1800), (1800, 2000)]
+    assert list(iter_spans("   \n ")) == []
+
+    words = lambda s: len(s.split())
+    for a, b in iter_spans(NOTES, max_chars=900, max_tokens=20, count_tokens=words):
+        assert words(NOTES[a:b]) <= 20
+    # chunks shrunk by the token count keep overlapping by at most half, so the pass still advances
+    spans = list(iter_spans(NOTES, max_chars=900, overlap=120, max_tokens=10, count_tokens=words))
+    for (a1, b1), (a2, b2) in zip(spans, spans[1:]):
+        assert a1 < a2 and b1 < b2 and b1 - a2 <= (b1 - a1) // 2
+    no_overlap = list(iter_spans(NOTES, max_chars=900, overlap=0, max_tokens=10, count_tokens=words))
+    assert len(spans) <= 2 * len(no_overlap)
+
+def test_chunk_text_collapses_whitespace():
+    chunks = chunk_text("One.\n\n  Two   three.\tFour.", max_chars=900)
+    assert chunks == ["One. Two three. Four."]
+    assert all(not re.search(r"\s\s", c) for c in chunk_text(NOTES, max_chars=300))
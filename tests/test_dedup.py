@@ -0,0 +1,89 @@
+# tests/test_dedup.py
+import pytest
+
+from benchmarks.suite import synthetic_chunks, synthetic_text
+from tools.dedup import NearDupIndex, dedup_hits, dedup_stream, signature, similarity
+
+def test_signatures_separate_near_duplicates_from_unrelated_and_adjacent_chunks():
+    a, b = synthetic_chunks(2, seed=1)
+    assert similarity(signature(a), signature(a + " Again.")) >= 0.8
+    assert similarity(signature(a), signature(a.upper())) == 1.0
+    assert similarity(signature(a), signature(b)) < 0.2
+
+    from tools.rag_store import _chunk
+    chunks = _chunk(synthetic_text(20_000, seed=2))
+    sigs = [signature(c) for c in chunks]
+    assert max(similarity(x, y) for x, y in zip(sigs, sigs[1:])) < 0.5  # the 120-char overlap isn't a duplicate
+
+def test_dedup_stream_keeps_first_occurrence():
+    chunks = synthetic_chunks(50, seed=3)
+    items = [(f"a{i}", c) for i, c in enumerate(chunks)] + [(f"b{i}", chunks[i] + " (copy)") for i in range(0, 50, 5)]
+    dropped = []
+    kept = list(dedup_stream(items, NearDupIndex(threshold=0.8), dropped))
+    assert [label for label, _ in kept] == [f"a{i}" for i in range(50)]
+    assert [(d[0], d[2]) for d in dropped] == [(f"b{i}", f"a{i}") for i in range(0, 50, 5)]
+
+def test_dedup_hits_backfills_from_deeper_results():
+    a, b, c = synthetic_chunks(3, seed=4)
+    hits = [{"id": 1, "text": a}, {"id": 2, "text": a + " Again."}, {"id": 3, "text": b}, {"id": 4, "text": c}]
+    dropped = []
+    assert [h["id"] for h in dedup_hits(hits, 2, dropped=dropped)] == [1, 3]
+    assert [h["id"] for h in dropped] == [2]
+
+def test_repeated_hits_reuse_their_signatures(monkeypatch):
+    import tools.dedup as dd
+    hits = [{"id": i, "text": t} for i, t in enumerate(synthetic_chunks(3, seed=7))]
+    computed = []
+    monkeypatch.setattr(dd, "signature", lambda text: computed.append(text) or signature(text))
+    monkeypatch.setattr(dd, "_SIG_MEMO", type(dd._SIG_MEMO)())
+    for _ in range(3):
+        assert [h["id"] for h in dedup_hits(hits, 3)] == [0, 1, 2]
+    assert len(computed) == 3
+
+def test_overlapping_pastes_are_embedded_once_and_searched_without_repeats(monkeypatch):
+    pytest.importorskip("faiss")
+    import tools.rag_store as rs
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    monkeypatch.setenv("EMBED_CACHE", "0")
+    notes = synthetic_text(9_000, seed=5)
+    other = synthetic_text(4_000, seed=6)
+    embedded = []
+    real = rs._embed_texts
+    monkeypatch.setattr(rs, "_embed_texts", lambda texts: embedded.extend(texts) or real(texts))
+
+    n, _ = rs.build_ephemeral_index([notes, notes + "\n\n" + other])
+    stats = rs.last_build_stats()
+    n_notes = len(rs._chunk(notes))
+    assert stats["duplicates"] == n_notes and n == len(embedded) == n_notes + len(rs._chunk(other))
+    assert stats["dedup_ratio"] == pytest.approx(n_notes / (n + n_notes), abs=1e-4)
+    assert stats["embeddings_saved"] == n_notes and stats["index_bytes_saved"] > n_notes * 256 * 4
+
+    monkeypatch.setenv("RAG_DEDUP", "0")
+    rs.build_ephemeral_index([notes, notes], source_name="Twice")  # duplicates stored on purpose
+    query = notes.split(".")[0]
+    assert len({h["text"] for h in rs.search(query, k=4, mode="lexical")}) < 4
+    monkeypatch.setenv("RAG_DEDUP", "1")
+    hits = rs.search(query, k=4, mode="lexical")
+    sigs = [signature(h["text"]) for h in hits]
+    assert len(hits) == 4
+    assert all(similarity(x, y) < 0.8 for i, x in enumerate(sigs) for y in sigs[i + 1:])
+
+def test_ingest_dedups_within_a_file_but_keeps_copies_in_other_files(monkeypatch, tmp_path):
+    pytest.importorskip("faiss")
+    import tools.rag_store as rs
+    from tools.ingest import ingest_paths
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    monkeypatch.chdir(tmp_path)
+    text = synthetic_text(3_000, seed=7)
+    (tmp_path / "a.txt").write_text(text + "\n\n" + text)
+    (tmp_path / "b.txt").write_text("Bob notes. " + text)
+    n_b = len(rs._chunk("Bob notes. " + text))
+
+    stats = ingest_paths(["a.txt", "b.txt"])
+    sources = rs.get_store().sources()
+    assert stats["duplicates"] > 0 and sources["a.txt"] == len(rs._chunk(text + "\n\n" + text)) - stats["duplicates"]
+    assert sources["b.txt"] == n_b  # the same text in another file is that file's content too
+
+    (tmp_path / "a.txt").write_text("Something else entirely.\n")
+    ingest_paths(["a.txt"])
+    assert rs.get_store().sources()["b.txt"] == n_b
@@ -0,0 +1,61 @@
+# tests/test_fake_backend.py
+import random
+
+import pytest
+
+import utils.llm_client as llm
+from benchmarks import loadtest
+from tools.embeddings import get_embedder
+from utils import fake_backend, telemetry
+
+@pytest.fixture(autouse=True)
+def _fresh_fakes(monkeypatch):
+    monkeypatch.setenv("FAKE_SEED", "1")
+    monkeypatch.setenv("LLM_CACHE", "0")
+    fake_backend.reset()
+    telemetry.reset()
+    yield
+    fake_backend.reset()
+
+def test_latency_specs():
+    rng = random.Random(0)
+    assert fake_backend.parse_latency("const:50")(rng) == 0.05
+    assert 0.2 <= fake_backend.parse_latency("uniform:200,300")(rng) <= 0.3
+    draws = sorted(fake_backend.parse_latency("lognormal:100,0.5")(rng) for _ in range(2000))
+    assert draws[1000] == pytest.approx(0.1, rel=0.1)  # median
+    with pytest.raises(RuntimeError):
+        fake_backend.parse_latency("pareto:1")
+
+def test_fake_gemini_retries_injected_rate_limits(monkeypatch):
+    monkeypatch.setattr(llm, "_GEMINI_MODEL", "fake")
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setenv("FAKE_LLM_429_RATE", "0.3")
+    monkeypatch.setenv("LLM_MAX_RETRIES", "10")
+    monkeypatch.setattr(llm.time, "sleep", lambda s: None)  # backoff
+    prompt = "Subjects (name | difficulty | required_hours | weight):\nMath | 4 | 16h | 0.667\nOverbooked: True\n"
+    outs = [llm.gemini_json("sys", prompt) for _ in range(20)]
+    assert all(o["focus_order"] == ["Math"] and "if_overbooked" in o for o in outs)
+    injected = fake_backend.stats()["LLM"]
+    assert injected["failures"]["429"] > 0
+    assert injected["calls"] == 20 + injected["failures"]["429"] == 20 + telemetry.counters()["retry.llm"]
+
+def test_fake_embeddings_selected_by_embed_model(monkeypatch):
+    monkeypatch.setenv("EMBED_BACKEND", "gemini")
+    monkeypatch.setenv("EMBED_MODEL", "fake")
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    emb = get_embedder()
+    assert isinstance(emb, fake_backend.FakeEmbedder)
+    vecs = emb.embed(["momentum energy", "momentum energy", "enzyme cell"])
+    assert vecs.shape == (3, 256) and (vecs[0] == vecs[1]).all()
+    assert fake_backend.stats()["EMBED"]["calls"] == 1  # one batch request
+
+def test_loadtest_reports_throughput_latency_and_retries(tmp_path):
+    report = loadtest.run(plans=6, concurrency=3, subjects=2, days=5, notes_chunks=20, workdir=str(tmp_path),
+                          fakes={"FAKE_LLM_LATENCY_MS": "const:5", "FAKE_EMBED_ERROR_RATE": "0.3"})
+    assert report["ok"] == 6 and report["errors"] == {}
+    assert set(report["nodes"]) == {"score", "allocate", "retrieve", "tips"}
+    assert report["nodes"]["retrieve"]["calls"] == 12
+    assert report["nodes"]["tips"]["p99_ms"] >= report["nodes"]["tips"]["p50_ms"] >= 5
+    assert report["latency"]["p50_ms"] > 0 and report["plans_per_sec"] > 0
+    assert report["retries"]["embed"] == report["injected"]["EMBED"]["failures"]["503"] > 0
+    assert llm._GEMINI_MODEL != "fake"  # restored
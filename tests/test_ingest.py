@@ -0,0 +1,89 @@
+# tests/test_ingest.py
+import pytest
+
+from tools.ingest import iter_files, iter_pages, batched, ingest_paths
+
+def _write_notes(tmp_path):
+    d = tmp_path / "notes"
+    (d / "sub").mkdir(parents=True)
+    (d / "physics.md").write_text("# Kinematics\n" + "v = u + at and s = ut + 1/2 a t^2.\n" * 1000)
+    (d / "sub" / "essay.txt").write_text("Claim, evidence, reasoning.\n" * 300)
+    (d / "ignore.png").write_bytes(b"\x89PNG")
+    return d
+
+def test_iter_files_and_pages_are_lazy(tmp_path):
+    d = _write_notes(tmp_path)
+    files = list(iter_files([str(d)]))
+    assert [f.rsplit("/", 1)[-1] for f in files] == ["physics.md", "essay.txt"]
+
+    pages = iter_pages(files[0])
+    no, text = next(pages)  # first block only; the rest is still unread
+    assert no == 1 and 16_000 <= len(text) < 17_000
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_ingest_paths_indexes_each_file_as_a_source(monkeypatch, tmp_path, workers):
+    pytest.importorskip("faiss")
+    import tools.rag_store as rs
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    monkeypatch.chdir(tmp_path)
+    d = _write_notes(tmp_path)
+
+    seen = []
+    stats = ingest_paths(["notes"], batch_size=8, workers=workers, progress=seen.append)
+    sources = rs.get_store().sources()
+    assert set(sources) == {"notes/physics.md", "notes/sub/essay.txt"}
+    assert stats["files"] == 2 and stats["chunks"] == sum(sources.values())
+    assert {s["stage"] for s in seen} == {"extracted", "indexed"}
+
+    # re-ingesting replaces a file's chunks instead of duplicating them
+    (d / "sub" / "essay.txt").write_text("Thesis statement.\n")
+    ingest_paths(["notes"], batch_size=8, workers=workers)
+    assert rs.get_store().sources()["notes/sub/essay.txt"] == 1
+    assert rs.search("thesis statement", k=1)[0]["path"] == "notes/sub/essay.txt"
+
+def test_text_block_ranges_match_a_full_read(tmp_path):
+    from tools.ingest import TEXT_BLOCK_CHARS, _jobs
+    path = tmp_path / "long.md"
+    path.write_bytes("".join(f"Line {i}: momentum, café, torque.\r\n" for i in range(6000)).encode("utf-8"))
+    whole = list(iter_pages(str(path)))
+    assert len(whole) > 3 and all(len(t) >= 0.9 * TEXT_BLOCK_CHARS for _, t in whole[:-1])  # blocks are bytes; \r\n and é shrink
+    parts = [p for start in range(0, len(whole) + 1, 2) for p in iter_pages(str(path), start, start + 2)]
+    assert parts == whole and "\r" not in whole[0][1]
+    jobs = list(_jobs([str(path)], str(tmp_path)))
+    assert jobs[0][2:] == (0, 16) and all(j[1] == "long.md" for j in jobs)
+
+def test_ingest_writes_the_index_once_per_source(monkeypatch, tmp_path):
+    pytest.importorskip("faiss")
+    import faiss
+    import tools.rag_store as rs
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    monkeypatch.setenv("RAG_DEDUP", "0")  # the notes repeat one line; keep every chunk
+    monkeypatch.chdir(tmp_path)
+    _write_notes(tmp_path)
+    writes = []
+    real = faiss.write_index
+    monkeypatch.setattr(faiss, "write_index", lambda index, path: writes.append(path) or real(index, path))
+
+    stats = ingest_paths(["notes"], batch_size=1)
+    assert stats["batches"] == stats["chunks"] > 2 and len(writes) == 2
+    assert sum(rs.get_store().sources().values()) == stats["chunks"]
+
+def test_ingest_dedups_paths_and_keeps_the_registry_in_budget(monkeypatch, tmp_path):
+    pytest.importorskip("faiss")
+    import numpy as np
+    import tools.rag_store as rs
+    from tools.index_registry import IndexRegistry
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    monkeypatch.chdir(tmp_path)
+    _write_notes(tmp_path)
+    reg = IndexRegistry(budget_bytes=104_000)
+    monkeypatch.setattr(rs, "_REGISTRY", reg)
+    vec = np.random.RandomState(0).rand(100, 256).astype("float32")  # ~103 KB flat index: fits alone, not with another
+    rs.get_store("other").add_documents("other", [f"chunk {i}" for i in range(100)], vec)
+
+    # the same file reached three ways is ingested once
+    stats = ingest_paths(["notes", "notes/physics.md", "./notes/sub/../physics.md"], index_name="course")
+    assert "other" not in reg._open and "course" in reg._open  # evicted after the writes, never the target
+    sources = rs.get_store("course").sources()
+    assert stats["files"] == 2 and sum(sources.values()) == stats["chunks"]
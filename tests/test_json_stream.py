@@ -0,0 +1,52 @@
+# tests/test_json_stream.py
+import json
+
+import pytest
+
+from utils.json_stream import JsonFieldStream
+
+TIPS = {
+    "study_principles": ["Spaced repetition", "Active recall \"quoted\" {braces}"],
+    "focus_order": ["Math", "Bio"],
+    "breaks": {"work": 50, "break": 10},
+    "daily_checklist": [],
+    "if_overbooked": {"strategy": "hybrid", "actions": ["cut scope, [maybe]"]},
+    "score": -1.5e3, "ok": True, "none": None, "name": "x\\yé",
+}
+
+def test_fields_arrive_as_soon_as_they_close():
+    text = json.dumps(TIPS, indent=2)
+    p = JsonFieldStream()
+    seen = []
+    cut = text.index('"focus_order"')
+    seen += p.feed(text[:cut])
+    assert seen == [("study_principles", TIPS["study_principles"])]
+    for ch in text[cut:]:
+        seen += p.feed(ch)
+    assert dict(seen) == TIPS and p.done
+    assert [k for k, _ in seen] == list(TIPS)
+
+@pytest.mark.parametrize("bad", ['[1, 2]', '{"a" 1}', '{"a": 1,}', '{"a": 1} x'])
+def test_malformed_input_raises(bad):
+    with pytest.raises(ValueError):
+        JsonFieldStream().feed(bad)
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import given, settings, strategies as st
+
+values = st.recursive(
+    st.none() | st.booleans() | st.integers() | st.floats(allow_nan=False, allow_infinity=False) | st.text(),
+    lambda inner: st.lists(inner, max_size=4) | st.dictionaries(st.text(max_size=5), inner, max_size=4),
+    max_leaves=10,
+)
+
+@settings(max_examples=200, deadline=None)
+@given(st.dictionaries(st.text(max_size=8), values, max_size=6), st.integers(1, 7), st.booleans())
+def test_any_chunking_matches_json_loads(obj, step, indent):
+    text = json.dumps(obj, indent=2 if indent else None)
+    p = JsonFieldStream()
+    got = []
+    for i in range(0, len(text), step):
+        got += p.feed(text[i:i + step])
+    assert p.done
+    assert dict(got) == json.loads(text)
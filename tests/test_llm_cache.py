@@ -0,0 +1,45 @@
+# tests/test_llm_cache.py
+import json
+
+import utils.llm_client as llm
+from utils.response_cache import ResponseCache
+
+class _FakeModel:
+    def __init__(self, calls, text):
+        self.calls, self.text = calls, text
+
+    def generate_content(self, prompt):
+        self.calls.append(prompt)
+        return type("Resp", (), {"text": self.text})()
+
+def test_gemini_json_served_from_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "_get_model", lambda system="": _FakeModel(calls, json.dumps({"tips": [1]})))
+    a = llm.gemini_json("sys", "Subjects:\n  Math  ")
+    b = llm.gemini_json("sys", "Subjects: Math")  # same prompt after whitespace normalization
+    assert a == b == {"tips": [1]}
+    assert len(calls) == 1
+    b["tips"].append(2)  # hits are independent copies
+    assert llm.gemini_json("sys", "Subjects: Math") == {"tips": [1]}
+    llm.gemini_json("other system", "Subjects: Math")
+    assert len(calls) == 2
+
+def test_invalid_json_is_not_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "_get_model", lambda system="": _FakeModel(calls, "not json"))
+    assert "error" in llm.gemini_json("sys", "u")
+    assert "error" in llm.gemini_json("sys", "u")
+    assert len(calls) == 2
+
+def test_ttl_and_lru_eviction(tmp_path):
+    c = ResponseCache(str(tmp_path / "c.sqlite"), max_entries=2, ttl=60, memory_entries=1)
+    c.put("m", "s", "u1", '{"a": 1}', latency=2.0)
+    assert c.get("m", "s", "u1") == {"a": 1}
+    c.put("m", "s", "u2", '{"a": 2}')
+    c.put("m", "s", "u3", '{"a": 3}')
+    assert c.stats()["entries"] == 2
+    c._db.execute("UPDATE responses SET created = created - 120")
+    c._mem.clear()
+    assert c.get("m", "s", "u3") is None  # expired
+    st = c.stats()
+    assert st["hits"] == 1 and st["seconds_saved"] == 2.0 and st["hit_rate"] == 0.5
@@ -0,0 +1,89 @@
+# tests/test_llm_client.py
+import asyncio, json, types
+
+import pytest
+
+import utils.llm_client as llm
+
+class ResourceExhausted(Exception):
+    pass
+
+class _AsyncModel:
+    def __init__(self, fail_first=0, delay=0.0):
+        self.fail_first, self.delay = fail_first, delay
+        self.calls, self.active, self.peak = 0, 0, 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        n = self.calls
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if n <= self.fail_first:
+                raise ResourceExhausted("429")
+            return type("Resp", (), {"text": json.dumps({"prompt": prompt})})()
+        finally:
+            self.active -= 1
+
+def test_models_are_pooled(monkeypatch):
+    configured, built = [], []
+    monkeypatch.setenv("GOOGLE_API_KEY", "k1")
+    monkeypatch.setattr(llm, "_MODELS", {})
+    monkeypatch.setattr(llm, "_CONFIGURED_KEY", None)
+    monkeypatch.setattr(llm, "genai", types.SimpleNamespace(
+        configure=lambda api_key: configured.append(api_key),
+        GenerativeModel=lambda **kw: built.append(kw) or object(),
+    ))
+    assert llm._get_model("a") is llm._get_model("a")
+    llm._get_model("b")
+    assert configured == ["k1"] and len(built) == 2
+
+def test_async_retries_and_limits_concurrency(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "0")
+    monkeypatch.setenv("LLM_CONCURRENCY", "3")
+    model = _AsyncModel(fail_first=2, delay=0.01)
+    monkeypatch.setattr(llm, "_get_model", lambda system="": model)
+
+    async def run():
+        return await asyncio.gather(*(llm.gemini_json_async("s", f"u{i}", base_delay=0.001) for i in range(10)))
+
+    out = asyncio.run(run())
+    assert [o["prompt"] for o in out] == [f"u{i}" for i in range(10)]
+    assert model.calls == 12 and model.peak <= 3
+
+def test_async_timeout(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "0")
+    model = _AsyncModel(delay=1.0)
+    monkeypatch.setattr(llm, "_get_model", lambda system="": model)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm.gemini_json_async("s", "u", timeout=0.01, max_retries=1, base_delay=0.001))
+    assert model.calls == 2
+
+def test_stream_yields_fields_then_caches(monkeypatch):
+    text = json.dumps({"study_principles": ["a"], "focus_order": ["Math"], "citations": []})
+    pulled = []
+
+    class StreamModel:
+        def generate_content(self, prompt, stream=False):
+            assert stream
+            for i in range(0, len(text), 5):
+                pulled.append(i)
+                yield type("Chunk", (), {"text": text[i:i + 5]})()
+
+    monkeypatch.setattr(llm, "_get_model", lambda system="": StreamModel())
+    it = llm.gemini_json_stream("s", "u")
+    assert next(it) == ("study_principles", ["a"])
+    assert len(pulled) < len(range(0, len(text), 5))  # first field arrived before the response finished
+    assert dict(it) == {"focus_order": ["Math"], "citations": []}
+    pulled.clear()
+    assert dict(llm.gemini_json_stream("s", "u")) == json.loads(text)
+    assert pulled == []  # served from the response cache
+
+def test_stream_reports_invalid_json(monkeypatch):
+    class StreamModel:
+        def generate_content(self, prompt, stream=False):
+            yield type("Chunk", (), {"text": '{"a": [1, '})()
+
+    monkeypatch.setattr(llm, "_get_model", lambda system="": StreamModel())
+    assert dict(llm.gemini_json_stream("s", "u")) == {"error": "Invalid JSON from Gemini", "raw": '{"a": [1, '}
@@ -0,0 +1,71 @@
+# tests/test_plan_table.py
+import json
+
+import numpy as np
+import pytest
+
+from agents.batch import plan_deterministic
+from benchmarks.suite import synthetic_raw_subjects
+from tools.allocate_time import allocate_time_columnar, allocate_time_vectorized
+from tools.plan_table import PlanTable, read_batch_output, write_ndjson, write_parquet
+from tools.priority_score import build_priorities
+from tools.scheduler import schedule
+
+def test_columnar_allocation_matches_timetable():
+    for n, days in [(0, 5), (3, 0), (6, 30), (20, 90)]:
+        subs = build_priorities(synthetic_raw_subjects(n), days)["subjects"]
+        ref = allocate_time_vectorized(subs, days, 4.0)
+        out = allocate_time_columnar(subs, days, 4.0)
+        assert out["plan"].to_timetable() == ref["timetable"]
+        assert out["per_subject_allocation"] == ref["per_subject_allocation"]
+        assert out["plan"].per_subject() == {s["name"]: pytest.approx(h, abs=0.05 * days)
+                                             for s, h in zip(subs, ref["per_subject_allocation"].values())}
+
+def test_round_trips_and_pandas_view():
+    subs = build_priorities([{"name": "Math", "difficulty": 5}, {"name": "Bio", "difficulty": 2}], 10)["subjects"]
+    timetable = schedule(subs, 10, 4.0, review={"intervals": [1, 3]})["timetable"]
+    plan = PlanTable.from_timetable(timetable, ["Math", "Bio"])
+    assert plan.to_timetable() == timetable
+    assert PlanTable.from_record(json.loads(json.dumps(plan.to_record()))).to_timetable() == timetable
+    assert plan.per_subject() == {"Math": 20.0, "Bio": 8.0}  # reviews excluded
+
+    late = [{"day": d["day"] + 4, "blocks": d["blocks"]} for d in timetable]  # a plan starting on day 5
+    assert PlanTable.from_timetable(late).to_timetable() == late
+    assert PlanTable.from_record(json.loads(json.dumps(PlanTable.from_timetable(late).to_record()))).to_timetable() == late
+    sparse = [late[0], late[3]]  # missing days come back empty
+    assert [d["day"] for d in PlanTable.from_timetable(sparse).to_timetable()] == [5, 6, 7, 8]
+    assert PlanTable.from_timetable(sparse).to_timetable()[1]["blocks"] == []
+
+    df = plan.to_pandas()
+    assert list(df.columns) == ["day", "subject", "hours", "review"]
+    assert list(df["subject"].cat.categories) == ["Math", "Bio"]
+    assert df["review"].sum() == 4
+    assert np.shares_memory(df["hours"].to_numpy(), plan.hours)
+
+def test_streaming_export_of_batch_output(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    src = tmp_path / "plans.jsonl"
+    with open(src, "w", encoding="utf-8") as f:
+        for i in range(5):
+            state = plan_deterministic({"days_left": 7, "hours_per_day": 3.0,
+                                        "subjects": synthetic_raw_subjects(3 + i, seed=i)})
+            f.write(json.dumps({"id": f"s{i}", "status": "ok", "state": state}) + "\n")
+        f.write(json.dumps({"id": "bad", "status": "error", "error": "quota", "state": {}}) + "\n")
+    plans = list(read_batch_output(str(src)))
+    assert [pid for pid, _ in plans] == [f"s{i}" for i in range(5)]
+    assert state["plan"] == plans[4][1].to_record()  # the graph's columnar plan, read as is
+    assert plans[4][1].to_timetable() == state["timetable"]
+
+    rows = write_parquet(iter(plans), str(tmp_path / "t.parquet"), row_group_rows=40)
+    table = pq.read_table(tmp_path / "t.parquet")
+    assert table.num_rows == rows == sum(len(p) for _, p in plans)
+    assert pq.ParquetFile(tmp_path / "t.parquet").num_row_groups > 1
+    df = table.to_pandas()
+    s3 = df[df["plan_id"] == "s3"]
+    assert s3["subject"].astype(str).tolist() == [plans[3][1].subjects[i] for i in plans[3][1].subject]
+
+    assert write_ndjson(iter(plans), str(tmp_path / "t.ndjson")) == 5
+    with open(tmp_path / "t.ndjson", encoding="utf-8") as f:
+        first = json.loads(f.readline())
+    assert first["id"] == "s0"
+    assert PlanTable.from_record(first).to_timetable() == plans[0][1].to_timetable()
@@ -0,0 +1,55 @@
+# tests/test_prompt_compact.py
+from tools.allocate_time import allocate_time_vectorized
+from tools.priority_score import build_priorities
+from tools.prompt_compact import approx_tokens, encode_timetable, rank_contexts, compact_sections
+from tools.tips_writer import _tips_prompt, prompt_stats
+
+def test_timetable_runs_and_totals():
+    tt = [{"day": d, "blocks": [{"subject": "Math", "hours": 2.0}]} for d in range(1, 6)]
+    tt += [{"day": 6, "blocks": [{"subject": "Math", "hours": 1.0}, {"subject": "Bio", "hours": 1.0}]},
+           {"day": 7, "blocks": []}]
+    assert encode_timetable(tt).splitlines() == [
+        "7 days; totals: Math 11h, Bio 1h", "D1-5: Math 2", "D6: Math 1, Bio 1", "D7: free"]
+
+def test_contexts_deduped_and_ranked():
+    ctx = {
+        "Math": [{"id": "a", "path": "p", "text": "x", "score": 0.5}, {"id": "b", "path": "p", "text": "y", "score": 0.9}],
+        "Bio": [{"id": "a", "path": "p", "text": "x", "score": 0.7}],
+    }
+    ranked = rank_contexts(ctx)
+    assert [c["id"] for c in ranked] == ["b", "a"]
+    # a score outranks position: Bio's second chunk beats Math's first
+    ctx = {"Math": [{"id": "m1", "path": "p", "text": "x", "score": 0.2}],
+           "Bio": [{"id": "b1", "path": "p", "text": "y", "score": 0.9}, {"id": "b2", "path": "p", "text": "z", "score": 0.8}]}
+    assert [c["id"] for c in rank_contexts(ctx)] == ["b1", "b2", "m1"]
+    # without scores, rank within the subject decides
+    ctx = {"Math": [{"id": "m1", "path": "p", "text": "x"}, {"id": "m2", "path": "p", "text": "y"}],
+           "Bio": [{"id": "b1", "path": "p", "text": "z"}]}
+    assert [c["id"] for c in rank_contexts(ctx)] == ["m1", "b1", "m2"]
+
+def test_budget_drops_lowest_ranked_chunks():
+    ctx = {"Math": [{"id": f"c{i}", "path": "p", "text": "word " * 100, "score": 1 - i / 10} for i in range(8)]}
+    _, _, block, info = compact_sections([], [], ctx, fixed_tokens=0, budget_tokens=400)
+    kept = [line.split("]")[0][1:] for line in block.splitlines()]
+    assert kept == [f"c{i}" for i in range(info["context_chunks_kept"])]
+    assert 0 < info["context_chunks_kept"] < 8
+    assert approx_tokens(block) <= 400
+
+def test_long_plan_prompt_is_much_smaller():
+    subs = build_priorities([{"name": "Math", "difficulty": 5}, {"name": "Bio", "difficulty": 3}], 60)["subjects"]
+    tt = allocate_time_vectorized(subs, 60, 0.5)["timetable"]
+    ctx = {s["name"]: [{"id": f"n#{i}", "path": "notes", "text": "fact " * 200, "score": 0.5} for i in range(4)]
+           for s in subs}  # the same 4 chunks retrieved for both subjects
+    _, user = _tips_prompt(subs, tt, True, 3.0, ctx)
+    stats = prompt_stats(subs, tt, True, 3.0, ctx)
+    assert stats["tokens_after"] == approx_tokens(user)
+    assert stats["tokens_after"] * 3 < stats["tokens_before"]
+    assert stats["context_chunks"] == 4
+    assert user.count("[n#0]") == 1 and "D1-60" in user
+
+def test_tips_prompt_skips_the_verbose_encoding(monkeypatch):
+    import tools.tips_writer as tw
+    monkeypatch.setattr(tw, "_verbose_prompt", lambda *a: (_ for _ in ()).throw(AssertionError("built")))
+    subs = build_priorities([{"name": "Math", "difficulty": 5}], 30)["subjects"]
+    _, user = _tips_prompt(subs, allocate_time_vectorized(subs, 30, 2.0)["timetable"], False, 0.0)
+    assert "30 days; totals: Math" in user and "NO_CONTEXT" in user
@@ -0,0 +1,313 @@
+# tests/test_rag_store.py
+import pytest
+
+from tools.embeddings import HashEmbedder, embed_in_batches
+from tools.embed_cache import EmbeddingCache
+
+class ResourceExhausted(Exception):
+    """Same class name as google.api_core's 429 error."""
+
+def test_embed_in_batches_keeps_order_and_retries():
+    calls = {"n": 0}
+
+    def flaky(batch):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise ResourceExhausted("429 quota")
+        return [[float(t)] for t in batch]
+
+    texts = [str(i) for i in range(23)]
+    out = embed_in_batches(flaky, texts, batch_size=5, concurrency=3, base_delay=0.0)
+    assert [v[0] for v in out] == [float(i) for i in range(23)]
+    assert calls["n"] == 6  # 5 batches + 1 retry
+
+def test_embed_in_batches_does_not_retry_other_errors():
+    def broken(batch):
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        embed_in_batches(broken, ["a", "b"], batch_size=1, concurrency=2, base_delay=0.0)
+
+def test_hash_embedder_is_deterministic():
+    e = HashEmbedder(dim=64)
+    a = e.embed(["v = u + at", "essay structure"])
+    b = e.embed(["v = u + at", "essay structure"])
+    assert a.shape == (2, 64)
+    assert (a == b).all()
+
+def test_embedding_cache_hits_and_lru_eviction(tmp_path):
+    class CountingEmbedder(HashEmbedder):
+        calls = 0
+        def embed(self, texts):
+            CountingEmbedder.calls += len(texts)
+            return super().embed(texts)
+
+    emb = CountingEmbedder(dim=32)
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_entries=3)
+
+    first = cache.embed(emb, ["alpha", "beta", "alpha"])
+    assert CountingEmbedder.calls == 2  # repeated text embedded once
+    again = cache.embed(emb, ["alpha  "])  # whitespace-normalized key
+    cache.embed(emb, ["beta"])
+    assert CountingEmbedder.calls == 2
+    assert (again[0] == first[0]).all()
+    assert cache.stats()["hits"] == 2
+
+    cache.embed(emb, ["gamma", "delta"])  # 4 entries > cap of 3 -> evict LRU
+    st = cache.stats()
+    assert st["entries"] == 3
+    assert cache.get_many(emb.model, ["alpha"])[0] is None  # least recently used
+
+def test_build_and_search_with_hash_backend(monkeypatch):
+    pytest.importorskip("faiss")
+    import tools.rag_store as rs
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+
+    notes = ["Kinematics: v = u + at, s = ut + 1/2 a t^2. " * 20,
+             "Essay writing: claim, evidence, reasoning. " * 20]
+    n, dim = rs.build_ephemeral_index(notes)
+    assert n > 0 and dim == 256
+    assert rs.last_build_stats()["chunks"] == n
+    rs.build_ephemeral_index(notes)  # unchanged notes -> every chunk from cache
+    assert rs.last_build_stats()["cache_misses"] == 0
+
+    hits = rs.search("essay claim evidence", k=2)
+    assert hits and hits[0]["id"].startswith("Pasted#2.")
+
+def test_index_store_updates_one_source_and_reloads(monkeypatch, tmp_path):
+    pytest.importorskip("faiss")
+    from tools.index_store import IndexStore
+    emb = HashEmbedder(dim=32)
+
+    store = IndexStore("course", root=str(tmp_path))
+    store.add_documents("physics", ["velocity acceleration", "momentum impulse"], emb.embed(["velocity acceleration", "momentum impulse"]))
+    store.add_documents("history", ["treaty of versailles"], emb.embed(["treaty of versailles"]))
+    assert store.sources() == {"physics": 2, "history": 1}
+
+    added, removed = store.update_source("physics", ["energy work power"], emb.embed(["energy work power"]))
+    assert (added, removed) == (1, 2)
+    assert store.ntotal == 2
+
+    reopened = IndexStore("course", root=str(tmp_path))  # mmap load from disk
+    assert reopened.ntotal == 2
+    hits = reopened.search(emb.embed(["treaty versailles"]), k=1)[0]
+    assert hits[0]["path"] == "history" and hits[0]["text"] == "treaty of versailles"
+
+    assert reopened.remove_source("history") == 1
+    assert reopened.sources() == {"physics": 1}
+
+def test_search_many_batches_and_memoizes_queries(monkeypatch):
+    pytest.importorskip("faiss")
+    from collections import OrderedDict
+    import tools.rag_store as rs
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    monkeypatch.setattr(rs, "_QUERY_MEMO", OrderedDict())
+    rs.build_ephemeral_index(["Kinematics: velocity and acceleration.", "Essay: claim and evidence."])
+
+    calls = []
+    real = rs._embed_texts
+    monkeypatch.setattr(rs, "_embed_texts", lambda texts: calls.append(list(texts)) or real(texts))
+
+    qs = ["kinematics velocity", "essay claim", "kinematics velocity"]
+    res = rs.search_many(qs, k=1)
+    assert calls == [["kinematics velocity", "essay claim"]]  # one call, repeats deduped
+    assert res[0][0]["text"].startswith("Kinematics") and res[1][0]["text"].startswith("Essay")
+    assert res[2] == res[0]
+
+    rs.search_many(qs, k=1)
+    assert len(calls) == 1  # memoized
+
+    import threading
+    acquired = []
+    def probe():
+        got = rs._LOCK.acquire(timeout=1)
+        if got:
+            rs._LOCK.release()
+        acquired.append(got)
+    def embed_checking_lock(texts):  # other threads' searches must not wait on our embedding call
+        t = threading.Thread(target=probe)
+        t.start()
+        t.join()
+        return real(texts)
+    monkeypatch.setattr(rs, "_embed_texts", embed_checking_lock)
+    rs.search_many(["acceleration"], k=1)
+    assert acquired == [True]
+
+def test_index_kinds_recall_and_rebuild(monkeypatch, tmp_path):
+    pytest.importorskip("faiss")
+    import numpy as np
+    from tools.index_store import IndexStore, auto_kind, compare_kinds
+
+    assert auto_kind(500) == "flat" and auto_kind(50_000) == "ivf" and auto_kind(500_000) == "ivfpq"
+
+    rng = np.random.RandomState(0)
+    x = rng.randn(2100, 32).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    rows = {r["kind"]: r for r in compare_kinds(x[:2000], x[2000:], k=5, kinds=("flat", "ivf", "hnsw"))}
+    assert rows["flat"]["recall@5"] == 1.0
+    assert rows["hnsw"]["recall@5"] > 0.8
+
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    monkeypatch.setenv("EMBED_HASH_DIM", "32")
+    emb = HashEmbedder(dim=32)
+    texts = [f"topic {i} note" for i in range(50)]
+    store = IndexStore("kinds", root=str(tmp_path), kind="flat")
+    store.add_documents("a", texts[:25], emb.embed(texts[:25]))
+    store.add_documents("b", texts[25:], emb.embed(texts[25:]))
+    assert store.rebuild("hnsw") == "hnsw"
+    assert store.remove_source("a") == 25  # HNSW can't remove ids -> rebuilt from remaining chunks
+    assert store.ntotal == 25 and store.index_kind == "hnsw"
+
+def test_rebuild_reuses_the_index_vectors_without_embedding(monkeypatch, tmp_path):
+    pytest.importorskip("faiss")
+    import numpy as np
+    import tools.rag_store as rs
+    from tools.index_store import IndexStore
+    monkeypatch.setattr(rs, "_embed_texts", lambda texts: pytest.fail("rebuild must not re-embed"))
+    x = np.random.RandomState(3).randn(600, 16).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    store = IndexStore("vecs", root=str(tmp_path), kind="flat")
+    store.add_documents("a", [f"a{i}" for i in range(300)], x[:300])  # caller's own vectors
+    store.add_documents("b", [f"b{i}" for i in range(300)], x[300:])
+
+    for kind in ("ivf", "hnsw", "flat", "ivf"):
+        assert store.rebuild(kind) == kind
+        store.set_search_params(nprobe=64, ef_search=256)
+        assert [h[0]["id"] for h in store.search(x[[5, 450]], k=1)] == ["a#6", "b#151"]
+    assert store.remove_source("a") == 300  # IVF removes by id; the rest keep their vectors and ids
+    store.set_search_params(nprobe=64)
+    assert [h[0]["id"] for h in store.search(x[[310, 599]], k=1)] == ["b#11", "b#300"]
+    assert store.rebuild("hnsw") == "hnsw" and store.remove_source("b") == 300 and store.ntotal == 0
+
+def test_lexical_and_hybrid_search(monkeypatch):
+    pytest.importorskip("faiss")
+    import tools.rag_store as rs
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    rs.build_ephemeral_index([
+        "Kinematics: velocity is the rate of change of displacement over time.",
+        "Equations of motion: v = u + at and s = ut + at^2/2 for constant acceleration.",
+        "Essay writing: state a claim, then support it with evidence.",
+    ])
+
+    calls, real = [], rs._embed_texts
+    monkeypatch.setattr(rs, "_embed_texts", lambda texts: calls.append(texts) or 1 / 0)
+    hit = rs.search("v = u + at", k=1, mode="lexical")[0]
+    assert "v = u + at" in hit["text"] and calls == []  # no embedding call
+
+    # hybrid degrades to lexical when the embedding backend fails
+    assert rs.search("claim evidence", k=1, mode="hybrid")[0]["text"].startswith("Essay")
+    with pytest.raises(ZeroDivisionError):
+        rs.search("claim evidence", k=1, mode="vector")
+    with pytest.raises(RuntimeError):
+        rs.search("x", mode="fuzzy")
+
+    monkeypatch.setattr(rs, "_embed_texts", real)
+    hits = rs.search("v = u + at", k=3, mode="hybrid")
+    assert "v = u + at" in hits[0]["text"] and hits[0]["score"] > hits[-1]["score"]
+
+def test_bm25_postings_follow_source_updates(tmp_path):
+    pytest.importorskip("faiss")
+    import numpy as np, sqlite3
+    from tools.index_store import IndexStore
+    from tools.bm25 import BM25Index
+    store = IndexStore("bm25", root=str(tmp_path))
+    vec = lambda n: np.random.RandomState(n).rand(n, 8).astype("float32")
+    store.add_documents("a", ["mitosis splits the cell", "enzyme kinetics"], vec(2))
+    store.add_documents("b", ["mitosis vs meiosis"], vec(1))
+    assert [h["id"] for h in store.search_lexical(["mitosis"], k=5)[0]] == ["b#1", "a#1"]  # shorter doc first
+
+    store.remove_source("a")
+    assert [h["id"] for h in store.search_lexical(["mitosis"], k=5)[0]] == ["b#1"]
+    assert store.search_lexical(["enzyme"], k=5) == [[]]
+    db = sqlite3.connect(str(tmp_path / "bm25" / "meta.sqlite"))
+    assert db.execute("SELECT COUNT(*) FROM bm25_vocab WHERE term = 'enzyme'").fetchone()[0] == 0
+
+    # a store written before BM25 existed is indexed on its first lexical query
+    for t in ("bm25_vocab", "bm25_postings", "bm25_segments", "bm25_docs"):
+        db.execute(f"DELETE FROM {t}")
+    db.commit()
+    reopened = IndexStore("bm25", root=str(tmp_path))
+    assert reopened.search_lexical(["meiosis"], k=1)[0][0]["id"] == "b#1"
+    assert BM25Index(db).search("meiosis", 1)[0][0] == 3
+
+def test_tenants_are_isolated_and_share_read_only_corpora(monkeypatch):
+    pytest.importorskip("faiss")
+    import tools.rag_store as rs
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    syllabus = rs.get_store("syllabus")
+    syllabus.add_documents("syllabus", ["Week 3 covers thermodynamics and entropy.", "Week 4: entropy and the second law.",
+                                        "Week 1: vectors.", "Week 2: forces.", "Week 5: waves.", "Week 6: optics."])
+    monkeypatch.setenv("RAG_SHARED_INDEXES", "syllabus")
+    rs._REGISTRY.clear()
+
+    with rs.tenant_scope("alice"):
+        rs.build_ephemeral_index(["Alice: mitosis and meiosis notes."])
+    with rs.tenant_scope("bob"):
+        rs.build_ephemeral_index(["Bob: treaty of versailles notes."])
+        assert rs.index_info()["sources"] == {"Pasted": 1}
+        texts = [h["text"] for h in rs.search("mitosis entropy versailles", k=5)]
+    assert any(t.startswith("Bob") for t in texts) and any("entropy" in t for t in texts)
+    assert not any(t.startswith("Alice") for t in texts)
+    with rs.tenant_scope("alice"):
+        assert rs.search("mitosis", k=1, mode="lexical")[0]["text"].startswith("Alice")
+
+    shared_hits = rs.shared_stores()[0].search_lexical(["entropy"], 2)[0]
+    # BM25 scores of different corpora aren't comparable: stores are fused by rank,
+    # so the tiny syllabus (high IDF) can't crowd out a tenant's own best match
+    with rs.tenant_scope("carol"):
+        rs.build_ephemeral_index([f"Carol: entropy note {i}." for i in range(30)])
+        own_top = rs.get_store().search_lexical(["entropy"], 1)[0][0]
+        assert own_top["score"] < shared_hits[1]["score"]  # "entropy" is in every note: low IDF
+        texts = [h["text"] for h in rs.search("entropy", k=2, mode="lexical")]
+    assert sorted(texts) == sorted([own_top["text"], shared_hits[0]["text"]])
+
+    shared = rs.shared_stores()[0]
+    assert shared.read_only and shared is rs.shared_stores()[0]  # mapped once, reused
+    with pytest.raises(RuntimeError):
+        shared.add_documents("x", ["y"])
+
+def test_registry_evicts_lru_and_reloads(monkeypatch):
+    pytest.importorskip("faiss")
+    import numpy as np
+    import tools.rag_store as rs
+    from tools.index_registry import IndexRegistry
+    reg = IndexRegistry(budget_bytes=150_000)
+    monkeypatch.setattr(rs, "_REGISTRY", reg)
+    vec = np.random.RandomState(0).rand(100, 256).astype("float32")  # ~100 KB flat index each
+    for name in ("a", "b"):
+        rs.get_store(name).add_documents(name, [f"{name} chunk {i}" for i in range(100)], vec)
+        reg.enforce(keep=name)
+    assert reg.stats()["evictions"] == 1 and reg.resident_bytes() <= 150_000
+    assert "a" not in reg._open
+
+    a = rs.get_store("a")  # reopened from disk, memory-mapped
+    assert reg.stats()["reloads"] == 1 and a.ntotal == 100 and a.resident_bytes() == 0
+    assert a.search(vec[:1], k=1)[0][0]["text"] == "a chunk 0"
+
+    # a store evicted while someone still uses it is handed back, never opened twice
+    in_use = rs.get_store("b")
+    reg.evict("b")
+    in_use.add_documents("b2", ["b late chunk"], vec[:1])
+    assert rs.get_store("b") is in_use and reg.stats()["reloads"] == 1
+    assert rs.get_store("b").sources() == {"b": 100, "b2": 1}
+
+def test_auto_tiers_meet_the_recall_floor_and_step_back_down(monkeypatch, tmp_path):
+    pytest.importorskip("faiss")
+    import numpy as np
+    from tools.index_store import IndexStore
+    monkeypatch.delenv("RAG_NPROBE", raising=False)
+    x = np.random.RandomState(2).randn(12_000, 32).astype("float32")  # hard case: no cluster structure
+    store = IndexStore("tiers", root=str(tmp_path), kind="auto")
+    for j, src in enumerate("abc"):
+        store.add_documents(src, [f"{src}{i}" for i in range(4000)], x[j * 4000:(j + 1) * 4000])
+    assert store.index_kind == "ivf"  # crossed 10K on "c"
+    assert store.evaluate_recall(k=10) >= 0.9
+    store.remove_source("c")
+    assert store.index_kind == "ivf"  # 8K: under the tier, but not by enough to rebuild
+    store.remove_source("b")
+    assert store.index_kind == "flat" and store.ntotal == 4000
+    assert store.evaluate_recall(k=10) == 1.0
+
+    monkeypatch.setenv("RAG_MIN_RECALL", "1.01")  # unreachable: auto mode keeps exact search
+    store.add_documents("d", [f"d{i}" for i in range(8000)], x[4000:])
+    assert store.index_kind == "flat" and store.ntotal == 12_000
@@ -0,0 +1,89 @@
+# tests/test_replan.py
+import json
+
+import agents.replan as rp
+from agents.replan import StudyPlan
+
+SUBJECTS = [{"name": "Math", "difficulty": 5}, {"name": "History", "difficulty": 2}]  # 20h + 8h
+
+def _fake_tips(calls):
+    def write_tips(**kw):
+        calls.append(kw)
+        return {"study_principles": ["x"], "focus_order": [s["name"] for s in kw["subjects"]]}
+    return write_tips
+
+def _hours(plan, day):
+    return {b["subject"]: b["hours"] for b in next(d for d in plan.timetable if d["day"] == day)["blocks"]}
+
+def test_replan_on_track_changes_nothing(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rp, "write_tips", _fake_tips(calls))
+    plan = StudyPlan.build(SUBJECTS, days_left=10, hours_per_day=4.0)
+    first = plan.replan()
+    assert first["tips_regenerated"] and first["tips_reason"] == "no_tips" and first["changed_days"] == []
+
+    plan.log_progress(1, _hours(plan, 1))  # did exactly what was planned
+    diff = plan.replan()
+    assert diff["from_day"] == 2 and diff["changed_days"] == [] and not diff["tips_regenerated"]
+    assert len(calls) == 1
+
+def test_small_slip_reallocates_without_new_tips(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rp, "write_tips", _fake_tips(calls))
+    plan = StudyPlan.build(SUBJECTS, days_left=10, hours_per_day=4.0)
+    plan.replan()
+    planned = _hours(plan, 1)
+    plan.log_progress(1, {**planned, "Math": planned["Math"] - 1.0})  # an hour short on Math
+    diff = plan.replan()
+    assert diff["changed_days"] and all(c["day"] >= 2 for c in diff["changed_days"])
+    assert diff["hours_gap"] == (-12.0, -11.0) and not diff["tips_regenerated"]
+    # the remaining vector is fully re-allocated over the open days
+    future = sum(b["hours"] for d in plan.timetable if d["day"] >= 2 for b in d["blocks"])
+    assert abs(future - sum(plan.remaining.values())) < 0.2
+    assert len(calls) == 1
+
+def test_crossing_threshold_regenerates_tips(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rp, "write_tips", _fake_tips(calls))
+    state = {"days_left": 7, "hours_per_day": 4.0, "tips": {"study_principles": ["old"]}, "contexts": {}}
+    base = StudyPlan.build(SUBJECTS, 7, 4.0)
+    state.update(subjects_enriched=base.subjects, timetable=base.timetable)
+    plan = StudyPlan.from_state(state, tips_gap_threshold=2.0)
+    assert plan.overbooked is False and plan.hours_gap == -0.0
+
+    plan.log_progress(1, {})  # skipped day 1 entirely: 4h behind -> overbooked
+    diff = plan.replan()
+    assert diff["overbooked"] == (False, True) and diff["tips_reason"] == "overbooked_flipped"
+    assert diff["tips_regenerated"] and calls[0]["overbooked"] is True
+    assert sum(plan.remaining.values()) == 28.0 and plan.hours_gap == 4.0
+
+    # round trip through JSON keeps progress and the tips basis
+    again = StudyPlan.from_dict(json.loads(json.dumps(plan.to_dict())))
+    assert again.remaining == plan.remaining and again.next_day == 2
+    assert again.replan()["changed_days"] == [] and len(calls) == 1
+
+def test_replan_keeps_exam_days_availability_and_reviews(monkeypatch):
+    monkeypatch.setattr(rp, "write_tips", _fake_tips([]))
+    subjects = [{"name": "Math", "difficulty": 5, "max_hours_per_day": 3.0},
+                {"name": "History", "difficulty": 2, "exam_day": 5}]
+    availability = [4, 4, 4, 0, 4, 4, 4, 4, 4, 4]
+    review = {"hours": 0.5, "intervals": [1, 3]}
+    plan = StudyPlan.build(subjects, 10, 4.0, availability=availability, review=review)
+    plan.replan()
+    plan.log_progress(1, {n: h for n, h in _hours(plan, 1).items()})
+    plan = StudyPlan.from_dict(json.loads(json.dumps(plan.to_dict())))
+    plan.log_progress(2, {})  # skipped day 2
+    plan.replan()
+
+    for d in plan.timetable:
+        hours = _hours(plan, d["day"])
+        if d["day"] >= 3:
+            assert sum(b["hours"] for b in d["blocks"]) <= availability[d["day"] - 1] + 1e-9
+            assert hours.get("Math", 0.0) <= 3.0
+        if d["day"] >= 5:
+            assert "History" not in hours
+    reviews = [(d["day"], b["subject"]) for d in plan.timetable if d["day"] >= 3
+               for b in d["blocks"] if b.get("kind") == "review"]
+    assert (4, "Math") not in reviews and (5, "Math") in reviews  # day 1 + 3 lands on the 0h day: carried
+    assert plan.unmet_hours["History"] == 2.0 and plan.overbooked  # only day 3 was left before its exam
+    assert plan.to_state()["total_available_hours"] == 36.0
@@ -58,7 +58,7 @@ def test_end_to_end_schedule_agent(monkeypatch):
     # Patch the agent's write_tips so no real API call is made
     import agents.schedule_agent as sa
 
-    def fake_write_tips(*, subjects, timetable, overbooked, hours_gap):
+    def fake_write_tips(*, subjects, timetable, overbooked, hours_gap, contexts=None):
         return {
             "study_principles": ["Pomodoro", "Active recall"],
             "focus_order": [s["name"] for s in subjects],
@@ -100,3 +100,37 @@ def test_end_to_end_schedule_agent(monkeypatch):
     assert "daily_checklist" in tips
     if "if_overbooked" in tips:
         assert "actions" in tips["if_overbooked"]
+
+def test_graph_fans_out_retrieval_and_streams_tips(monkeypatch):
+    import agents.schedule_agent as sa
+    from tools.rag_store import build_ephemeral_index
+
+    monkeypatch.setenv("EMBED_BACKEND", "hash")
+    build_ephemeral_index(["Math: chain rule and derivatives. History: causes of the French Revolution."])
+    import tools.rag_store as rs
+    embed_calls = []
+    real_embed = rs._embed_texts
+    monkeypatch.setattr(rs, "_embed_texts", lambda texts: embed_calls.append(list(texts)) or real_embed(texts))
+    monkeypatch.setattr(sa, "tips_node_stream", lambda state: iter([("focus_order", ["Math"]), ("citations", [])]))
+
+    agent = sa.build_schedule_agent()
+    state = {"days_left": 3, "hours_per_day": 3.0,
+             "subjects": [{"name": "Math", "difficulty": 5}, {"name": "History", "difficulty": 2}]}
+    steps, fields = [], []
+    for mode, event in agent.stream(state, config={"configurable": {"stream_tips": True}},
+                                    stream_mode=["updates", "custom"]):
+        if mode == "updates":
+            steps.extend(event)
+        else:
+            fields.append(event["tips_field"][0])
+    # allocate and both retrieve branches run in the same step, tips once after all of them
+    assert steps[0] == "score" and steps[-1] == "tips"
+    assert sorted(steps[1:-1]) == ["allocate", "retrieve", "retrieve"]
+    assert fields == ["focus_order", "citations"]
+    assert len(embed_calls) == 1 and len(embed_calls[0]) == 2  # both subjects' queries in one request
+
+    final = agent.invoke(state, config={"configurable": {"stream_tips": True}})
+    assert set(final["contexts"]) == {"Math", "History"}
+    assert all(h["score"] is not None for hits in final["contexts"].values() for h in hits)
+    assert set(final["timings"]) == {"score", "allocate", "retrieve:Math", "retrieve:History", "tips"}
+    assert final["tips"] == {"focus_order": ["Math"], "citations": []}
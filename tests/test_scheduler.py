@@ -0,0 +1,88 @@
+# tests/test_scheduler.py
+from agents.schedule_agent import allocate_node, score_node
+from tools.allocate_time import allocate_time_vectorized
+from tools.priority_score import build_priorities
+from tools.scheduler import schedule
+
+def _subjects(**extra):
+    subs = build_priorities([{"name": "Math", "difficulty": 5}, {"name": "Bio", "difficulty": 2}], 10)["subjects"]
+    for s in subs:
+        s.update(extra.get(s["name"], {}))
+    return subs
+
+def _hours(day, kind=None):
+    out = {}
+    for b in day["blocks"]:
+        if b.get("kind") == kind:
+            out[b["subject"]] = out.get(b["subject"], 0.0) + b["hours"]
+    return out
+
+def test_unconstrained_falls_back_to_proportional_allocator():
+    subs = _subjects()
+    out = schedule(subs, 10, 4.0)
+    assert out == {**allocate_time_vectorized(subs, 10, 4.0), "unmet_hours": {}}
+    state = {"days_left": 10, "hours_per_day": 4.0, "subjects": [{"name": "Math", "difficulty": 5}]}
+    state.update(score_node(state))
+    assert "unmet_hours" not in allocate_node(state)  # graph output unchanged without constraints
+
+def test_availability_caps_and_exam_deadlines():
+    subs = _subjects(Bio={"exam_day": 4}, Math={"max_hours_per_day": 3.0})
+    availability = [4, 4, 4, 0, 4, 4, 4, 4, 4, 4]
+    out = schedule(subs, 10, 4.0, availability=availability)
+    for cap, day in zip(availability, out["timetable"]):
+        study = _hours(day)
+        assert sum(study.values()) <= cap + 1e-9
+        assert study.get("Math", 0.0) <= 3.0
+        if day["day"] >= 4:
+            assert "Bio" not in study
+    # Bio's 8h fit into days 1-3 (12h) although Math also wants them
+    assert out["per_subject_allocation"] == {"Math": 20.0, "Bio": 8.0}
+    assert out["unmet_hours"] == {}
+
+    tight = schedule(_subjects(Bio={"exam_day": 2}), 10, 4.0)
+    assert tight["unmet_hours"] == {"Bio": 4.0}
+    assert tight["per_subject_allocation"]["Bio"] == 4.0
+
+def test_spaced_reviews_follow_first_study_day():
+    subs = _subjects()
+    out = schedule(subs, 10, 4.0, review={"hours": 0.5, "intervals": [1, 3, 7]})
+    review_days = {n: [d["day"] for d in out["timetable"] if n in _hours(d, "review")] for n in ("Math", "Bio")}
+    assert review_days == {"Math": [2, 4, 8], "Bio": [2, 4, 8]}
+    for day in out["timetable"]:
+        assert sum(b["hours"] for b in day["blocks"]) <= 4.0 + 1e-9
+    # reviews are on top of required hours: 40h available - 3h reviews = 37h for 28h required
+    assert out["per_subject_allocation"] == {"Math": 20.0, "Bio": 8.0}
+
+def test_allocate_node_reports_unmet_hours_as_overbooked():
+    state = {"days_left": 10, "hours_per_day": 4.0,
+             "subjects": [{"name": "Math", "difficulty": 5}, {"name": "Bio", "difficulty": 2, "exam_day": 2}]}
+    state.update(score_node(state))
+    out = allocate_node(state)
+    assert out["total_available_hours"] == 40.0 and state["total_required_hours"] == 28.0
+    assert out["unmet_hours"] == {"Bio": 4.0}
+    assert out["overbooked"] is True
+
+def test_deadline_pass_reaches_tight_exams_behind_slack_ones():
+    subs = [{"name": "A", "weight": 1.0, "required_hours": 0.5, "exam_day": 3},
+            {"name": "B", "weight": 0.1, "required_hours": 6.0, "exam_day": 4, "max_hours_per_day": 2.0},
+            {"name": "C", "weight": 10.0, "required_hours": 100.0}]
+    out = schedule(subs, 10, 4.0)
+    assert "B" not in out["unmet_hours"]  # A (exam 3) has slack; B still needs its 2h/day on days 1-3
+    assert [_hours(d).get("B", 0.0) for d in out["timetable"][:3]] == [2.0, 2.0, 2.0]
+    assert out["per_subject_allocation"]["A"] == 0.5
+
+def test_deadline_pass_cost_does_not_grow_with_days_times_subjects():
+    import time
+    # 1000 subjects with lots of slack: a pass that rechecks every subject every day is O(D * S)
+    subs = [{"name": f"S{i}", "weight": 1.0, "required_hours": 1.0, "max_hours_per_day": 1.0} for i in range(1000)]
+
+    def best_of_3(days):
+        times = []
+        for _ in range(3):
+            t = time.perf_counter()
+            schedule(subs, days, 0.5)
+            times.append(time.perf_counter() - t)
+        return min(times)
+
+    short, long = best_of_3(40), best_of_3(640)
+    assert long < 6 * short, f"16x the days took {long / short:.1f}x as long"
@@ -0,0 +1,90 @@
+# tests/test_service.py
+import asyncio, threading, time
+
+import httpx
+
+import agents.schedule_agent as sa
+from agents.service import PlanService, create_app
+
+def _body(name="Math", **extra):
+    return {"days_left": 5, "hours_per_day": 3.0, "subjects": [{"name": name, "difficulty": 4}], **extra}
+
+def _slow_tips(monkeypatch, seconds=0.3):
+    calls = []
+    gate = threading.Lock()
+
+    def fake(subjects, timetable, overbooked, hours_gap, contexts=None):
+        with gate:
+            calls.append([s["name"] for s in subjects])
+        time.sleep(seconds)
+        return {"study_principles": ["spacing"]}
+
+    monkeypatch.setattr(sa, "write_tips", fake)
+    return calls
+
+async def _post_all(app, bodies):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.post("/plan", json=b) for b in bodies))
+
+def test_identical_burst_is_coalesced_into_one_graph_run(monkeypatch):
+    calls = _slow_tips(monkeypatch)
+    service = PlanService(max_concurrency=2, max_queue=4)
+    responses = asyncio.run(_post_all(create_app(service), [_body()] * 10 + [_body("Bio")]))
+    assert [r.status_code for r in responses] == [200] * 11
+    assert all(r.json()["tips"] == {"study_principles": ["spacing"]} for r in responses)
+    assert responses[0].json()["timetable"] == responses[9].json()["timetable"]
+    assert sorted(calls) == [["Bio"], ["Math"]]  # one LLM call per distinct request
+    stats = service.stats()
+    assert (stats["graph_runs"], stats["coalesced"], stats["in_flight_keys"]) == (2, 9, 0)
+
+def test_backpressure_rejects_beyond_queue_and_reports_metrics(monkeypatch):
+    _slow_tips(monkeypatch)
+    service = PlanService(max_concurrency=1, max_queue=1)
+    app = create_app(service)
+    responses = asyncio.run(_post_all(app, [_body(f"S{i}") for i in range(4)] + [{"subjects": []}]))
+    codes = [r.status_code for r in responses]
+    assert sorted(codes) == [200, 200, 400, 503, 503]
+    rejected = next(r for r in responses if r.status_code == 503)
+    assert rejected.headers["retry-after"] == "1"
+
+    async def get(path):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path)
+
+    stats = asyncio.run(get("/metrics.json")).json()
+    assert stats["rejected"] == 2 and stats["requests"] == 5
+    assert stats["responses"] == {"200": 2, "400": 1, "503": 2}
+    assert stats["latency_ms"]["p99"] >= stats["latency_ms"]["p50"] > 0
+    text = asyncio.run(get("/metrics")).text
+    assert 'study_service_request_latency_seconds{quantile="0.95"}' in text
+    assert "study_service_rejected_total 2" in text
+
+def test_graph_spans_join_the_request_trace_and_errors_stay_private(monkeypatch, caplog):
+    from utils import telemetry
+
+    def broken(subjects, timetable, overbooked, hours_gap, contexts=None):
+        raise RuntimeError("key=sk-secret rejected")
+
+    monkeypatch.setattr(sa, "write_tips", broken)
+    telemetry.reset()
+    with caplog.at_level("ERROR", logger="agents.service"):
+        (resp,) = asyncio.run(_post_all(create_app(PlanService()), [_body()]))
+    assert resp.status_code == 500 and resp.json() == {"error": "internal error"}
+    assert "sk-secret" in caplog.text
+    by_name = {s["name"]: s for s in telemetry.spans()}
+    request, plan = by_name["service.request"], by_name["service.plan"]
+    assert plan["trace_id"] == request["trace_id"] and plan["parent_span_id"] == request["span_id"]
+
+def test_malformed_subjects_are_rejected_before_the_graph(monkeypatch):
+    calls = _slow_tips(monkeypatch, seconds=0)
+    bad = [{"days_left": 5, "hours_per_day": 3.0, "subjects": [1]},
+           {"days_left": 5, "hours_per_day": 3.0, "subjects": [{"difficulty": 3}]},
+           {"days_left": 5, "hours_per_day": 3.0, "subjects": [{"name": "Math", "target_hours": "lots"}]},
+           _body(availability=[2, "x", 2, 2, 2])]
+    responses = asyncio.run(_post_all(create_app(PlanService()), bad))
+    assert [r.status_code for r in responses] == [400] * 4
+    assert [r.json()["error"] for r in responses[:3]] == [
+        "subjects[0] must be an object", "subjects[0].name must be a non-empty string",
+        "subjects[0].target_hours must be a number"]
+    assert calls == []
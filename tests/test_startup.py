@@ -0,0 +1,42 @@
+# tests/test_startup.py
+"""
+Cold start: importing the agent / app must not pull in the heavy SDKs, and
+must finish within a wall-time budget. The defaults are generous enough for
+slow CI machines; STARTUP_BUDGET_AGENT_S / STARTUP_BUDGET_APP_S tighten them.
+"""
+import json, os, subprocess, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("google.generativeai", "langgraph", "pandas", "faiss")
+
+def _cold_import(stmt: str, tmp_path) -> dict:
+    code = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        f"{stmt}\n"
+        "elapsed = time.perf_counter() - t\n"
+        f"print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {HEAVY!r} if m in sys.modules]}}))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT, RAG_INDEX_DIR=str(tmp_path / "rag_index"))
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=str(tmp_path), env=env,
+                         capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr[-2000:]
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    # slowest cumulative imports, for the failure message
+    rows = [l.split("|") for l in out.stderr.splitlines() if l.startswith("import time:") and "|" in l]
+    rows = [(int(r[1]), r[2].strip()) for r in rows if r[1].strip().isdigit()]
+    res["slowest"] = [f"{name} {us / 1e6:.2f}s" for us, name in sorted(rows, reverse=True)[:8]]
+    return res
+
+@pytest.mark.parametrize("stmt,budget_env,default", [
+    ("import agents.schedule_agent, agents.batch", "STARTUP_BUDGET_AGENT_S", 5.0),
+    ("import app", "STARTUP_BUDGET_APP_S", 8.0),
+])
+def test_cold_import_stays_light(stmt, budget_env, default, tmp_path):
+    res = _cold_import(stmt, tmp_path)
+    assert res["heavy"] == [], f"{stmt!r} imported {res['heavy']} eagerly; slowest: {res['slowest']}"
+    print(f"{stmt!r}: {res['seconds']:.2f}s cold; slowest: {res['slowest']}")
+    budget = float(os.getenv(budget_env, default))
+    assert res["seconds"] <= budget, f"{stmt!r} took {res['seconds']:.2f}s > {budget}s; slowest: {res['slowest']}"
@@ -0,0 +1,109 @@
+# tests/test_telemetry.py
+import json
+
+import pytest
+
+from utils import telemetry as tm
+
+@pytest.fixture(autouse=True)
+def _fresh():
+    tm.reset()
+    yield
+    tm.reset()
+
+def test_spans_nest_and_record_histograms():
+    with tm.span("plan") as outer:
+        trace = tm.current_trace_id()
+        with tm.span("embed", texts=3) as sp:
+            sp["cache_hits"] = 2
+        with pytest.raises(ValueError):
+            with tm.span("llm"):
+                raise ValueError("boom")
+        outer["subjects"] = 2
+    rows = tm.spans(trace)
+    assert [r["name"] for r in rows] == ["embed", "llm", "plan"]
+    plan = rows[-1]
+    assert plan["parent_span_id"] is None
+    assert all(r["parent_span_id"] == plan["span_id"] for r in rows[:2])
+    assert rows[1]["status"] == "ERROR" and rows[1]["attributes"]["error"] == "ValueError"
+    summ = tm.summary()
+    assert summ["embed"]["calls"] == 1 and summ["llm"]["errors"] == 1
+
+def test_prometheus_text_and_span_export(tmp_path, monkeypatch):
+    spans_file = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("TELEMETRY_SPANS_FILE", str(spans_file))
+    for n in (1, 10, 100):
+        with tm.span("embed", texts=n):
+            pass
+    text = tm.prometheus_text()
+    assert 'study_span_duration_seconds_count{span="embed"} 3' in text
+    assert 'study_span_attribute_bucket{span="embed",attr="texts",le="10"} 2' in text
+    assert 'study_span_attribute_bucket{span="embed",attr="texts",le="+Inf"} 3' in text
+    assert 'study_span_attribute_sum{span="embed",attr="texts"} 111' in text
+    lines = [json.loads(l) for l in spans_file.read_text().splitlines()]
+    assert len(lines) == 3 and lines[0]["end_time_unix_nano"] >= lines[0]["start_time_unix_nano"]
+    assert tm.export_spans(str(tmp_path / "all.jsonl")) == 3
+
+def test_prometheus_label_values_are_escaped():
+    tm.incr('cache "hit"\\miss\nnext')
+    assert 'study_events_total{event="cache \\"hit\\"\\\\miss\\nnext"} 1' in tm.prometheus_text()
+
+def test_spans_file_is_written_outside_the_metrics_lock(tmp_path, monkeypatch):
+    monkeypatch.setenv("TELEMETRY_SPANS_FILE", str(tmp_path / "spans.jsonl"))
+    held = []
+    real_open = open
+    def probing_open(*a, **kw):
+        held.append(tm._LOCK.locked())
+        return real_open(*a, **kw)
+    monkeypatch.setattr("builtins.open", probing_open)
+    with tm.span("embed"):
+        pass
+    assert held == [False]
+
+def test_disabled_is_a_no_op(monkeypatch):
+    monkeypatch.setenv("TELEMETRY", "0")
+    with tm.span("embed", texts=1) as sp:
+        sp["x"] = 1
+    assert tm.spans() == [] and tm.summary() == {}
+
+def test_generator_spans_stay_out_of_the_consumer_and_early_close_is_ok():
+    def fields():
+        rec = tm.start_span("stream")
+        error = None
+        try:
+            for i in range(3):
+                with tm.resume(rec):
+                    with tm.span("fetch"):
+                        pass
+                yield i
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            tm.end_span(rec, error)
+
+    with tm.span("plan"):
+        it = fields()
+        next(it)
+        with tm.span("render"):  # runs between yields: a sibling of the stream, not its child
+            pass
+        it.close()  # consumer stops early (GeneratorExit)
+    by_name = {s["name"]: s for s in tm.spans()}
+    assert by_name["render"]["parent_span_id"] == by_name["plan"]["span_id"]
+    assert by_name["fetch"]["parent_span_id"] == by_name["stream"]["span_id"]
+    assert by_name["stream"]["status"] == "OK" and "error" not in by_name["stream"]["attributes"]
+    assert "_t0" not in by_name["stream"]
+
+def test_prometheus_text_reads_histogram_snapshots(monkeypatch):
+    with tm.span("embed", texts=3):
+        pass
+    live = tm._LATENCY["embed"]
+    real = tm._hist_lines
+
+    def observe_while_rendering(metric, h, labels):
+        assert h is not live
+        live.observe(0.001)  # a span landing mid-render doesn't tear the copy being rendered
+        return real(metric, h, labels)
+
+    monkeypatch.setattr(tm, "_hist_lines", observe_while_rendering)
+    assert 'study_span_duration_seconds_count{span="embed"} 1' in tm.prometheus_text()
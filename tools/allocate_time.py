@@ -1,6 +1,8 @@
 # tools/allocate_time.py
 from typing import List, Dict
 
+import numpy as np
+
 def allocate_time(subjects: List[Dict], days_left: int, hours_per_day: float) -> Dict:
     """
     Allocate hours across days using subject weights until each subject's required_hours is met
@@ -49,3 +51,99 @@ def allocate_time(subjects: List[Dict], days_left: int, hours_per_day: float) ->
         "per_subject_allocation": per_subject_allocation,
         "total_available_hours": total_available,
     }
+
+def waterfill_cumulative(required: np.ndarray, weights: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+    """
+    Proportional fill with caps, solved in closed form.
+    For each total capacity C in `capacity` (shape (D,)), returns how much of
+    each subject is allocated (shape (D, S)): x_i = min(w_i * level, r_i), with
+    the level chosen so sum(x) = min(C, sum(r)).
+    Filling day by day with the same weights equals filling the cumulative
+    capacity at once, so passing capacity = hours_per_day * [1..D] gives the
+    cumulative plan after each day.
+    """
+    S = len(required)
+    active = (weights > 0) & (required > 0)
+    sat = np.full(S, np.inf)  # level at which each subject hits its cap
+    sat[active] = required[active] / weights[active]
+    order = np.argsort(sat, kind="stable")
+    sat_o = sat[order]
+    finite = np.isfinite(sat_o)
+    req_o = np.where(finite, required[order], 0.0)
+    w_o = np.where(finite, weights[order], 0.0)
+
+    w_total = w_o.sum()
+    req_done = np.cumsum(req_o)          # hours of subjects saturated up to breakpoint k
+    w_left = w_total - np.cumsum(w_o)    # weight of subjects still filling after k
+    # total allocated when the level reaches breakpoint k (non-decreasing in k)
+    filled = np.where(finite, req_done + np.where(finite, sat_o, 0.0) * w_left, np.inf)
+
+    C = np.minimum(capacity, req_o.sum())
+    k = np.searchsorted(filled, C, side="left")
+    base = np.concatenate(([0.0], req_done))[k]
+    w_rest = np.concatenate(([w_total], w_left))[k]
+    level = np.divide(C - base, w_rest, out=np.full(len(C), np.inf), where=w_rest > 0)
+
+    with np.errstate(invalid="ignore"):
+        X = np.minimum(np.outer(level, weights), required)
+    X[:, ~active] = 0.0
+    return X
+
+def _daily_fill(subjects: List[Dict], days_left: int, hours_per_day: float):
+    """(names, rounded daily hours (D, S), cumulative fill (D, S)) of the closed-form allocation."""
+    # same name semantics as allocate_time: first occurrence fixes the order, last one the values
+    required = {s["name"]: float(s["required_hours"]) for s in subjects}
+    weights = {s["name"]: float(s["weight"]) for s in subjects}
+    names = list(required)
+    D = max(0, int(days_left))
+    if D == 0 or not names:
+        return names, np.zeros((D, len(names))), np.zeros((D, len(names)))
+
+    req = np.array([required[n] for n in names])
+    w = np.array([weights[n] for n in names])
+    X = waterfill_cumulative(req, w, hours_per_day * np.arange(1, D + 1))
+    return names, np.round(np.diff(X, axis=0, prepend=0.0), 1), X
+
+def _per_subject(names: List[str], X: np.ndarray) -> Dict[str, float]:
+    return {n: round(float(x), 1) for n, x in zip(names, X[-1])} if len(X) else {n: 0.0 for n in names}
+
+def allocate_time_vectorized(subjects: List[Dict], days_left: int, hours_per_day: float) -> Dict:
+    """
+    Same output schema as allocate_time, computed without the per-day pass loop:
+    each day's blocks are the difference of the closed-form cumulative fill
+    (see waterfill_cumulative), one block per subject per day. Cost is
+    O(S log S + D * S) with NumPy doing the D x S work.
+    """
+    total_available = round(days_left * hours_per_day, 1)
+    names, daily, X = _daily_fill(subjects, days_left, hours_per_day)
+    D = len(daily)
+
+    timetable = []
+    for d in range(D):
+        row = daily[d]
+        idx = np.flatnonzero(row > 0)
+        timetable.append({
+            "day": d + 1,
+            "blocks": [{"subject": names[i], "hours": float(row[i])} for i in idx],
+        })
+
+    return {
+        "timetable": timetable,
+        "per_subject_allocation": _per_subject(names, X),
+        "total_available_hours": total_available,
+    }
+
+def allocate_time_columnar(subjects: List[Dict], days_left: int, hours_per_day: float) -> Dict:
+    """
+    allocate_time_vectorized with the timetable as a PlanTable ("plan") instead
+    of per-day dicts: the nonzero cells of the daily matrix, in day-major
+    order, so no block objects are built at all.
+    """
+    from tools.plan_table import PlanTable
+    names, daily, X = _daily_fill(subjects, days_left, hours_per_day)
+    rows, cols = np.nonzero(daily > 0)
+    return {
+        "plan": PlanTable(max(0, int(days_left)), names, rows + 1, cols, daily[rows, cols]),
+        "per_subject_allocation": _per_subject(names, X),
+        "total_available_hours": round(days_left * hours_per_day, 1),
+    }
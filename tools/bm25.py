@@ -0,0 +1,204 @@
+# tools/bm25.py
+import math, re, sqlite3
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# words plus single symbols, so formulas like "v = u + at" keep their operators
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+MAX_SEGMENTS = 8
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+def terms(tokens: List[str]) -> Counter:
+    """Unigrams plus adjacent bigrams ("v =", "= u", ...); bigrams make exact phrases rank first."""
+    c = Counter(tokens)
+    c.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return c
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index kept in SQLite next to the chunk metadata.
+      bm25_vocab(term -> tid)
+      bm25_postings(tid, seg -> ids, tfs)  one row per term per ingest batch ("segment"):
+                                           packed little-endian uint32 chunk ids and uint16 term counts
+      bm25_segments(seg -> docs, max_id)
+      bm25_docs(id -> ntok)                live documents and their lengths
+    Removing documents only drops them from bm25_docs; their postings are
+    skipped at query time and physically dropped when segments are merged
+    (more than MAX_SEGMENTS, or more dead than live documents). Writes go
+    into the caller's transaction; the caller commits and holds the lock.
+    """
+    def __init__(self, db: sqlite3.Connection, k1: float = 1.2, b: float = 0.75):
+        self._db = db
+        self.k1, self.b = k1, b
+        db.execute("CREATE TABLE IF NOT EXISTS bm25_vocab (term TEXT PRIMARY KEY, tid INTEGER NOT NULL UNIQUE)")
+        db.execute("CREATE TABLE IF NOT EXISTS bm25_postings ("
+                   " tid INTEGER NOT NULL, seg INTEGER NOT NULL, ids BLOB NOT NULL, tfs BLOB NOT NULL,"
+                   " PRIMARY KEY (tid, seg)) WITHOUT ROWID")
+        db.execute("CREATE TABLE IF NOT EXISTS bm25_segments (seg INTEGER PRIMARY KEY, docs INTEGER NOT NULL, max_id INTEGER NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS bm25_docs (id INTEGER PRIMARY KEY, ntok INTEGER NOT NULL)")
+        db.commit()
+        self._doclen = None  # np.int32 lengths indexed by chunk id (0 = absent), loaded on first query
+        self._live = 0
+        self._total_len = 0
+
+    # ----- updates -----
+    def _tids(self, words: List[str]) -> Dict[str, int]:
+        db, out = self._db, {}
+        for j in range(0, len(words), 500):
+            part = words[j:j + 500]
+            out.update(db.execute(f"SELECT term, tid FROM bm25_vocab WHERE term IN ({','.join('?' * len(part))})", part))
+        new = [w for w in words if w not in out]
+        if new:
+            start = db.execute("SELECT COALESCE(MAX(tid), 0) FROM bm25_vocab").fetchone()[0] + 1
+            fresh = {w: start + j for j, w in enumerate(new)}
+            db.executemany("INSERT INTO bm25_vocab VALUES (?, ?)", fresh.items())
+            out.update(fresh)
+        return out
+
+    def add(self, ids: Iterable[int], texts: Iterable[str]) -> None:
+        """Index documents as one new segment."""
+        import numpy as np
+        db = self._db
+        docs, flat_terms, flat_docs, flat_tfs = [], [], [], []
+        for i, text in zip(ids, texts):
+            toks = tokenize(text)
+            docs.append((i, len(toks)))
+            c = terms(toks)
+            flat_terms.extend(c.keys())
+            flat_tfs.extend(c.values())
+            flat_docs.extend([i] * len(c))
+        if not docs:
+            return
+        # a chunk id can come back after the highest ids were removed; drop the stale postings first
+        if min(i for i, _ in docs) <= self._max_id() and self._dead() > 0:
+            self.merge()
+        tids = self._tids(sorted(set(flat_terms)))
+        # group the (term, doc, tf) triples by term id: a stable sort keeps doc ids ascending per term
+        t = np.fromiter(map(tids.__getitem__, flat_terms), dtype="int64", count=len(flat_terms))
+        order = np.argsort(t, kind="stable")
+        t = t[order]
+        d = np.asarray(flat_docs, dtype="<u4")[order]
+        f = np.minimum(np.asarray(flat_tfs, dtype="int64"), 65535).astype("<u2")[order]
+        cuts = np.flatnonzero(np.diff(t)) + 1
+        starts, ends = np.r_[0, cuts], np.r_[cuts, len(t)]
+        seg = db.execute("SELECT COALESCE(MAX(seg), 0) FROM bm25_segments").fetchone()[0] + 1
+        db.executemany("INSERT INTO bm25_postings VALUES (?, ?, ?, ?)",
+                       ((int(t[s]), seg, d[s:e].tobytes(), f[s:e].tobytes()) for s, e in zip(starts, ends)))
+        db.execute("INSERT INTO bm25_segments VALUES (?, ?, ?)", (seg, len(docs), max(i for i, _ in docs)))
+        db.executemany("INSERT OR REPLACE INTO bm25_docs VALUES (?, ?)", docs)
+        if self._doclen is not None:
+            self._doclen = None  # cheap to reload; keeps replaced ids and growth simple
+        if db.execute("SELECT COUNT(*) FROM bm25_segments").fetchone()[0] > MAX_SEGMENTS:
+            self.merge()
+
+    def remove(self, ids: List[int]) -> None:
+        db = self._db
+        for j in range(0, len(ids), 500):
+            part = ids[j:j + 500]
+            db.execute(f"DELETE FROM bm25_docs WHERE id IN ({','.join('?' * len(part))})", part)
+        self._doclen = None
+        live = db.execute("SELECT COUNT(*) FROM bm25_docs").fetchone()[0]
+        if self._dead() > live:
+            self.merge()
+
+    def merge(self) -> None:
+        """Rewrite every term's postings as a single segment without removed documents."""
+        import numpy as np
+        db = self._db
+        live = np.array([r[0] for r in db.execute("SELECT id FROM bm25_docs ORDER BY id")], dtype="<u4")
+        rows = db.execute("SELECT tid, ids, tfs FROM bm25_postings ORDER BY tid, seg").fetchall()
+        merged, tid, parts = [], None, []
+
+        def flush():
+            if not parts:
+                return
+            ids = np.concatenate([np.frombuffer(p[0], dtype="<u4") for p in parts])
+            tfs = np.concatenate([np.frombuffer(p[1], dtype="<u2") for p in parts])
+            keep = np.isin(ids, live, assume_unique=False)
+            if keep.any():
+                merged.append((tid, 1, ids[keep].tobytes(), tfs[keep].tobytes()))
+
+        for t, ids, tfs in rows:
+            if t != tid:
+                flush()
+                tid, parts = t, []
+            parts.append((ids, tfs))
+        flush()
+        db.execute("DELETE FROM bm25_postings")
+        db.executemany("INSERT INTO bm25_postings VALUES (?, ?, ?, ?)", merged)
+        db.execute("DELETE FROM bm25_vocab WHERE tid NOT IN (SELECT tid FROM bm25_postings)")
+        db.execute("DELETE FROM bm25_segments")
+        if len(live):
+            db.execute("INSERT INTO bm25_segments VALUES (1, ?, ?)", (len(live), int(live[-1])))
+
+    def clear(self) -> None:
+        for t in ("bm25_vocab", "bm25_postings", "bm25_segments", "bm25_docs"):
+            self._db.execute(f"DELETE FROM {t}")
+        self._doclen = None
+
+    def backfill(self) -> int:
+        """Index chunks stored before BM25 existed. Returns how many were added."""
+        rows = self._db.execute("SELECT id, text FROM chunks WHERE id NOT IN (SELECT id FROM bm25_docs)").fetchall()
+        if rows:
+            self.add([r[0] for r in rows], [r[1] for r in rows])
+        return len(rows)
+
+    def _max_id(self) -> int:
+        return self._db.execute("SELECT COALESCE(MAX(max_id), 0) FROM bm25_segments").fetchone()[0]
+
+    def _dead(self) -> int:
+        indexed = self._db.execute("SELECT COALESCE(SUM(docs), 0) FROM bm25_segments").fetchone()[0]
+        return indexed - self._db.execute("SELECT COUNT(*) FROM bm25_docs").fetchone()[0]
+
+    # ----- queries -----
+    def resident_bytes(self) -> int:
+        return int(self._doclen.nbytes) if self._doclen is not None else 0
+
+    def release(self) -> None:
+        self._doclen = None
+
+    def _lengths(self):
+        import numpy as np
+        if self._doclen is None:
+            rows = np.array(self._db.execute("SELECT id, ntok FROM bm25_docs").fetchall(), dtype="int64").reshape(-1, 2)
+            doclen = np.zeros(int(rows[:, 0].max()) + 1 if len(rows) else 0, dtype="int32")
+            doclen[rows[:, 0]] = np.maximum(rows[:, 1], 1)  # 0 marks "not a live document"
+            self._doclen, self._live, self._total_len = doclen, len(rows), int(rows[:, 1].sum())
+        return self._doclen
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Top-k (chunk id, BM25 score) for the query, best first."""
+        import numpy as np
+        doclen = self._lengths()
+        n = self._live
+        if not n:
+            return []
+        avgdl = self._total_len / n or 1.0
+        k1, b = self.k1, self.b
+        all_ids, all_w = [], []
+        for term, qtf in terms(tokenize(query)).items():
+            blobs = self._db.execute("SELECT p.ids, p.tfs FROM bm25_vocab v JOIN bm25_postings p ON p.tid = v.tid"
+                                     " WHERE v.term = ?", (term,)).fetchall()
+            if not blobs:
+                continue
+            ids = np.concatenate([np.frombuffer(r[0], dtype="<u4") for r in blobs]).astype("int64")
+            tfs = np.concatenate([np.frombuffer(r[1], dtype="<u2") for r in blobs]).astype("float64")
+            ids_ok = ids < len(doclen)
+            dl = np.zeros(len(ids), dtype="float64")
+            dl[ids_ok] = doclen[ids[ids_ok]]
+            live = dl > 0
+            if not live.any():
+                continue
+            ids, tfs, dl = ids[live], tfs[live], dl[live]
+            df = len(ids)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            all_ids.append(ids)
+            all_w.append(qtf * idf * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * dl / avgdl)))
+        if not all_ids:
+            return []
+        uniq, inv = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(all_w))
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        return sorted(((int(uniq[i]), float(scores[i])) for i in top), key=lambda x: (-x[1], x[0]))
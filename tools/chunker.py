@@ -0,0 +1,82 @@
+# tools/chunker.py
+import re
+from typing import Callable, Iterator, List, Optional, Tuple
+
+_NON_SPACE = re.compile(r"\S")
+_SPACE = re.compile(r"\s")
+# preferred cut points, best first: paragraph break, sentence end, any whitespace
+_BOUNDARIES = (("\n\n",), (". ", "? ", "! ", ".\n", "?\n", "!\n", "; "), (" ", "\n", "\t"))
+
+def _best_cut(text: str, lo: int, hi: int) -> int:
+    """Rightmost preferred boundary in text[lo:hi]; returns hi if there is none."""
+    for group in _BOUNDARIES:
+        best = max(text.rfind(sep, lo, hi) for sep in group)
+        if best > lo:
+            return best + 1  # keep the period; trailing whitespace is stripped by the caller
+    return hi
+
+def _rstrip(text: str, start: int, end: int) -> int:
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+def iter_spans(
+    text: str,
+    max_chars: int = 900,
+    overlap: int = 120,
+    tolerance: int = 200,
+    max_tokens: Optional[int] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    chars_per_token: float = 4.0,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Single pass over `text`, yielding (start, end) offsets of chunks instead of copies.
+    Each chunk is at most max_chars long and ends at the best paragraph /
+    sentence / word boundary within the last `tolerance` chars of the window.
+    The next chunk starts ~`overlap` chars earlier (at most half the chunk), at a word start.
+    Optional token budgeting: max_tokens caps the window (≈chars_per_token
+    chars per token), and count_tokens, if given, is used to shrink a
+    chunk until it fits. Boundary searches are bounded by the tolerance window,
+    so the whole pass is O(len(text)).
+    """
+    n = len(text)
+    if max_tokens:
+        max_chars = max(1, min(max_chars, int(max_tokens * chars_per_token)))
+    overlap = max(0, min(overlap, max_chars // 2))
+    tolerance = max(0, min(tolerance, max_chars - overlap - 1))
+
+    m = _NON_SPACE.search(text, 0)
+    start = m.start() if m else n
+    last = _rstrip(text, start, n)
+    prev_end = 0
+    while start < n:
+        end = min(start + max_chars, n)
+        if end < n:
+            end = _best_cut(text, end - tolerance, end)
+        if count_tokens and max_tokens:
+            while end - start > 1 and count_tokens(text[start:end]) > max_tokens:
+                mid = start + (end - start) * 3 // 4
+                end = _best_cut(text, max(start + 1, mid - tolerance), mid)
+        end = _rstrip(text, start, end)
+        if end <= prev_end and start < prev_end:
+            # the overlap alone used up the token budget: start this chunk where the last one ended
+            m = _NON_SPACE.search(text, prev_end)
+            start = m.start() if m else n
+            continue
+        if end > start:
+            yield start, end
+            prev_end = end
+        if end >= last:
+            return
+        # next window: back off by `overlap` (at most half of this chunk, which the token
+        # budget may have shrunk well below max_chars), then move forward to the next word start
+        nxt = max(end - min(overlap, (end - start) // 2), start + 1)
+        if nxt < end and not text[nxt - 1].isspace():
+            m = _SPACE.search(text, nxt, end)
+            nxt = m.end() if m else end
+        m = _NON_SPACE.search(text, nxt)
+        start = m.start() if m else n
+
+def chunk_text(text: str, **kwargs) -> List[str]:
+    """Materialize chunks (whitespace collapsed, as embeddings/cache keys expect)."""
+    return [" ".join(text[a:b].split()) for a, b in iter_spans(text, **kwargs)]
@@ -0,0 +1,145 @@
+# tools/dedup.py
+"""
+Near-duplicate detection for chunks: MinHash signatures over word 5-gram
+shingles, with LSH banding to find candidate pairs.
+
+Two chunks are near-duplicates when the estimated Jaccard similarity of their
+shingle sets is at least RAG_DEDUP_THRESHOLD (default 0.8). With 64 hash
+functions in 16 bands of 4 rows, pairs at 0.8 become candidates with
+probability ~0.9998 and unrelated chunks (< 0.3) rarely (~0.1), so a lookup
+touches a few buckets instead of comparing against every chunk. Candidates
+are confirmed on the full signature. Adjacent chunks of one document share
+only a ~120-char overlap, far below the threshold, so they are never merged.
+"""
+import os, re, threading, zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE = 5  # words per shingle
+
+_WORD = re.compile(r"\w+")
+_rng = np.random.default_rng(0x5EED)  # fixed: signatures must agree across processes and runs
+_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_MIX = np.array([(0x9E3779B97F4A7C15 * (i + 1) | 1) & (2**64 - 1) for i in range(SHINGLE)], dtype=np.uint64)
+
+# signatures of recently returned hits: searches keep hitting the same chunks, and a
+# signature costs ~0.1 ms, several per query
+_SIG_MEMO: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_SIG_MEMO_MAX = 8192
+_SIG_LOCK = threading.Lock()
+
+def dedup_enabled() -> bool:
+    return os.getenv("RAG_DEDUP", "1").lower() not in ("0", "false", "no", "off")
+
+def dedup_threshold() -> float:
+    return float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+
+def signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of the text's word shingles."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint32)
+    h = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint64, count=len(words))
+    k = min(SHINGLE, len(h))
+    n = len(h) - k + 1
+    shingles = np.zeros(n, dtype=np.uint64)
+    for j in range(k):  # order-sensitive combination of k consecutive word hashes (wrapping arithmetic)
+        shingles ^= h[j:j + n] * _MIX[j]
+    # multiply-shift hashing: the top 32 bits of a*x + b (mod 2^64) per hash function
+    return ((np.outer(_A, shingles) + _B[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+def _hit_signature(text: str) -> np.ndarray:
+    with _SIG_LOCK:
+        sig = _SIG_MEMO.get(text)
+        if sig is not None:
+            _SIG_MEMO.move_to_end(text)
+            return sig
+    sig = signature(text)
+    with _SIG_LOCK:
+        _SIG_MEMO[text] = sig
+        while len(_SIG_MEMO) > _SIG_MEMO_MAX:
+            _SIG_MEMO.popitem(last=False)
+    return sig
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+class NearDupIndex:
+    """LSH over MinHash signatures: add() chunks, find() the best near-duplicate already added."""
+    def __init__(self, threshold: Optional[float] = None, bands: int = BANDS):
+        self.threshold = dedup_threshold() if threshold is None else threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._sigs: List[np.ndarray] = []
+        self.keys: List[str] = []
+
+    def _bands(self, sig: np.ndarray) -> Iterator[Tuple[int, bytes]]:
+        for b in range(self.bands):
+            yield b, sig[b * self.rows:(b + 1) * self.rows].tobytes()
+
+    def find(self, sig: np.ndarray) -> Tuple[Optional[str], float]:
+        """(key, similarity) of the most similar added chunk at or above the threshold, else (None, best)."""
+        seen, best, best_i = set(), 0.0, -1
+        for b, band in self._bands(sig):
+            for i in self._buckets[b].get(band, ()):
+                if i not in seen:
+                    seen.add(i)
+                    s = similarity(sig, self._sigs[i])
+                    if s > best:
+                        best, best_i = s, i
+        return (self.keys[best_i], best) if best_i >= 0 and best >= self.threshold else (None, best)
+
+    def add(self, key: str, sig: np.ndarray) -> None:
+        i = len(self._sigs)
+        self._sigs.append(sig)
+        self.keys.append(key)
+        for b, band in self._bands(sig):
+            self._buckets[b].setdefault(band, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self._sigs)
+
+def dedup_stream(items: Iterable[Tuple[str, str]], index: NearDupIndex,
+                 dropped: Optional[List[Tuple[str, str, str]]] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Pass (label, text) items through, skipping near-duplicates of anything
+    already in `index` (the first occurrence is kept). Skipped items are
+    appended to `dropped` as (label, text, label of the kept chunk).
+    """
+    for label, text in items:
+        sig = signature(text)
+        match, _ = index.find(sig)
+        if match is not None:
+            if dropped is not None:
+                dropped.append((label, text, match))
+            continue
+        index.add(label, sig)
+        yield label, text
+
+def dedup_hits(hits: List[Dict], k: int, threshold: Optional[float] = None,
+               dropped: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Best-first hits without near-duplicates of a higher-ranked hit, cut to k.
+    Pass a deeper list than k so removed duplicates can be replaced; the
+    removed ones are appended to `dropped`.
+    """
+    threshold = dedup_threshold() if threshold is None else threshold
+    kept, sigs = [], []
+    for h in hits:
+        sig = _hit_signature(h.get("text", ""))
+        if any(similarity(sig, s) >= threshold for s in sigs):
+            if dropped is not None:
+                dropped.append(h)
+            continue
+        kept.append(h)
+        sigs.append(sig)
+        if len(kept) == k:
+            break
+    return kept
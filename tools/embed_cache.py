@@ -0,0 +1,110 @@
+# tools/embed_cache.py
+import os, sqlite3, hashlib, threading, time
+from typing import List, Optional
+
+import numpy as np
+
+def _key(text: str) -> bytes:
+    # whitespace-normalized so re-pasted notes with different line wrapping still hit
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk embedding cache.
+    Rows are keyed by (embed model, sha256 of normalized chunk text) and hold
+    float32 vectors as SQLite blobs. Least-recently-used rows are evicted once
+    the table grows past `max_entries`.
+    """
+    def __init__(self, path: str, max_entries: int = 200_000):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, key BLOB NOT NULL, vec BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, key)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used)")
+        self._db.commit()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [_key(t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                                     [(now, model, k) for k in found])
+                self._db.commit()
+            out = [np.frombuffer(found[k], dtype="float32") if k in found else None for k in keys]
+            hit = sum(v is not None for v in out)
+            self.hits += hit
+            self.misses += len(out) - hit
+        return out
+
+    def put_many(self, model: str, texts: List[str], vecs) -> None:
+        now = time.time()
+        rows = [(model, _key(t), np.asarray(v, dtype="float32").tobytes(), now) for t, v in zip(texts, vecs)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            n = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if n > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE (model, key) IN"
+                    " (SELECT model, key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (n - self.max_entries,),
+                )
+            self._db.commit()
+
+    def embed(self, embedder, texts: List[str]) -> np.ndarray:
+        """Return embeddings for texts, calling `embedder` only for cache misses."""
+        cached = self.get_many(embedder.model, texts)
+        todo = {}  # normalized key -> first text needing it (dedupes repeats in one call)
+        for t, v in zip(texts, cached):
+            if v is None:
+                todo.setdefault(_key(t), t)
+        if todo:
+            fresh_texts = list(todo.values())
+            fresh = embedder.embed(fresh_texts)
+            self.put_many(embedder.model, fresh_texts, fresh)
+            by_key = {k: np.asarray(v, dtype="float32") for k, v in zip(todo, fresh)}
+            cached = [v if v is not None else by_key[_key(t)] for t, v in zip(texts, cached)]
+        if not cached:
+            return np.zeros((0, 0), dtype="float32")
+        return np.vstack(cached)
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {"entries": n, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+_CACHES = {}
+
+def get_embed_cache() -> Optional[EmbeddingCache]:
+    """
+    Shared cache selected by env:
+      EMBED_CACHE=1 (default) | 0 to disable
+      EMBED_CACHE_PATH (.cache/embeddings.sqlite), EMBED_CACHE_MAX_ENTRIES (200000)
+    """
+    if os.getenv("EMBED_CACHE", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    path = os.getenv("EMBED_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite"))
+    if path not in _CACHES:
+        _CACHES[path] = EmbeddingCache(path, int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000")))
+    return _CACHES[path]
@@ -0,0 +1,132 @@
+# tools/embeddings.py
+import os, time, random, hashlib, re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Callable, Optional
+
+import numpy as np
+
+from utils import telemetry
+from utils.retry import is_retryable
+
+def embed_in_batches(
+    embed_batch: Callable[[List[str]], List[List[float]]],
+    texts: List[str],
+    batch_size: int = 100,
+    concurrency: int = 4,
+    max_retries: int = 5,
+    base_delay: float = 0.5,
+) -> List[List[float]]:
+    """
+    Split texts into batches, run up to `concurrency` batches at once and
+    retry rate-limited batches with jittered exponential backoff.
+    Results come back in the original order.
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def run(batch: List[str]) -> List[List[float]]:
+        for attempt in range(max_retries + 1):
+            try:
+                out = embed_batch(batch)
+                if len(out) != len(batch):
+                    raise RuntimeError(f"Embedding batch returned {len(out)} vectors for {len(batch)} texts.")
+                return out
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e):
+                    raise
+                telemetry.incr("retry.embed")
+                time.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+        return []  # unreachable
+
+    if len(batches) <= 1 or concurrency <= 1:
+        results = [run(b) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            results = list(pool.map(run, batches))  # map keeps submission order
+    return [v for r in results for v in r]
+
+class GeminiEmbedder:
+    """Google embedding API, batched + concurrent."""
+    def __init__(self, model: Optional[str] = None, batch_size: int = 100,
+                 concurrency: int = 4, max_retries: int = 5):
+        import google.generativeai as genai
+        api = os.getenv("GOOGLE_API_KEY")
+        if not api:
+            raise RuntimeError("GOOGLE_API_KEY not set for embeddings.")
+        genai.configure(api_key=api)  # once per embedder, not per chunk
+        self._genai = genai
+        self.model = model or os.getenv("EMBED_MODEL", "text-embedding-004")
+        self.batch_size = max(1, min(batch_size, 100))  # API limit is 100 per batch request
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        return self._genai.embed_content(model=self.model, content=batch)["embedding"]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vecs = embed_in_batches(self._embed_batch, texts, self.batch_size,
+                                self.concurrency, self.max_retries)
+        return np.asarray(vecs, dtype="float32")
+
+_TOKEN = re.compile(r"\w+")
+
+class HashEmbedder:
+    """
+    Deterministic offline stand-in: signed feature hashing of word unigrams.
+    Texts sharing words get similar vectors, so search results are meaningful
+    in tests and benchmarks without any network calls.
+    """
+    def __init__(self, dim: int = 256, batch_size: int = 100, concurrency: int = 1):
+        self.dim = dim
+        self.model = f"hash-{dim}"
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        v = np.zeros(self.dim, dtype="float32")
+        for tok in _TOKEN.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(tok.encode(), digest_size=8).digest(), "little")
+            v[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _embed_batch(self, batch: List[str]) -> List[np.ndarray]:
+        return [self._embed_one(t) for t in batch]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        vecs = embed_in_batches(self._embed_batch, texts, self.batch_size, self.concurrency, 0)
+        return np.vstack(vecs).astype("float32", copy=False)
+
+_EMBEDDERS = {}
+
+def get_embedder():
+    """
+    Embedding backend selected by env:
+      EMBED_BACKEND=gemini (default) | hash
+      EMBED_MODEL=fake: local stand-in for the Gemini API (utils.fake_backend), no API key needed
+      EMBED_BATCH_SIZE (100), EMBED_CONCURRENCY (4), EMBED_MAX_RETRIES (5), EMBED_HASH_DIM (256)
+    """
+    from utils.fake_backend import FakeEmbedder, is_fake
+    backend = os.getenv("EMBED_BACKEND", "gemini").lower()
+    batch_size = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+    concurrency = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    if backend == "hash":
+        key = (backend, int(os.getenv("EMBED_HASH_DIM", "256")), batch_size, concurrency)
+        if key not in _EMBEDDERS:
+            _EMBEDDERS[key] = HashEmbedder(dim=key[1], batch_size=batch_size, concurrency=concurrency)
+    elif backend == "gemini" and is_fake(os.getenv("EMBED_MODEL")):
+        key = ("fake", int(os.getenv("EMBED_HASH_DIM", "256")), batch_size, concurrency,
+               int(os.getenv("EMBED_MAX_RETRIES", "5")))
+        if key not in _EMBEDDERS:
+            _EMBEDDERS[key] = FakeEmbedder(dim=key[1], batch_size=batch_size, concurrency=concurrency,
+                                           max_retries=key[4])
+    elif backend == "gemini":
+        key = (backend, os.getenv("EMBED_MODEL", "text-embedding-004"), batch_size, concurrency,
+               int(os.getenv("EMBED_MAX_RETRIES", "5")), os.getenv("GOOGLE_API_KEY"))
+        if key not in _EMBEDDERS:
+            _EMBEDDERS[key] = GeminiEmbedder(model=key[1], batch_size=batch_size,
+                                             concurrency=concurrency, max_retries=key[4])
+    else:
+        raise RuntimeError(f"Unknown EMBED_BACKEND: {backend!r} (use 'gemini' or 'hash').")
+    return _EMBEDDERS[key]
@@ -0,0 +1,130 @@
+# tools/index_registry.py
+import os, threading, weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from tools.index_store import IndexStore
+from utils.telemetry import span
+
+class IndexRegistry:
+    """
+    Process-wide set of open IndexStores (one per tenant/session index, plus
+    shared corpora), in least-recently-used order.
+
+    Private stores count against a RAM budget (RAG_MEMORY_BUDGET_MB, default
+    1024) and an open-store cap (RAG_MAX_OPEN_INDEXES, default 64). When either
+    is exceeded, the least recently used stores are evicted: their index goes
+    back to a mapping of the file already on disk and the registry keeps only
+    a weak reference. A thread still using an evicted store (a retrieve branch,
+    a build in another session) keeps the same object, and the next get()
+    hands that object back, so there is never a second IndexStore (FAISS
+    object, SQLite connection) writing the same directory. Once nobody holds
+    it, it is closed, and get() reopens it from disk (memory-mapped, milliseconds).
+
+    Shared corpora are opened read-only and memory-mapped once, never evicted,
+    and are not charged to the budget: their pages sit in the OS page cache,
+    shared by every session (and process) that maps the file.
+    """
+    def __init__(self, budget_bytes: Optional[int] = None, max_open: Optional[int] = None):
+        self.budget_bytes = budget_bytes
+        self.max_open = max_open
+        self._open: "OrderedDict[str, IndexStore]" = OrderedDict()
+        self._shared: Dict[str, IndexStore] = {}
+        self._evicted: "weakref.WeakValueDictionary[str, IndexStore]" = weakref.WeakValueDictionary()
+        self._evicted_names: set = set()
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.reloads = 0
+
+    def _limits(self):
+        budget = self.budget_bytes
+        if budget is None:
+            budget = int(float(os.getenv("RAG_MEMORY_BUDGET_MB", "1024")) * 2**20)
+        max_open = self.max_open or int(os.getenv("RAG_MAX_OPEN_INDEXES", "64"))
+        return budget, max(1, max_open)
+
+    def get(self, name: str) -> IndexStore:
+        """The named private store, opened (or reopened after eviction) on demand."""
+        with self._lock:
+            store = self._open.get(name)
+            if store is None:
+                if name in self._shared:
+                    return self._shared[name]
+                store = self._evicted.pop(name, None)  # evicted, but still alive somewhere
+                if store is None:
+                    store = IndexStore(name)
+                    if name in self._evicted_names:
+                        self.reloads += 1
+                self._evicted_names.discard(name)
+                self._open[name] = store
+            self._open.move_to_end(name)
+            self.enforce(keep=name)
+            return store
+
+    def put(self, store: IndexStore) -> IndexStore:
+        """Register an already-open store under its name (replacing any previous one)."""
+        with self._lock:
+            self._open[store.name] = store
+            self._open.move_to_end(store.name)
+            self.enforce(keep=store.name)
+        return store
+
+    def shared(self, name: str) -> IndexStore:
+        """A read-only corpus, mapped once per process and reused by every tenant."""
+        with self._lock:
+            store = self._shared.get(name)
+            if store is None:
+                store = self._shared[name] = IndexStore(name, read_only=True)
+            return store
+
+    def shared_names(self) -> List[str]:
+        """Shared corpora configured in RAG_SHARED_INDEXES (comma-separated index names)."""
+        return [n.strip() for n in os.getenv("RAG_SHARED_INDEXES", "").split(",") if n.strip()]
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(s.resident_bytes() for s in self._open.values())
+
+    def evict(self, name: str) -> int:
+        """Release one private store's RAM and forget it. Returns bytes released."""
+        with self._lock:
+            store = self._open.pop(name, None)
+            if store is None:
+                return 0
+            self._evicted[name] = store
+            self._evicted_names.add(name)
+            self.evictions += 1
+        with span("index.evict", index=name) as sp:
+            sp["bytes"] = freed = store.release()
+        return freed
+
+    def enforce(self, keep: str = "") -> int:
+        """Evict least recently used stores (never `keep`) until within budget. Returns bytes released."""
+        budget, max_open = self._limits()
+        freed = 0
+        with self._lock:
+            used = self.resident_bytes()
+            for name in list(self._open):
+                if used <= budget and len(self._open) <= max_open:
+                    break
+                if name == keep:
+                    continue
+                n = self.evict(name)
+                used -= n
+                freed += n
+        return freed
+
+    def clear(self) -> None:
+        """Forget every open store (nothing is deleted on disk)."""
+        with self._lock:
+            self._open.clear()
+            self._shared.clear()
+            self._evicted.clear()
+            self._evicted_names.clear()
+
+    def stats(self) -> Dict:
+        budget, max_open = self._limits()
+        with self._lock:
+            return {"open": len(self._open), "shared": len(self._shared), "resident_bytes": self.resident_bytes(),
+                    "budget_bytes": budget, "max_open": max_open, "evictions": self.evictions,
+                    "reloads": self.reloads}
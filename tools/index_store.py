@@ -0,0 +1,529 @@
+# tools/index_store.py
+import os, sqlite3, threading, time, math
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional, Tuple
+
+from tools.bm25 import BM25Index
+from utils.telemetry import span
+
+INDEX_KINDS = ("flat", "ivf", "hnsw", "ivfpq")
+_AUTO_TIERS = ("flat", "ivf", "ivfpq")
+
+def auto_kind(n: int) -> str:
+    """Pick an index type for a corpus of n chunks (exact search while it's cheap)."""
+    if n < 10_000:
+        return "flat"
+    if n < 200_000:
+        return "ivf"
+    return "ivfpq"
+
+def min_recall() -> float:
+    """recall@10 an approximate index must reach after a rebuild (RAG_MIN_RECALL, default 0.9)."""
+    return float(os.getenv("RAG_MIN_RECALL", "0.9"))
+
+def _kind_of(index) -> str:
+    import faiss
+    sub = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+    if isinstance(sub, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(sub, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(sub, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+def read_mapped(path: str):
+    """
+    Open a saved index as a read-only memory map. IO_FLAG_MMAP_IFC (faiss >= 1.9)
+    maps flat codes and HNSW graphs too, not just IVF lists, so the pages live in
+    the OS page cache and are shared by every store and process mapping the file.
+    """
+    import faiss
+    return faiss.read_index(path, getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP))
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """
+    Apply query-time knobs: nprobe for IVF kinds, efSearch for HNSW (env RAG_NPROBE /
+    RAG_EF_SEARCH). Without either, nprobe is ~nlist/8 (at least 16), or the value
+    saved with the index if tune_recall raised it further.
+    """
+    import faiss
+    nprobe = nprobe or int(os.getenv("RAG_NPROBE", "0"))
+    ef_search = ef_search or int(os.getenv("RAG_EF_SEARCH", "64"))
+    sub = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+    if isinstance(sub, faiss.IndexIVF):
+        nprobe = nprobe or max(sub.nprobe, 16, sub.nlist // 8)
+        sub.nprobe = max(1, min(nprobe, sub.nlist))
+    elif isinstance(sub, faiss.IndexHNSW):
+        sub.hnsw.efSearch = ef_search
+
+def make_index(kind: str, dim: int, train_x=None, n: Optional[int] = None):
+    """
+    Build an empty, trained index of the given kind (flat | ivf | hnsw | ivfpq | auto)
+    for inner-product search that takes add_with_ids: IVF kinds store ids natively,
+    flat and HNSW are wrapped in an IndexIDMap. `train_x` (normalized vectors) is sampled for IVF/PQ training;
+    `n` is the expected corpus size used to size nlist (defaults to len(train_x)).
+    """
+    import faiss, numpy as np
+    ntrain = 0 if train_x is None else len(train_x)
+    n = n or ntrain
+    if kind == "auto":
+        kind = auto_kind(n)
+    if kind not in INDEX_KINDS:
+        raise RuntimeError(f"Unknown index kind: {kind!r} (use one of {INDEX_KINDS + ('auto',)}).")
+    if kind in ("ivf", "ivfpq") and ntrain == 0:
+        raise RuntimeError(f"Index kind '{kind}' needs training vectors.")
+
+    nlist = max(1, min(int(4 * math.sqrt(n)), ntrain // 39 or 1))
+    if kind == "flat":
+        spec = "Flat"
+    elif kind == "hnsw":
+        spec = "HNSW32,Flat"
+    elif kind == "ivf":
+        spec = f"IVF{nlist},Flat"
+    else:
+        m = max(d for d in range(1, max(1, dim // 4) + 1) if dim % d == 0)  # ~1 byte per 4 dims
+        nbits = max(1, min(8, int(math.log2(max(2, ntrain // 39)))))
+        spec = f"IVF{nlist},PQ{m}x{nbits}np"  # np: skip polysemous training (10x slower, unused here)
+    base = faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+    if not base.is_trained:
+        cap = min(ntrain, max(40 * nlist, 10_000))  # ~39 points per centroid is enough
+        rows = np.random.RandomState(0).choice(ntrain, cap, replace=False) if cap < ntrain else slice(None)
+        base.train(np.ascontiguousarray(train_x[rows], dtype="float32"))
+    # IVF keeps its own ids; under an IndexIDMap, remove_ids would desync the id map from the lists
+    index = base if isinstance(faiss.downcast_index(base), faiss.IndexIVF) else faiss.IndexIDMap(base)
+    set_search_params(index)
+    return index
+
+def stored_vectors(index):
+    """
+    (ids, vectors) held by an index from make_index, read back out of it: exact
+    for flat, HNSW and IVF-Flat, PQ decodings for ivfpq. None for IVF indexes
+    wrapped in an IndexIDMap (saved by older versions), whose id map can't be trusted.
+    """
+    import faiss, numpy as np
+    if isinstance(index, faiss.IndexIDMap):
+        if isinstance(faiss.downcast_index(index.index), faiss.IndexIVF):
+            return None
+        return faiss.vector_to_array(index.id_map).astype("int64"), index.index.reconstruct_n(0, index.ntotal)
+    ivf = faiss.extract_index_ivf(index)
+    lists = [faiss.rev_swig_ptr(ivf.invlists.get_ids(l), ivf.invlists.list_size(l)).copy()
+             for l in range(ivf.nlist) if ivf.invlists.list_size(l)]
+    ids = np.concatenate(lists).astype("int64") if lists else np.zeros(0, dtype="int64")
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)  # id -> (list, offset) for reconstruct
+    try:
+        return ids, index.reconstruct_batch(ids)
+    finally:
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+
+def tune_recall(index, ids, xb, target: float, k: int = 10, n_queries: int = 200) -> float:
+    """
+    recall@k of `index` over its own vectors (ids sorted, xb normalized rows in the
+    same order), sampling n_queries of them as queries against brute force. For IVF
+    kinds nprobe is doubled (up to nlist) until `target` is reached. A hit counts if
+    it scores at least the exact k-th score, so tied duplicates aren't misses.
+    Returns the recall reached.
+    """
+    import faiss, numpy as np
+    k = min(k, len(xb))
+    rows = np.random.RandomState(1).choice(len(xb), min(n_queries, len(xb)), replace=False)
+    xq = xb[rows]
+    kth = faiss.knn(xq, xb, k, faiss.METRIC_INNER_PRODUCT)[0][:, -1:]
+    ivf = faiss.try_extract_index_ivf(index)
+    while True:
+        _, got = index.search(xq, k)
+        pos = np.searchsorted(ids, got)
+        found = (got >= 0) & (pos < len(ids))
+        pos[~found] = 0
+        true = np.einsum("qd,qkd->qk", xq, xb[pos])  # exact scores, also for PQ's approximate hits
+        recall = float(((true >= kth - 1e-5) & found).sum()) / (len(xq) * k)
+        if recall >= target or ivf is None or ivf.nprobe >= ivf.nlist:
+            return round(recall, 4)
+        ivf.nprobe = min(ivf.nlist, ivf.nprobe * 2)
+
+def recall_at_k(candidate, exact, xq, k: int = 10) -> float:
+    """Mean fraction of the exact top-k ids that `candidate` also returns."""
+    _, I_c = candidate.search(xq, k)
+    _, I_e = exact.search(xq, k)
+    found = [len(set(c[c >= 0]) & set(e[e >= 0])) / max(1, int((e >= 0).sum())) for c, e in zip(I_c, I_e)]
+    return round(sum(found) / max(1, len(found)), 4)
+
+def compare_kinds(xb, xq, k: int = 10, kinds=INDEX_KINDS) -> List[Dict]:
+    """
+    Build each index kind over normalized vectors xb and report recall@k against
+    the flat baseline, build time, per-query latency and bytes per vector.
+    """
+    import faiss, numpy as np
+    ids = np.arange(len(xb), dtype="int64")
+    exact = make_index("flat", xb.shape[1])
+    exact.add_with_ids(xb, ids)
+    out = []
+    for kind in kinds:
+        t0 = time.perf_counter()
+        index = make_index(kind, xb.shape[1], xb)
+        index.add_with_ids(xb, ids)
+        build_s = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        index.search(xq, k)
+        query_ms = (time.perf_counter() - t1) * 1000 / max(1, len(xq))
+        out.append({
+            "kind": kind,
+            f"recall@{k}": recall_at_k(index, exact, xq, k),
+            "build_s": round(build_s, 4),
+            "query_ms": round(query_ms, 4),
+            "bytes_per_vector": round(faiss.serialize_index(index).nbytes / max(1, len(xb)), 1),
+        })
+    return out
+
+class IndexStore:
+    """
+    Named, persistent vector index.
+      <root>/<name>/index.faiss  FAISS index with chunk ids (inner product on L2-normalized vectors)
+      <root>/<name>/meta.sqlite  chunk sidecar: id -> (source, label, text), plus the
+                                 BM25 postings for lexical search (see tools.bm25)
+    Chunk text stays on disk and is only read back for search hits, so the
+    in-process footprint is the FAISS index alone. The index file is loaded
+    with IO_FLAG_MMAP, so opening an existing store takes milliseconds; it is
+    re-read into RAM on the first mutation.
+
+    kind: flat | ivf | hnsw | ivfpq | auto (env RAG_INDEX_KIND, default auto).
+    In auto mode the index is rebuilt with a bigger type when the corpus
+    crosses a size tier (see auto_kind), from the vectors already in the index,
+    and with a smaller one once removals leave it under half of a tier's floor.
+    Rebuilds raise nprobe until recall@10 reaches RAG_MIN_RECALL; an auto-mode
+    index that still falls short is rebuilt flat (exact) instead.
+
+    read_only stores (shared corpora) stay memory-mapped and refuse mutations.
+
+    Every mutation saves the index file, except inside deferred_save(), where
+    the file is written once at the end (bulk ingestion: one write per source
+    instead of one per batch). Metadata is still committed per mutation.
+    """
+    def __init__(self, name: str = "default", root: Optional[str] = None, kind: Optional[str] = None,
+                 read_only: bool = False):
+        root = root or os.getenv("RAG_INDEX_DIR", ".rag_index")
+        self.name = name
+        self.read_only = read_only
+        self.kind = kind or os.getenv("RAG_INDEX_KIND", "auto")
+        self.dir = os.path.join(root, name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.index_path = os.path.join(self.dir, "index.faiss")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(self.dir, "meta.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id INTEGER PRIMARY KEY, source TEXT NOT NULL, label TEXT NOT NULL, text TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source)")
+        self._db.commit()
+        self.lexical = BM25Index(self._db)
+        # stores written before BM25 get backfilled on first lexical query (never for read-only ones)
+        self._lexical_checked = read_only
+        self.index = None
+        self._mmapped = False
+        self._deferred = 0   # open deferred_save() blocks
+        self._dirty = False  # index changed since the last write
+        self._failed_tier = ""  # auto tier that missed the recall floor (kept flat instead)
+        if os.path.exists(self.index_path):
+            self.index = read_mapped(self.index_path)
+            self._mmapped = True
+            set_search_params(self.index)
+
+    # ----- info -----
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal) if self.index is not None else 0
+
+    @property
+    def dim(self) -> int:
+        return int(self.index.d) if self.index is not None else 0
+
+    @property
+    def index_kind(self) -> str:
+        """Concrete type of the current index ('' when empty)."""
+        return _kind_of(self.index) if self.index is not None else ""
+
+    def resident_bytes(self) -> int:
+        """
+        Approximate private RAM held by this store: the index once it has been
+        read into memory (the saved file is the same size), plus cached BM25
+        document lengths. A mapped index counts as 0; its pages are reclaimable.
+        """
+        n = self.lexical.resident_bytes()
+        if self.index is not None and not self._mmapped and os.path.exists(self.index_path):
+            n += os.path.getsize(self.index_path)
+        return n
+
+    def release(self) -> int:
+        """
+        Give back RAM without closing the store: swap the in-memory index for a
+        mapping of its saved file and drop the BM25 caches. Every mutation is
+        already saved, so nothing is lost; the next write re-reads the file.
+        Returns the bytes released (approximate).
+        """
+        with self._lock:
+            self.flush()  # deferred changes must reach the file before it is mapped back in
+            freed = self.resident_bytes()
+            if self.index is not None and not self._mmapped and os.path.exists(self.index_path):
+                self.index = read_mapped(self.index_path)
+                self._mmapped = True
+                set_search_params(self.index)
+            self.lexical.release()
+        return freed
+
+    def sources(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT source, COUNT(*) FROM chunks GROUP BY source").fetchall()
+        return dict(rows)
+
+    # ----- mutations -----
+    def _mutable(self) -> None:
+        if self.read_only:
+            raise RuntimeError(f"Index '{self.name}' is read-only (shared corpus).")
+
+    def _writable(self):
+        # mapped indexes are read-only; pull the index fully into RAM before changing it
+        if self._mmapped:
+            import faiss
+            self.index = faiss.read_index(self.index_path)
+            self._mmapped = False
+            set_search_params(self.index)
+        return self.index
+
+    def add_documents(self, source: str, texts: List[str], vectors=None,
+                      labels: Optional[List[str]] = None) -> List[int]:
+        """
+        Append chunks for `source`. Vectors are embedded when not given.
+        Returns the assigned chunk ids.
+        """
+        import faiss, numpy as np
+        if not texts:
+            return []
+        if vectors is None:
+            from tools.rag_store import _embed_texts
+            vectors = _embed_texts(texts)
+        self._mutable()
+        xb = np.array(vectors, dtype="float32")
+        faiss.normalize_L2(xb)
+        with self._lock:
+            created = self.index is None
+            if created:
+                self.index = make_index(self.kind, xb.shape[1], xb)
+            elif xb.shape[1] != self.index.d:
+                raise RuntimeError(
+                    f"Index '{self.name}' has dim={self.index.d} but got dim={xb.shape[1]} vectors; "
+                    "clear() it after changing the embedding model."
+                )
+            start = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM chunks").fetchone()[0] + 1
+            if labels is None:
+                n0 = self._db.execute("SELECT COUNT(*) FROM chunks WHERE source = ?", (source,)).fetchone()[0]
+                labels = [f"{source}#{n0 + j + 1}" for j in range(len(texts))]
+            ids = list(range(start, start + len(texts)))
+            self._writable().add_with_ids(xb, np.array(ids, dtype="int64"))
+            if created:  # first batch big enough for an approximate kind
+                self.index = self._meet_recall(self.index, np.array(ids, dtype="int64"), xb)
+            self._db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                                 list(zip(ids, [source] * len(texts), labels, texts)))
+            self.lexical.add(ids, texts)
+            if self._tier_changed():
+                self.rebuild()
+            else:
+                self._save()
+        return ids
+
+    def _tier_changed(self) -> bool:
+        """Auto mode only: grow as soon as a tier is crossed; shrink only well below it (no flapping)."""
+        cur = self.index_kind
+        if self.kind != "auto" or cur not in _AUTO_TIERS:
+            return False
+        want = auto_kind(self.ntotal)
+        if want == cur or want == self._failed_tier:
+            return False
+        return _AUTO_TIERS.index(want) > _AUTO_TIERS.index(cur) or auto_kind(2 * self.ntotal) != cur
+
+    def remove_source(self, source: str) -> int:
+        """Drop every chunk of `source`. Returns how many were removed."""
+        import numpy as np
+        with self._lock:
+            ids = [r[0] for r in self._db.execute("SELECT id FROM chunks WHERE source = ?", (source,))]
+            if not ids:
+                return 0
+            self._mutable()
+            self._db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self.lexical.remove(ids)
+            try:
+                if self.index is not None:
+                    self._writable().remove_ids(np.array(ids, dtype="int64"))
+            except RuntimeError:  # HNSW can't delete; rebuild from the remaining chunks
+                self.rebuild()
+            else:
+                if self._tier_changed():  # a big deletion: a smaller kind (and nlist) fits again
+                    self.rebuild()
+                else:
+                    self._save()
+        return len(ids)
+
+    def update_source(self, source: str, texts: List[str], vectors=None,
+                      labels: Optional[List[str]] = None) -> Tuple[int, int]:
+        """Replace the chunks of one source; other sources are untouched. Returns (added, removed)."""
+        with self._lock, self.deferred_save():
+            removed = self.remove_source(source)
+            added = len(self.add_documents(source, texts, vectors, labels))
+        return added, removed
+
+    def _all_vectors(self):
+        """(ids, vectors) of the stored chunks, taken from the index itself (no embedding calls)."""
+        import numpy as np
+        live = np.array([r[0] for r in self._db.execute("SELECT id FROM chunks ORDER BY id")], dtype="int64")
+        if self.index is None or not len(live):
+            return live[:0], None
+        got = stored_vectors(self.index)
+        if got is None:  # legacy IVF-under-IDMap file: re-embed (through the embedding cache) once
+            from tools.rag_store import _embed_texts
+            rows = self._db.execute("SELECT id, text FROM chunks ORDER BY id").fetchall()
+            xb = np.array(_embed_texts([r[1] for r in rows]), dtype="float32") if rows else None
+            return live, xb
+        ids, xb = got
+        keep = np.isin(ids, live)  # e.g. chunks just removed from an HNSW index, which can't delete
+        order = np.argsort(ids[keep], kind="stable")
+        ids, xb = ids[keep][order], np.ascontiguousarray(xb[keep][order], dtype="float32")
+        return (ids, xb) if len(ids) else (ids, None)
+
+    def rebuild(self, kind: Optional[str] = None) -> str:
+        """
+        Re-create the index from the stored chunks, optionally switching kind
+        (flat | ivf | hnsw | ivfpq | auto), and tune it to RAG_MIN_RECALL.
+        Returns the concrete kind built.
+        """
+        import faiss
+        with self._lock:
+            self._mutable()
+            if kind:
+                self.kind = kind
+            ids, xb = self._all_vectors()
+            if xb is None:
+                self.index, self._mmapped, self._dirty = None, False, False
+                if os.path.exists(self.index_path):
+                    os.remove(self.index_path)
+                self._db.commit()
+                return ""
+            faiss.normalize_L2(xb)
+            index = make_index(self.kind, xb.shape[1], xb)
+            index.add_with_ids(xb, ids)
+            self.index, self._mmapped = self._meet_recall(index, ids, xb), False
+            self._save()
+            return self.index_kind
+
+    def _meet_recall(self, index, ids, xb):
+        """Tune a freshly built index to RAG_MIN_RECALL; in auto mode, swap it for a flat one if it can't get there."""
+        built = _kind_of(index)
+        if built == "flat":
+            return index
+        with span("index.tune_recall", kind=built, ntotal=len(ids)) as sp:
+            sp["recall"] = recall = tune_recall(index, ids, xb, min_recall())
+            self._failed_tier = ""
+            if recall < min_recall() and self.kind == "auto":
+                self._failed_tier = built
+                index = make_index("flat", xb.shape[1])
+                index.add_with_ids(xb, ids)
+                sp["fell_back"] = 1
+        return index
+
+    def evaluate_recall(self, k: int = 10, n_queries: int = 200) -> float:
+        """recall@k of the current index against exact search, using stored chunks as queries."""
+        import faiss, numpy as np
+        with self._lock:
+            ids, xb = self._all_vectors()
+            if xb is None:
+                return 1.0
+            faiss.normalize_L2(xb)
+            exact = make_index("flat", xb.shape[1])
+            exact.add_with_ids(xb, ids)
+            rows = np.random.RandomState(1).choice(len(xb), min(n_queries, len(xb)), replace=False)
+            return recall_at_k(self.index, exact, xb[rows], k)
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+        if self.index is not None:
+            set_search_params(self.index, nprobe, ef_search)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mutable()
+            self.index, self._mmapped, self._dirty = None, False, False
+            self._db.execute("DELETE FROM chunks")
+            self.lexical.clear()
+            self._db.commit()
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+
+    def _save(self) -> None:
+        self._db.commit()
+        self._dirty = True
+        if not self._deferred:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the index file if it has unsaved changes (only possible inside deferred_save())."""
+        import faiss
+        with self._lock:
+            if self._dirty and self.index is not None:
+                tmp = self.index_path + ".tmp"
+                faiss.write_index(self.index, tmp)
+                os.replace(tmp, self.index_path)  # atomic; readers keep their old mapping
+            self._dirty = False
+
+    @contextmanager
+    def deferred_save(self) -> Iterator["IndexStore"]:
+        """Batch mutations: the index file is written once when the outermost block exits."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self.flush()
+
+    # ----- queries -----
+    def search(self, xq, k: int = 5) -> List[List[Dict]]:
+        """
+        xq: (n_queries, dim) float32 matrix (normalized in place).
+        Returns one hit list per query row: [{id, path, score, text}].
+        """
+        import faiss, numpy as np
+        xq = np.array(xq, dtype="float32")
+        if self.index is None or self.ntotal == 0:
+            return [[] for _ in range(len(xq))]
+        faiss.normalize_L2(xq)
+        with self._lock, span("index.search", queries=len(xq), k=k, kind=self.index_kind, ntotal=self.ntotal):
+            D, I = self.index.search(xq, k)
+            return self._hits([list(zip(irow, drow)) for drow, irow in zip(D, I)])
+
+    def search_lexical(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
+        """BM25 keyword search; no embedding involved. Same hit format as search() (score = BM25)."""
+        with self._lock, span("index.search_lexical", queries=len(queries), k=k) as sp:
+            if not self._lexical_checked:
+                sp["backfilled"] = self.lexical.backfill()
+                self._db.commit()
+                self._lexical_checked = True
+            return self._hits([self.lexical.search(q, k) for q in queries])
+
+    def _hits(self, ranked: List[List[Tuple[int, float]]]) -> List[List[Dict]]:
+        """[(chunk id, score)] per query -> [{id, path, score, text}], reading metadata in one pass."""
+        wanted = sorted({int(i) for row in ranked for i, _ in row if i >= 0})
+        rows = {}
+        for j in range(0, len(wanted), 500):
+            part = wanted[j:j + 500]
+            rows.update((r[0], r[1:]) for r in self._db.execute(
+                f"SELECT id, label, source, text FROM chunks WHERE id IN ({','.join('?' * len(part))})", part))
+        out = []
+        for row in ranked:
+            hits = []
+            for idx, score in row:
+                m = rows.get(int(idx))
+                if m is None:  # -1 padding, or an id whose metadata was never committed
+                    continue
+                hits.append({"id": m[0], "path": m[1], "score": float(score), "text": m[2]})
+            out.append(hits)
+        return out
@@ -0,0 +1,249 @@
+# tools/ingest.py
+"""
+Streaming ingestion: files -> pages -> chunks -> embedding batches -> index.
+
+Every stage is a generator, so only one page (or one text block) plus one
+embedding batch is held in memory at a time regardless of document size.
+With workers > 1, text extraction and chunking run in a process pool over
+page ranges (PDF) or block ranges (markdown/text), with a bounded number of
+jobs in flight. The index file is written once per source, not per batch.
+
+    python -m tools.ingest notes/ textbook.pdf --index course --workers 4
+"""
+import os, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tools import rag_store
+from tools.dedup import NearDupIndex, dedup_enabled, dedup_stream
+from tools.rag_store import _chunk, dedup_stats, get_store
+
+SUPPORTED = (".pdf", ".md", ".markdown", ".txt")
+PDF_PAGES_PER_JOB = 16
+TEXT_BLOCK_CHARS = 16_000
+TEXT_BLOCKS_PER_JOB = 16
+
+# ----- stages -----
+def iter_files(paths: Iterable[str]) -> Iterator[str]:
+    """
+    Expand files and directories (recursively, sorted) into supported document
+    paths, each file once however many of `paths` reach it.
+    """
+    seen = set()
+    for path in _expand(paths):
+        real = os.path.realpath(path)
+        if real not in seen:
+            seen.add(real)
+            yield path
+
+def _expand(paths: Iterable[str]) -> Iterator[str]:
+    for p in paths:
+        if os.path.isdir(p):
+            for root, dirs, files in os.walk(p):
+                dirs.sort()
+                for f in sorted(files):
+                    if f.lower().endswith(SUPPORTED):
+                        yield os.path.join(root, f)
+        elif p.lower().endswith(SUPPORTED):
+            yield p
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def iter_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_no, text) lazily for pages [start, stop). PDFs yield one page at
+    a time; markdown/text files yield ~16K-char blocks cut at line ends (block
+    n holds the lines starting in its TEXT_BLOCK_CHARS-byte slice of the file,
+    so a range can be read by seeking, without scanning what comes before).
+    """
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+        for i in range(start, stop):
+            yield i + 1, reader.pages[i].extract_text() or ""
+        return
+    with open(path, "rb") as f:
+        pos = start * TEXT_BLOCK_CHARS
+        if pos:
+            f.seek(pos - 1)
+            pos += len(f.readline()) - 1  # skip to the first line starting in this block
+        block, n = [], pos // TEXT_BLOCK_CHARS
+        for line in f:
+            k = pos // TEXT_BLOCK_CHARS
+            if k != n:
+                if block:
+                    yield n + 1, b"".join(block).decode("utf-8", errors="replace").replace("\r\n", "\n")
+                block, n = [], k
+            if stop is not None and k >= stop:
+                return
+            block.append(line)
+            pos += len(line)
+        if block:
+            yield n + 1, b"".join(block).decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+def iter_chunks(pages: Iterable[Tuple[int, str]], source: str) -> Iterator[Tuple[str, str]]:
+    """Chunk each page as it arrives. Yields (label, text)."""
+    for page_no, text in pages:
+        for j, ch in enumerate(_chunk(text)):
+            yield f"{source}#p{page_no}.{j + 1}", ch
+
+def batched(items: Iterable, n: int) -> Iterator[List]:
+    batch = []
+    for x in items:
+        batch.append(x)
+        if len(batch) >= n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ----- parallel extraction -----
+def _jobs(files: Iterable[str], base_dir: Optional[str]) -> Iterator[Tuple[str, str, int, Optional[int]]]:
+    for path in files:
+        source = _source_name(path, base_dir)
+        if path.lower().endswith(".pdf"):
+            n = _pdf_page_count(path)
+            for start in range(0, max(n, 1), PDF_PAGES_PER_JOB):
+                yield path, source, start, start + PDF_PAGES_PER_JOB
+        else:
+            n = -(-os.path.getsize(path) // TEXT_BLOCK_CHARS)
+            for start in range(0, max(n, 1), TEXT_BLOCKS_PER_JOB):
+                yield path, source, start, start + TEXT_BLOCKS_PER_JOB
+
+def _extract_job(job: Tuple[str, str, int, Optional[int]]) -> Tuple[str, int, List[Tuple[str, str]]]:
+    path, source, start, stop = job
+    pages = 0
+    out = []
+    for page in iter_pages(path, start, stop):
+        pages += 1
+        out.extend(iter_chunks([page], source))
+    return source, pages, out
+
+def _bounded_map(pool, fn, jobs: Iterable, window: int) -> Iterator:
+    """Like pool.map, but keeps at most `window` jobs in flight (results in order)."""
+    pending = []
+    for job in jobs:
+        pending.append(pool.submit(fn, job))
+        if len(pending) >= window:
+            yield pending.pop(0).result()
+    for fut in pending:
+        yield fut.result()
+
+def _source_name(path: str, base_dir: Optional[str] = None) -> str:
+    return os.path.relpath(path, base_dir).replace(os.sep, "/")
+
+# ----- pipeline -----
+def ingest_paths(
+    paths: Iterable[str],
+    index_name: str = "",
+    batch_size: int = 64,
+    workers: int = 1,
+    progress: Optional[Callable[[Dict], None]] = None,
+    base_dir: Optional[str] = None,
+) -> Dict:
+    """
+    Ingest documents into the named store (default store if empty). Each file
+    becomes one source, named by its path relative to base_dir (default: cwd),
+    and replaces that source's previous chunks. Chunks that near-duplicate an
+    earlier chunk of the same file are skipped before embedding (RAG_DEDUP).
+    Copies across files are kept, so each source stays complete on its own.
+    progress(stats) is called after every indexed batch with running counters.
+    Returns the final stats dict.
+    """
+    store = get_store(index_name)
+    stats = {"files": 0, "pages": 0, "chunks": 0, "batches": 0,
+             "extract_seconds": 0.0, "index_seconds": 0.0}
+    t0 = time.perf_counter()
+    started = set()
+    dedup = dedup_enabled()
+    near_dups: Dict[str, NearDupIndex] = {}  # only the file being ingested (jobs arrive in file order)
+    dropped: List[Tuple[str, str, str]] = []
+
+    def flush():
+        store.flush()
+        rag_store._REGISTRY.enforce(keep=store.name)  # the writes pulled this index into RAM
+
+    def add(source: str, items: Iterable[Tuple[str, str]]):
+        if source not in started:
+            flush()  # the previous source is complete: one index write for it
+            started.add(source)
+            stats["files"] += 1
+            store.remove_source(source)
+            near_dups.clear()
+        if dedup:
+            items = dedup_stream(items, near_dups.setdefault(source, NearDupIndex()), dropped)
+        for batch in batched(items, batch_size):
+            t = time.perf_counter()
+            store.add_documents(source, [b[1] for b in batch], labels=[b[0] for b in batch])
+            stats["index_seconds"] += time.perf_counter() - t
+            stats["chunks"] += len(batch)
+            stats["batches"] += 1
+            if progress:
+                progress(dict(stats, stage="indexed", source=source))
+
+    with store.deferred_save():  # saved per source by add(), and once more at the end
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                t = time.perf_counter()
+                jobs = _jobs(iter_files(paths), base_dir)
+                for source, pages, chunks in _bounded_map(pool, _extract_job, jobs, workers * 2):
+                    stats["extract_seconds"] += time.perf_counter() - t  # time spent waiting on workers
+                    stats["pages"] += pages
+                    if progress:
+                        progress(dict(stats, stage="extracted", source=source))
+                    add(source, chunks)
+                    t = time.perf_counter()
+        else:
+            for path in iter_files(paths):
+                source = _source_name(path, base_dir)
+                timed = _timed(iter_pages(path), stats)
+                # chunks are pulled lazily from the page generator, one batch at a time
+                add(source, _with_page_progress(iter_chunks(timed, source), stats, progress, source))
+        flush()
+
+    total = time.perf_counter() - t0
+    stats.update(dedup_stats(stats["chunks"] + len(dropped), [t for _, t, _ in dropped], store.dim))
+    stats["extract_seconds"] = round(stats["extract_seconds"], 4)
+    stats["index_seconds"] = round(stats["index_seconds"], 4)
+    stats["total_seconds"] = round(total, 4)
+    stats["chunks_per_sec"] = round(stats["chunks"] / total, 1) if total > 0 else 0.0
+    return stats
+
+def _timed(pages: Iterator[Tuple[int, str]], stats: Dict) -> Iterator[Tuple[int, str]]:
+    while True:
+        t = time.perf_counter()
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        stats["extract_seconds"] += time.perf_counter() - t
+        stats["pages"] += 1
+        yield page
+
+def _with_page_progress(chunks: Iterator, stats: Dict, progress, source: str) -> Iterator:
+    last = stats["pages"]
+    for item in chunks:
+        if progress and stats["pages"] != last:
+            last = stats["pages"]
+            progress(dict(stats, stage="extracted", source=source))
+        yield item
+
+def main():
+    import argparse, json
+    ap = argparse.ArgumentParser(description="Ingest PDF / markdown / text files into the RAG index.")
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("--index", default="", help="index name (default: RAG_INDEX_NAME or 'default')")
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+
+    def show(s):
+        print(f"[{s['stage']}] {s['source']}: files={s['files']} pages={s['pages']} chunks={s['chunks']}", flush=True)
+
+    print(json.dumps(ingest_paths(args.paths, args.index, args.batch_size, args.workers, show), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# tools/plan_table.py
+"""
+Columnar study plans.
+
+A timetable as three parallel arrays, one entry per block, plus a subject
+dictionary:
+
+    day      int32    day of the block (1-based unless the plan starts later)
+    subject  int32    index into `subjects`
+    hours    float64  block length (already rounded to 0.1h)
+    review   bool     spaced-repetition block (constrained scheduler only)
+
+Rows are ordered by day, then by subject order within the day, the same order
+as the {"day", "blocks"} timetable. Converting to pandas or Arrow reuses the
+arrays (subject becomes a categorical / dictionary column over `subjects`),
+and the writers at the bottom stream many plans to one Parquet or NDJSON file
+without holding them all in memory:
+
+    python -m tools.plan_table plans.jsonl -o timetables.parquet   # batch output -> one table
+"""
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+class PlanTable:
+    def __init__(self, days: int, subjects: List[str], day: np.ndarray, subject: np.ndarray,
+                 hours: np.ndarray, review: Optional[np.ndarray] = None, first_day: int = 1):
+        self.days = int(days)
+        self.first_day = int(first_day)
+        self.subjects = list(subjects)
+        self.day = np.asarray(day, dtype=np.int32)
+        self.subject = np.asarray(subject, dtype=np.int32)
+        self.hours = np.asarray(hours, dtype=np.float64)
+        self.review = np.zeros(len(self.day), dtype=bool) if review is None else np.asarray(review, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @classmethod
+    def from_timetable(cls, timetable: List[Dict], subjects: Optional[List[str]] = None) -> "PlanTable":
+        """From the [{"day", "blocks": [{"subject", "hours", "kind"?}]}] form (days in order, gaps allowed)."""
+        codes = {n: i for i, n in enumerate(subjects or [])}
+        day, subject, hours, review = [], [], [], []
+        for d in timetable:
+            for b in d["blocks"]:
+                day.append(d["day"])
+                subject.append(codes.setdefault(b["subject"], len(codes)))
+                hours.append(b["hours"])
+                review.append(b.get("kind") == "review")
+        first = timetable[0]["day"] if timetable else 1
+        days = timetable[-1]["day"] - first + 1 if timetable else 0
+        return cls(days, list(codes), day, subject, hours, review, first_day=first)
+
+    def to_timetable(self) -> List[Dict]:
+        """Back to the [{"day", "blocks"}] form (every day from first_day present, empty days included)."""
+        by_day = {d: [] for d in range(self.first_day, self.first_day + self.days)}
+        for d, s, h, r in zip(self.day.tolist(), self.subject.tolist(), self.hours.tolist(), self.review.tolist()):
+            block = {"subject": self.subjects[s], "hours": h}
+            if r:
+                block["kind"] = "review"
+            by_day.setdefault(d, []).append(block)
+        return [{"day": d, "blocks": by_day[d]} for d in sorted(by_day)]
+
+    def per_subject(self) -> Dict[str, float]:
+        """Study hours per subject (reviews excluded)."""
+        totals = np.bincount(self.subject[~self.review], weights=self.hours[~self.review],
+                             minlength=len(self.subjects))
+        return {n: round(float(h), 1) for n, h in zip(self.subjects, totals)}
+
+    def to_pandas(self):
+        """DataFrame (day, subject: categorical, hours, review) over the same arrays."""
+        import pandas as pd
+        return pd.DataFrame({
+            "day": self.day,
+            "subject": pd.Categorical.from_codes(self.subject, categories=self.subjects),
+            "hours": self.hours,
+            "review": self.review,
+        }, copy=False)
+
+    def to_arrow(self, plan_id: Optional[str] = None):
+        """pyarrow Table (subject as a dictionary column); numeric columns wrap the arrays without copying."""
+        pa = _pyarrow()
+        cols = {
+            "day": pa.array(self.day),
+            "subject": pa.DictionaryArray.from_arrays(pa.array(self.subject), pa.array(self.subjects, pa.string())),
+            "hours": pa.array(self.hours),
+            "review": pa.array(self.review),
+        }
+        if plan_id is not None:
+            cols = {"plan_id": pa.array([plan_id] * len(self), pa.string()), **cols}
+        return pa.table(cols)
+
+    def to_record(self) -> Dict:
+        """Compact JSON-able form: one list per column instead of one object per block."""
+        rec = {"days": self.days, "subjects": self.subjects, "day": self.day.tolist(),
+               "subject": self.subject.tolist(), "hours": self.hours.tolist()}
+        if self.review.any():
+            rec["review"] = self.review.tolist()
+        if self.first_day != 1:
+            rec["first_day"] = self.first_day
+        return rec
+
+    @classmethod
+    def from_record(cls, rec: Dict) -> "PlanTable":
+        return cls(rec["days"], rec["subjects"], rec["day"], rec["subject"], rec["hours"], rec.get("review"),
+                   first_day=rec.get("first_day", 1))
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise RuntimeError("Arrow/Parquet export needs pyarrow (pip install pyarrow).") from e
+    return pa
+
+# ----- bulk export -----
+def write_parquet(plans: Iterable[Tuple[str, PlanTable]], path: str, row_group_rows: int = 1 << 17) -> int:
+    """
+    Stream (plan_id, PlanTable) pairs into one Parquet file with a plan_id
+    column. Plans are buffered only until a row group fills, so memory stays
+    bounded by row_group_rows. Returns the number of rows written.
+    """
+    pa = _pyarrow()
+    import pyarrow.parquet as pq
+    schema = pa.schema([("plan_id", pa.string()), ("day", pa.int32()),
+                        ("subject", pa.dictionary(pa.int32(), pa.string())),
+                        ("hours", pa.float64()), ("review", pa.bool_())])
+    rows, pending, buffered = 0, [], 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        def flush():
+            if pending:
+                # subject dictionaries differ per plan; unify them into one per row group
+                writer.write_table(pa.concat_tables(pending).unify_dictionaries().combine_chunks(),
+                                   row_group_size=row_group_rows)
+                pending.clear()
+
+        for plan_id, plan in plans:
+            pending.append(plan.to_arrow(str(plan_id)))
+            buffered += len(plan)
+            rows += len(plan)
+            if buffered >= row_group_rows:
+                flush()
+                buffered = 0
+        flush()
+    return rows
+
+def write_ndjson(plans: Iterable[Tuple[str, PlanTable]], path: str) -> int:
+    """Stream (plan_id, PlanTable) pairs as one columnar JSON line per plan. Returns plans written."""
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for plan_id, plan in plans:
+            f.write(json.dumps({"id": plan_id, **plan.to_record()}, separators=(",", ":")) + "\n")
+            n += 1
+    return n
+
+def read_batch_output(path: str) -> Iterable[Tuple[str, PlanTable]]:
+    """(id, PlanTable) for each "ok" record of an agents.batch output file, read lazily."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:  # torn last line from a crash
+                continue
+            state = rec.get("state") or {}
+            if rec.get("status") != "ok":
+                continue
+            if "plan" in state:
+                yield rec["id"], PlanTable.from_record(state["plan"])
+            elif "timetable" in state:  # written before plans carried their columnar form
+                names = [s["name"] for s in state.get("subjects_enriched", [])]
+                yield rec["id"], PlanTable.from_timetable(state["timetable"], names)
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Export the timetables of an agents.batch output file.")
+    ap.add_argument("input", help="JSONL written by python -m agents.batch")
+    ap.add_argument("-o", "--output", required=True, help="*.parquet or *.ndjson / *.jsonl")
+    args = ap.parse_args()
+    plans = read_batch_output(args.input)
+    if args.output.endswith(".parquet"):
+        print(f"{write_parquet(plans, args.output)} rows -> {args.output}")
+    else:
+        print(f"{write_ndjson(plans, args.output)} plans -> {args.output}")
+
+if __name__ == "__main__":
+    main()
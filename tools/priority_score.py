@@ -6,6 +6,7 @@ def build_priorities(subjects: List[Dict], days_left: int) -> Dict:
     subjects: [{"name": "Math", "difficulty": 1..5, "target_hours": optional}, ...]
     Estimate required_hours (target_hours or difficulty*4),
     compute priority score (difficulty * urgency), and normalized weight.
+    Scheduling constraints (exam_day, max_hours_per_day) are passed through.
     """
     prepared = []
     for s in subjects:
@@ -23,6 +24,7 @@ def build_priorities(subjects: List[Dict], days_left: int) -> Dict:
             "difficulty": diff,
             "required_hours": round(req, 1),
             "score": round(score, 3),
+            **{k: s[k] for k in ("exam_day", "max_hours_per_day") if s.get(k)},
         })
 
     total_score = sum(x["score"] for x in prepared) or 1.0
@@ -0,0 +1,106 @@
+# tools/prompt_compact.py
+import math, os
+from typing import Dict, List, Optional, Tuple
+
+CHARS_PER_TOKEN = 4.0  # same rule of thumb the chunker uses for token budgets
+
+def approx_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _h(x) -> str:
+    return f"{float(x):g}"
+
+def encode_subjects(subjects: List[Dict]) -> str:
+    """One `name | difficulty | required_hours | weight` row per subject."""
+    rows = [f"{s.get('name')} | {s.get('difficulty', '')} | {_h(s.get('required_hours', 0))}h | {float(s.get('weight', 0)):.3f}"
+            for s in subjects]
+    return "\n".join(rows) if rows else "none"
+
+def subject_totals(timetable: List[Dict]) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for day in timetable:
+        for b in day["blocks"]:
+            totals[b["subject"]] = totals.get(b["subject"], 0.0) + b["hours"]
+    return {k: round(v, 1) for k, v in totals.items()}
+
+def encode_timetable(timetable: List[Dict], runs: bool = True) -> str:
+    """
+    Per-subject totals, then (if runs) consecutive identical days collapsed into
+    one line: `D1-12: Math 2, Bio 1`. A 60-day plan is usually 2-4 lines.
+    """
+    totals = subject_totals(timetable)
+    lines = [f"{len(timetable)} days; totals: " + (", ".join(f"{k} {_h(v)}h" for k, v in totals.items()) or "none")]
+    if runs:
+        prev, first, last = None, None, None
+        for day in timetable:
+            sig = tuple((b["subject"], b["hours"]) for b in day["blocks"])
+            if sig == prev and day["day"] == last + 1:
+                last = day["day"]
+                continue
+            if prev is not None:
+                lines.append(_run_line(first, last, prev))
+            prev, first, last = sig, day["day"], day["day"]
+        if prev is not None:
+            lines.append(_run_line(first, last, prev))
+    return "\n".join(lines)
+
+def _run_line(first: int, last: int, sig: Tuple) -> str:
+    span = f"D{first}" if first == last else f"D{first}-{last}"
+    return f"{span}: " + (", ".join(f"{s} {_h(h)}" for s, h in sig) or "free")
+
+def rank_contexts(contexts: Dict[str, List[Dict]]) -> List[Dict]:
+    """
+    Dedupe chunks by id across subjects (keeping each chunk's best key) and
+    order them by relevance. Chunks with a retrieval score sort by it, best
+    first, ties broken by rank within the subject's hits; chunks without one
+    follow, by rank, so there every subject's top chunk precedes anyone's second.
+    """
+    best: Dict[str, Dict] = {}
+    for subj, chunks in contexts.items():
+        for rank, ch in enumerate(chunks):
+            key = (0, -float(ch["score"]), rank) if "score" in ch else (1, rank, 0.0)
+            cur = best.get(ch["id"])
+            if cur is None or key < cur["_key"]:
+                best[ch["id"]] = {**ch, "_key": key}
+    return sorted(best.values(), key=lambda c: c["_key"])
+
+def encode_contexts(ranked: List[Dict], budget_tokens: int, max_chars: int = 450) -> Tuple[str, int]:
+    """Greedily pack ranked chunks into budget_tokens. Returns (block, chunks kept)."""
+    lines, used = [], 0
+    for ch in ranked:
+        text = " ".join(ch["text"].split())[:max_chars]
+        line = f"[{ch['id']}] ({ch['path']}) {text}"
+        cost = approx_tokens(line) + 1
+        if used + cost > budget_tokens:
+            continue  # a shorter, lower-ranked chunk may still fit
+        lines.append(line)
+        used += cost
+    return ("\n".join(lines) if lines else "NO_CONTEXT"), len(lines)
+
+def prompt_budget() -> int:
+    """Token budget for the tips user prompt (TIPS_PROMPT_TOKENS, default 2000)."""
+    return int(os.getenv("TIPS_PROMPT_TOKENS", "2000"))
+
+def compact_sections(
+    subjects: List[Dict],
+    timetable: List[Dict],
+    contexts: Optional[Dict[str, List[Dict]]],
+    fixed_tokens: int,
+    budget_tokens: Optional[int] = None,
+) -> Tuple[str, str, str, Dict]:
+    """
+    Encode the variable parts of the tips prompt within budget_tokens, given
+    fixed_tokens already spent on the template. The timetable keeps its day
+    runs only if they fit; contexts get whatever budget is left.
+    Returns (subjects_block, timetable_block, context_block, info).
+    """
+    budget = prompt_budget() if budget_tokens is None else budget_tokens
+    subj = encode_subjects(subjects)
+    left = budget - fixed_tokens - approx_tokens(subj)
+    table = encode_timetable(timetable)
+    if approx_tokens(table) > left // 2:
+        table = encode_timetable(timetable, runs=False)
+    left -= approx_tokens(table)
+    ranked = rank_contexts(contexts or {})
+    ctx, kept = encode_contexts(ranked, max(left, 0))
+    return subj, table, ctx, {"context_chunks": len(ranked), "context_chunks_kept": kept}
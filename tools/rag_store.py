@@ -1,74 +1,268 @@
 # tools/rag_store.py
-import os
-from typing import List, Dict, Tuple
-
-# ephemeral index stored in memory for the current Streamlit session
-_EPHEMERAL = {"index": None, "meta": []}
-
-def _embed_texts(texts: List[str]) -> List[List[float]]:
-    import google.generativeai as genai
-    api = os.getenv("GOOGLE_API_KEY")
-    if not api:
-        raise RuntimeError("GOOGLE_API_KEY not set for embeddings.")
-    genai.configure(api_key=api)
-    model = os.getenv("EMBED_MODEL", "text-embedding-004")
-    out = []
-    for t in texts:
-        emb = genai.embed_content(model=model, content=t)
-        out.append(emb["embedding"])
-    return out
+import contextvars, os, re, time, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Tuple
+
+from tools.chunker import chunk_text
+from tools.dedup import NearDupIndex, dedup_enabled, dedup_hits, dedup_stream
+from tools.index_registry import IndexRegistry
+from tools.index_store import IndexStore
+from utils.telemetry import span
+
+# named on-disk stores opened in this process, LRU-evicted under a RAM budget (see tools.index_registry)
+_REGISTRY = IndexRegistry()
+# tenant (e.g. a Streamlit session) whose private index get_store() resolves to
+_TENANT: contextvars.ContextVar = contextvars.ContextVar("rag_tenant", default="")
+_LAST_BUILD: Dict = {}
+# query-embedding memo: (embed model, query) -> vector; retrieve queries repeat per subject name
+_QUERY_MEMO: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+_QUERY_MEMO_MAX = 2048
+# graph branches search from several threads at once
+_LOCK = threading.Lock()
+
+def tenant_index_name(tenant: str) -> str:
+    return "tenants/" + re.sub(r"[^A-Za-z0-9_-]", "_", tenant)[:64]
+
+@contextmanager
+def tenant_scope(tenant: str) -> Iterator[None]:
+    """
+    Route get_store()/search/build calls in this context (and graph nodes it
+    runs) to the tenant's own index, so sessions can't overwrite each other's notes.
+    """
+    token = _TENANT.set(tenant)
+    try:
+        yield
+    finally:
+        _TENANT.reset(token)
+
+def get_store(name: str = "") -> IndexStore:
+    """
+    The named index, opened on demand through the process registry. Defaults to
+    the current tenant's index, else RAG_INDEX_NAME or 'default'.
+    """
+    if not name:
+        tenant = _TENANT.get()
+        name = tenant_index_name(tenant) if tenant else os.getenv("RAG_INDEX_NAME", "default")
+    return _REGISTRY.get(name)
+
+def shared_stores() -> List[IndexStore]:
+    """Read-only corpora (RAG_SHARED_INDEXES) searched alongside every tenant's own index."""
+    return [_REGISTRY.shared(n) for n in _REGISTRY.shared_names()]
+
+def _embed_texts(texts: List[str]):
+    """
+    Embed texts with the configured backend (see tools.embeddings.get_embedder),
+    going through the on-disk embedding cache when enabled.
+    Returns a float32 matrix, one row per text, in input order.
+    """
+    from tools.embeddings import get_embedder
+    from tools.embed_cache import get_embed_cache
+    embedder, cache = get_embedder(), get_embed_cache()
+    with span("embed", texts=len(texts), chars=sum(len(t) for t in texts), model=embedder.model) as sp:
+        if cache is None:
+            return embedder.embed(texts)
+        hits0, misses0 = cache.hits, cache.misses
+        out = cache.embed(embedder, texts)
+        sp["cache_hits"], sp["cache_misses"] = cache.hits - hits0, cache.misses - misses0
+        return out
+
+def _cache_counts() -> Tuple[int, int]:
+    from tools.embed_cache import get_embed_cache
+    cache = get_embed_cache()
+    return (cache.hits, cache.misses) if cache is not None else (0, 0)
 
 def _chunk(text: str, max_chars=900, overlap=120) -> List[str]:
-    text = " ".join(text.split())
-    chunks, i = [], 0
-    while i < len(text):
-        chunks.append(text[i:i+max_chars])
-        i += max_chars - overlap
-    return [c for c in chunks if c.strip()]
+    """Sentence-aware chunks of <= max_chars with ~overlap chars shared (see tools.chunker)."""
+    return chunk_text(text, max_chars=max_chars, overlap=overlap)
+
+def dedup_stats(chunks_in: int, dropped_texts: List[str], dim: int = 0) -> Dict:
+    """Dedup ratio, embeddings / embedding requests saved and index bytes saved (flat vectors + text)."""
+    bs = max(1, int(os.getenv("EMBED_BATCH_SIZE", "100")))
+    n, kept = chunks_in, chunks_in - len(dropped_texts)
+    return {
+        "duplicates": len(dropped_texts),
+        "dedup_ratio": round(len(dropped_texts) / n, 4) if n else 0.0,
+        "embeddings_saved": len(dropped_texts),
+        "embed_requests_saved": -(-n // bs) - -(-kept // bs),
+        "index_bytes_saved": len(dropped_texts) * dim * 4 + sum(len(t.encode("utf-8")) for t in dropped_texts),
+    }
 
 def build_ephemeral_index(snippets: List[str], source_name: str = "Pasted") -> Tuple[int, int]:
     """
-    Build an in-memory FAISS index from pasted notes.
+    (Re)index pasted notes as one source of the persistent store.
+    Only this source's chunks are replaced; other sources keep their vectors.
+    Near-duplicate chunks (overlapping pastes) are dropped before embedding
+    (RAG_DEDUP, see tools.dedup).
     snippets: list of long strings (you can paste a whole page per item).
-    Returns (num_chunks, dim).
+    Returns (num_chunks, dim) for the chunks actually indexed.
     """
-    import faiss, numpy as np
-    texts, meta = [], []
-    for i, s in enumerate(snippets):
-        for j, ch in enumerate(_chunk(s)):
-            texts.append(ch)
-            meta.append({"id": f"{source_name}#{i+1}.{j+1}", "path": source_name, "text": ch})
+    t0 = time.perf_counter()
+    items = [(f"{source_name}#{i+1}.{j+1}", ch) for i, s in enumerate(snippets) for j, ch in enumerate(_chunk(s))]
+    dropped: List[Tuple[str, str, str]] = []
+    if dedup_enabled():
+        with span("dedup", chunks=len(items)) as sp:
+            kept = list(dedup_stream(items, NearDupIndex(), dropped))
+            sp["duplicates"] = len(dropped)
+    else:
+        kept = items
+    labels = [label for label, _ in kept]
+    texts = [text for _, text in kept]
 
+    store = get_store()
     if not texts:
-        _EPHEMERAL["index"], _EPHEMERAL["meta"] = None, []
+        store.remove_source(source_name)
+        _LAST_BUILD.clear()
         return 0, 0
 
+    t_embed = time.perf_counter()
+    hits0, misses0 = _cache_counts()
     vecs = _embed_texts(texts)
-    xb = np.array(vecs, dtype="float32")
-    faiss.normalize_L2(xb)
-    index = faiss.IndexFlatIP(xb.shape[1])
-    index.add(xb)
+    hits1, misses1 = _cache_counts()
+    embed_s = time.perf_counter() - t_embed
+    store.update_source(source_name, texts, vecs, labels)
+    _REGISTRY.enforce(keep=store.name)  # the write pulled this index into RAM
+
+    total_s = time.perf_counter() - t0
+    _LAST_BUILD.clear()
+    _LAST_BUILD.update({
+        "chunks": len(texts),
+        **dedup_stats(len(items), [t for _, t, _ in dropped], store.dim),
+        "embed_seconds": round(embed_s, 4),
+        "total_seconds": round(total_s, 4),
+        "chunks_per_sec": round(len(texts) / total_s, 1) if total_s > 0 else float(len(texts)),
+        "cache_hits": hits1 - hits0,
+        "cache_misses": misses1 - misses0,
+    })
+    return len(texts), store.dim
 
-    _EPHEMERAL["index"] = index
-    _EPHEMERAL["meta"] = meta
-    return len(meta), xb.shape[1]
+def last_build_stats() -> Dict:
+    """Throughput of the most recent build_ephemeral_index call ({} if none)."""
+    return dict(_LAST_BUILD)
 
-def search(query: str, k: int = 5) -> List[Dict]:
+def index_info() -> Dict:
+    """Size of the persistent index, e.g. for showing what was loaded at startup."""
+    store = get_store()
+    return {"name": store.name, "chunks": store.ntotal, "dim": store.dim, "sources": store.sources(),
+            "shared": {s.name: s.ntotal for s in shared_stores()}}
+
+def _embed_queries(queries: List[str]):
+    """Embed queries in one batch, reusing memoized vectors for repeated query strings."""
+    import numpy as np
+    from tools.embeddings import get_embedder
+    model = get_embedder().model
+    vecs = {}
+    with _LOCK:  # take the memoized vectors themselves, so a concurrent eviction can't lose them
+        for q in dict.fromkeys(queries):
+            v = _QUERY_MEMO.get((model, q))
+            if v is not None:
+                _QUERY_MEMO.move_to_end((model, q))
+                vecs[q] = v
+    missing = [q for q in dict.fromkeys(queries) if q not in vecs]
+    if missing:
+        fresh = _embed_texts(missing)  # network call: never under the process-wide lock
+        with _LOCK:
+            for q, v in zip(missing, fresh):
+                vecs[q] = _QUERY_MEMO[(model, q)] = np.asarray(v, dtype="float32")
+            while len(_QUERY_MEMO) > _QUERY_MEMO_MAX:
+                _QUERY_MEMO.popitem(last=False)
+    return np.vstack([vecs[q] for q in queries])
+
+def prefetch_queries(queries: List[str], mode: str = "") -> int:
+    """
+    Embed queries in one call ahead of searching them separately (e.g. one graph
+    branch per subject), so each search finds its vector memoized. Skipped when
+    the mode needs no vectors or there is nothing to search. Best effort: a
+    failure is left to the searches, which handle it per mode. Returns how many
+    queries were embedded.
+    """
+    if not queries or search_mode(mode) == "lexical" or not any(s.ntotal for s in [get_store(), *shared_stores()]):
+        return 0
+    with span("search.prefetch", queries=len(queries)) as sp:
+        try:
+            _embed_queries(queries)
+        except Exception as e:
+            sp["error"] = type(e).__name__
+            return 0
+    return len(queries)
+
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+RRF_K = 60  # reciprocal-rank fusion damping (Cormack et al.); higher flattens rank differences
+
+def search_mode(mode: str = "") -> str:
+    """Resolve a search mode, defaulting to RAG_SEARCH_MODE (hybrid)."""
+    mode = (mode or os.getenv("RAG_SEARCH_MODE", "hybrid")).lower()
+    if mode not in SEARCH_MODES:
+        raise RuntimeError(f"Unknown search mode: {mode!r} (use one of {SEARCH_MODES}).")
+    return mode
+
+def rrf_fuse(rankings: List[List[Dict]], k: int, rrf_k: int = RRF_K, key=lambda h: h["id"]) -> List[Dict]:
     """
-    Search the ephemeral index. If it's empty, returns [].
+    Reciprocal-rank fusion: each hit scores sum(1 / (rrf_k + rank)) over the
+    rankings it appears in. Raw scores (cosine vs BM25) are never compared.
+    key identifies the same hit across rankings (default: its chunk label).
     """
-    import faiss, numpy as np
-    if _EPHEMERAL["index"] is None:
+    fused: Dict = {}
+    for hits in rankings:
+        for rank, h in enumerate(hits, 1):
+            cur = fused.setdefault(key(h), {**h, "score": 0.0})
+            cur["score"] += 1.0 / (rrf_k + rank)
+    return sorted(fused.values(), key=lambda h: -h["score"])[:k]
+
+def search_many(queries: List[str], k: int = 5, mode: str = "") -> List[List[Dict]]:
+    """
+    Search the current index, plus any shared corpora, for several queries at once.
+      vector   one embedding call for the unseen queries, one FAISS search over the stacked matrix
+      lexical  BM25 over the local inverted index; no embedding call at all
+      hybrid   both, merged with reciprocal-rank fusion; falls back to lexical
+               if the embedding backend fails
+    mode defaults to RAG_SEARCH_MODE. Returns one hit list per query
+    (all [] if the index is empty).
+    """
+    mode = search_mode(mode)
+    if not queries:
         return []
-    qv = _embed_texts([query])[0]
-    xq = np.array([qv], dtype="float32")
-    faiss.normalize_L2(xq)
-    D, I = _EPHEMERAL["index"].search(xq, k)
-    meta = _EPHEMERAL["meta"]
-    out = []
-    for idx, score in zip(I[0], D[0]):
-        if int(idx) < 0:
-            continue
-        m = meta[int(idx)]
-        out.append({"id": m["id"], "path": m["path"], "score": float(score), "text": m["text"]})
-    return out
+    stores = [s for s in [get_store(), *shared_stores()] if s.ntotal]
+    if not dedup_enabled():
+        return _search_stores(stores, queries, k, mode)
+    # duplicates are the exception, so fetch k first; only when a list came up short
+    # although more hits exist, fetch deeper (2k, 4k, up to 8k) to replace the dropped ones
+    depth = k
+    while True:
+        results = _search_stores(stores, queries, depth, mode)
+        with span("search.dedup", hits=sum(len(r) for r in results)) as sp:
+            dropped: List[Dict] = []
+            out = [dedup_hits(hits, k, dropped=dropped) for hits in results]
+            sp["duplicates"] = len(dropped)
+        if depth >= 8 * k or all(len(o) == k or len(r) < depth for o, r in zip(out, results)):
+            return out
+        depth *= 2
+
+def _search_stores(stores: List[IndexStore], queries: List[str], k: int, mode: str) -> List[List[Dict]]:
+    if len(stores) <= 1:
+        return _search_store(stores[0], queries, k, mode) if stores else [[] for _ in queries]
+    # own notes + shared corpora: fuse by rank, since scores aren't comparable across
+    # stores (BM25 IDF and document lengths are per index, RRF scores per fusion).
+    # Labels can repeat across stores, but each hit object is in exactly one ranking.
+    per_store = [_search_store(s, queries, k, mode) for s in stores]
+    return [rrf_fuse([res[i] for res in per_store], k, key=id) for i in range(len(queries))]
+
+def _search_store(store: IndexStore, queries: List[str], k: int, mode: str) -> List[List[Dict]]:
+    if mode == "lexical":
+        return store.search_lexical(queries, k)
+    if mode == "vector":
+        return store.search(_embed_queries(queries), k)
+    depth = max(4 * k, 20)  # fuse deeper lists than we return, so each side can vote
+    lexical = store.search_lexical(queries, depth)
+    try:
+        dense = store.search(_embed_queries(queries), depth)
+    except Exception as e:
+        with span("search.fallback", reason=type(e).__name__):
+            return [hits[:k] for hits in lexical]
+    return [rrf_fuse([d, l], k) for d, l in zip(dense, lexical)]
+
+def search(query: str, k: int = 5, mode: str = "") -> List[Dict]:
+    """
+    Search the persistent index (see search_many for modes). If it's empty, returns [].
+    """
+    return search_many([query], k, mode)[0]
@@ -0,0 +1,179 @@
+# tools/scheduler.py
+import heapq
+from typing import Dict, List, Optional
+
+from tools.allocate_time import allocate_time_vectorized
+
+EPS = 1e-9
+REVIEW_INTERVALS = (1, 3, 7, 14, 30)  # days after a subject's first study block
+
+def has_constraints(subjects: List[Dict], availability: Optional[List[float]] = None,
+                    review: Optional[Dict] = None) -> bool:
+    return bool(availability) or bool(review) or any(
+        s.get("exam_day") or s.get("max_hours_per_day") for s in subjects)
+
+def schedule(
+    subjects: List[Dict],
+    days_left: int,
+    hours_per_day: float,
+    availability: Optional[List[float]] = None,
+    review: Optional[Dict] = None,
+    block_hours: float = 0.5,
+    started: Optional[Dict[str, int]] = None,
+) -> Dict:
+    """
+    Constrained scheduler. Same output schema as allocate_time, plus "unmet_hours".
+
+    subjects: enriched subjects (name, weight, required_hours), optionally with
+      exam_day           studied only on days before it (1-based); hours not fitting are unmet
+      max_hours_per_day  cap on this subject's study + review hours per day
+    availability: hours per day (len == days_left), instead of a flat hours_per_day.
+    review: spaced repetition, e.g. {"hours": 0.5, "intervals": [1, 3, 7, 14]}: after a
+      subject's first study day, review blocks ({"kind": "review"}) are due at those
+      offsets (before its exam). Reviews go first in a day and don't count toward
+      required_hours; one that doesn't fit is carried to the next day.
+    started: subjects first studied before this window (replanning), name -> that
+      day relative to day 1 (so <= 0); their reviews still due fall in the window.
+
+    Each day, subjects that can no longer finish with the capacity left after
+    today get that shortfall first, earliest exam first. They come off a heap
+    keyed on the day each subject turns tight (found by bisection over the
+    capacity prefix sums); a key made stale by study in the meantime is only
+    pushed back when it comes up, so slack subjects cost nothing per day. The
+    rest of the day is handed out in block_hours slices by stride scheduling: a
+    heap keyed on each subject's virtual finish time,
+    served / (weight * D / exam_day), so subjects share each day in proportion
+    to weight, and one whose exam is sooner gets a proportionally larger share.
+    Only the subjects served change key, so a day costs O(blocks * log S) plus
+    O(log S + log D) per subject whose deadline key comes up. Without any
+    constraint this is allocate_time_vectorized.
+    """
+    if not has_constraints(subjects, availability, review):
+        return {**allocate_time_vectorized(subjects, days_left, hours_per_day), "unmet_hours": {}}
+
+    D = max(0, int(days_left))
+    caps = [float(h) for h in availability] if availability else [float(hours_per_day)] * D
+    if len(caps) != D:
+        raise RuntimeError(f"availability has {len(caps)} days but days_left={D}.")
+
+    # same name semantics as allocate_time: first occurrence fixes the order, last one the values
+    subs = {s["name"]: s for s in subjects}
+    names = list(subs)
+    remaining = {n: float(subs[n]["required_hours"]) for n in names}
+    exam = {n: min(int(subs[n].get("exam_day") or D + 1), D + 1) for n in names}
+    daily_cap = {n: float(subs[n].get("max_hours_per_day") or float("inf")) for n in names}
+    share = {n: float(subs[n]["weight"]) * D / max(1, exam[n] - 1) for n in names}
+    served = dict.fromkeys(names, 0.0)
+    prefix = [0.0]  # prefix[d] = hours available on days 1..d
+    for c in caps:
+        prefix.append(prefix[-1] + c)
+
+    def capacity_after(n: str, d: int) -> float:
+        """Study hours subject n can still get after day d, before its exam."""
+        days = exam[n] - 1 - d
+        return min(prefix[exam[n] - 1] - prefix[d], daily_cap[n] * days) if days > 0 else 0.0
+
+    def tight_day(n: str, d: int) -> int:
+        """First day >= d on which n can't finish without studying that day (capacity_after only shrinks)."""
+        lo, hi = d, exam[n] - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if remaining[n] - capacity_after(n, mid) > EPS:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    heap = [(0.0, i, n) for i, n in enumerate(names) if remaining[n] > EPS and share[n] > 0 and exam[n] > 1]
+    heapq.heapify(heap)
+    deadlines = [(tight_day(n, 1), exam[n], i, n) for _, i, n in heap]  # (tight day, exam, order, subject)
+    heapq.heapify(deadlines)
+    review = review or {}
+    review_h = float(review.get("hours", 0.5))
+    intervals = tuple(review.get("intervals", REVIEW_INTERVALS)) if review else ()
+    reviews: List = []  # (due day, order, subject)
+    first_day = started or {}
+    started = set()
+    for i, n in enumerate(names):
+        if n in first_day:
+            started.add(n)
+            for k, gap in enumerate(intervals):
+                if first_day[n] + gap >= 1:
+                    heapq.heappush(reviews, (first_day[n] + gap, k * len(names) + i, n))
+
+    timetable = []
+    for d in range(1, D + 1):
+        left = caps[d - 1]
+        today: Dict[str, float] = {}
+        review_today: Dict[str, float] = {}
+
+        # due reviews first (short, and the point of spacing is doing them on time)
+        carried = []
+        while reviews and reviews[0][0] <= d:
+            due, order, n = heapq.heappop(reviews)
+            if d >= exam[n]:
+                continue
+            if left + EPS >= review_h and review_today.get(n, 0.0) + review_h <= daily_cap[n] + EPS:
+                review_today[n] = review_today.get(n, 0.0) + review_h
+                left -= review_h
+            else:
+                carried.append((d + 1, order, n))
+        for r in carried:
+            heapq.heappush(reviews, r)
+
+        def serve(n: str, i: int, hours: float) -> None:
+            nonlocal left
+            today[n] = today.get(n, 0.0) + hours
+            remaining[n] -= hours
+            served[n] += hours
+            left -= hours
+            if n not in started:
+                started.add(n)
+                for k, gap in enumerate(intervals):
+                    heapq.heappush(reviews, (d + gap, k * len(names) + i, n))
+
+        def room(n: str) -> float:
+            return daily_cap[n] - today.get(n, 0.0) - review_today.get(n, 0.0)
+
+        # deadline pass: subjects whose key says they're tight today, earliest exam first. Keys
+        # only get later as a subject is studied, so a popped one may just be re-keyed.
+        due = []
+        while deadlines and deadlines[0][0] <= d:
+            _, ex, i, n = heapq.heappop(deadlines)
+            if remaining[n] > EPS and d < ex:  # finished or exam passed: drop
+                due.append((ex, i, n))
+        for ex, i, n in sorted(due):
+            if left > EPS:
+                need = min(remaining[n] - capacity_after(n, d), left, room(n))
+                if need > EPS:
+                    serve(n, i, need)
+            if remaining[n] > EPS and d + 1 < ex:
+                heapq.heappush(deadlines, (tight_day(n, d + 1), ex, i, n))
+
+        parked = []  # hit today's per-subject cap; back in the queue tomorrow
+        while left > EPS and heap:
+            key, i, n = heapq.heappop(heap)
+            if d >= exam[n] or remaining[n] <= EPS:
+                continue  # exam passed (whatever is left is unmet) or finished in the deadline pass
+            if key < served[n] / share[n] - EPS:  # served in the deadline pass; requeue at its real key
+                heapq.heappush(heap, (served[n] / share[n], i, n))
+                continue
+            if room(n) <= EPS:
+                parked.append((key, i, n))
+                continue
+            serve(n, i, min(block_hours, remaining[n], left, room(n)))
+            if remaining[n] > EPS:
+                heapq.heappush(heap, (served[n] / share[n], i, n))
+        for p in parked:
+            heapq.heappush(heap, p)
+
+        blocks = [{"subject": n, "hours": round(h, 1)} for n, h in today.items() if round(h, 1) > 0]
+        blocks += [{"subject": n, "hours": round(h, 1), "kind": "review"} for n, h in review_today.items()]
+        timetable.append({"day": d, "blocks": blocks})
+
+    return {
+        "timetable": timetable,
+        "per_subject_allocation": {n: round(served[n], 1) for n in names},
+        "total_available_hours": round(sum(caps), 1),
+        "unmet_hours": {n: round(remaining[n], 1) for n in names if remaining[n] > 0.05},
+    }
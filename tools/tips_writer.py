@@ -1,39 +1,22 @@
 # tools/tips_writer.py
-from typing import List, Dict, Optional
-from utils.llm_client import gemini_json
+from typing import Any, List, Dict, Iterator, Optional, Tuple
+from tools.prompt_compact import approx_tokens, compact_sections
+from utils.llm_client import gemini_json, gemini_json_async, gemini_json_stream
 
-def write_tips(
-    subjects: List[Dict],
-    timetable: List[Dict],
-    overbooked: bool,
-    hours_gap: float,
-    contexts: Optional[Dict[str, List[Dict]]] = None,  # <-- new optional arg
-) -> Dict:
-    """
-    contexts: {subject: [{id, path, text}, ...]} from the RAG retrieve step.
-    Returns strict-JSON tips with optional citations + RAG suggestions.
-    """
-    contexts = contexts or {}
-    # compact, cite-able context block
-    ctx_lines = []
-    for subj, chunks in contexts.items():
-        for ch in chunks:
-            ctx_lines.append(f"[{ch['id']}] ({ch['path']}) {ch['text'][:450]}")
-    ctx_block = "\n".join(ctx_lines) if ctx_lines else "NO_CONTEXT"
-
-    system = "You are a precise study coach. Always return strict JSON only."
-    user = f"""
-Subjects (name, difficulty, required_hours, weight):
+_SYSTEM = "You are a precise study coach. Always return strict JSON only."
+
+_TEMPLATE = """
+Subjects (name | difficulty | required_hours | weight):
 {subjects}
 
-Timetable (per day → blocks of subject+hours):
+Timetable (totals, then runs of identical days → subject hours):
 {timetable}
 
 Overbooked: {overbooked}
 Hours_gap: {hours_gap}
 
 Context passages (use to ground advice; cite as [chunk_id]):
-{ctx_block}
+{contexts}
 
 Return JSON exactly in this schema:
 {{
@@ -51,4 +34,81 @@ Return JSON exactly in this schema:
 Include "if_overbooked" only when Overbooked is true.
 If NO_CONTEXT, leave rag_suggestions empty and citations [].
 """
-    return gemini_json(system, user)
+
+def _verbose_prompt(subjects, timetable, overbooked, hours_gap, contexts) -> str:
+    """The original encoding (raw reprs, every day, every chunk); only used by prompt_stats."""
+    ctx_lines = [f"[{ch['id']}] ({ch['path']}) {ch['text'][:450]}"
+                 for chunks in (contexts or {}).values() for ch in chunks]
+    return _TEMPLATE.format(subjects=subjects, timetable=timetable, overbooked=overbooked,
+                            hours_gap=hours_gap, contexts="\n".join(ctx_lines) or "NO_CONTEXT")
+
+def _compact_prompt(subjects, timetable, overbooked, hours_gap, contexts) -> Tuple[str, Dict]:
+    fixed = approx_tokens(_TEMPLATE.format(subjects="", timetable="", overbooked=overbooked,
+                                           hours_gap=hours_gap, contexts=""))
+    subj, table, ctx, info = compact_sections(subjects, timetable, contexts, fixed)
+    user = _TEMPLATE.format(subjects=subj, timetable=table, overbooked=overbooked,
+                            hours_gap=round(hours_gap, 1), contexts=ctx)
+    return user, info
+
+def _tips_prompt(
+    subjects: List[Dict],
+    timetable: List[Dict],
+    overbooked: bool,
+    hours_gap: float,
+    contexts: Optional[Dict[str, List[Dict]]] = None,
+) -> Tuple[str, str]:
+    """
+    Compact prompt: subject table, timetable totals + run-length-encoded days,
+    and context chunks deduped by id and packed by relevance into the
+    TIPS_PROMPT_TOKENS budget.
+    """
+    return _SYSTEM, _compact_prompt(subjects, timetable, overbooked, hours_gap, contexts)[0]
+
+def prompt_stats(
+    subjects: List[Dict],
+    timetable: List[Dict],
+    overbooked: bool,
+    hours_gap: float,
+    contexts: Optional[Dict[str, List[Dict]]] = None,
+) -> Dict:
+    """
+    Approximate token counts of the tips prompt for these inputs, before and
+    after compaction, plus how many context chunks were kept. Rebuilds the
+    uncompacted prompt, so it is meant for explain mode, not the request path.
+    """
+    user, info = _compact_prompt(subjects, timetable, overbooked, hours_gap, contexts)
+    return {**info, "tokens_after": approx_tokens(user),
+            "tokens_before": approx_tokens(_verbose_prompt(subjects, timetable, overbooked, hours_gap, contexts))}
+
+def write_tips(
+    subjects: List[Dict],
+    timetable: List[Dict],
+    overbooked: bool,
+    hours_gap: float,
+    contexts: Optional[Dict[str, List[Dict]]] = None,  # <-- new optional arg
+) -> Dict:
+    """
+    contexts: {subject: [{id, path, text}, ...]} from the RAG retrieve step.
+    Returns strict-JSON tips with optional citations + RAG suggestions.
+    """
+    return gemini_json(*_tips_prompt(subjects, timetable, overbooked, hours_gap, contexts))
+
+async def write_tips_async(
+    subjects: List[Dict],
+    timetable: List[Dict],
+    overbooked: bool,
+    hours_gap: float,
+    contexts: Optional[Dict[str, List[Dict]]] = None,
+) -> Dict:
+    """Same as write_tips, via gemini_json_async (for batch runs)."""
+    return await gemini_json_async(*_tips_prompt(subjects, timetable, overbooked, hours_gap, contexts))
+
+def stream_tips(
+    subjects: List[Dict],
+    timetable: List[Dict],
+    overbooked: bool,
+    hours_gap: float,
+    contexts: Optional[Dict[str, List[Dict]]] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """Same as write_tips, but yields (field, value) as each top-level field completes."""
+    return gemini_json_stream(*_tips_prompt(subjects, timetable, overbooked, hours_gap, contexts))
@@ -0,0 +1,178 @@
+# utils/fake_backend.py
+"""
+Local stand-ins for the Gemini generation and embedding APIs, for load tests
+and offline runs. Selected the same way as the real models:
+
+    GEMINI_MODEL=fake     utils.llm_client talks to FakeModel (no API key needed)
+    EMBED_MODEL=fake      tools.embeddings uses FakeEmbedder (hash vectors, EMBED_HASH_DIM)
+
+Behaviour is injected per API (LLM / EMBED):
+
+    FAKE_LLM_LATENCY_MS     const:800 | uniform:200,1500 | lognormal:800,0.5 (median, sigma) | normal:800,200
+    FAKE_LLM_ERROR_RATE     fraction of calls failing with ServiceUnavailable (503)
+    FAKE_LLM_429_RATE       fraction of calls failing with ResourceExhausted (429)
+    FAKE_LLM_RATE_LIMIT_RPS token bucket (burst = 1s worth); calls over it get 429
+    FAKE_SEED               makes the random draws repeatable
+
+(and the same with FAKE_EMBED_*). Both failures are the retryable kinds the
+real clients already back off on, matched by class name and code.
+"""
+import asyncio, json, math, os, random, threading, time
+from typing import Dict, Iterator, List, Optional
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+class ResourceExhausted(Exception):
+    code = 429
+
+def is_fake(model: Optional[str]) -> bool:
+    return (model or "").lower().startswith("fake")
+
+def parse_latency(spec: str):
+    """'const:50' | 'uniform:a,b' | 'normal:mu,sd' | 'lognormal:median,sigma' (ms) -> sampler(rng) -> seconds."""
+    kind, _, args = (spec or "const:0").partition(":")
+    p = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    kind = kind.strip().lower()
+    if kind == "const":
+        return lambda rng: p[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(p[0], p[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(p[0], p[1])) / 1000
+    if kind == "lognormal":
+        return lambda rng: p[0] * math.exp(rng.gauss(0.0, p[1])) / 1000
+    raise RuntimeError(f"Unknown latency distribution: {spec!r} (use const, uniform, normal or lognormal).")
+
+class FaultInjector:
+    """Latency, errors and rate limiting for one fake API, configured from FAKE_<API>_*."""
+    def __init__(self, api: str):
+        env = lambda k, d: os.getenv(f"FAKE_{api}_{k}", d)
+        self.api = api
+        self.latency = parse_latency(env("LATENCY_MS", "const:0"))
+        self.error_rate = float(env("ERROR_RATE", "0"))
+        self.rate_429 = float(env("429_RATE", "0"))
+        self.rps = float(env("RATE_LIMIT_RPS", "0"))
+        seed = os.getenv("FAKE_SEED")
+        self._rng = random.Random(int(seed) if seed else None)
+        self._lock = threading.Lock()
+        self._tokens, self._last = self.rps, time.monotonic()
+        self.calls = 0
+        self.failures: Dict[str, int] = {"503": 0, "429": 0}
+
+    def _admit(self) -> bool:
+        if self.rps <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.rps, self._tokens + (now - self._last) * self.rps)
+        self._last = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def draw(self) -> float:
+        """Count a call; return its latency (s), or raise the injected failure (after no delay)."""
+        with self._lock:
+            self.calls += 1
+            r = self._rng.random()
+            delay = self.latency(self._rng)
+            if not self._admit() or r < self.rate_429:
+                self.failures["429"] += 1
+                raise ResourceExhausted(f"fake {self.api}: 429 rate limited")
+            if r < self.rate_429 + self.error_rate:
+                self.failures["503"] += 1
+                raise ServiceUnavailable(f"fake {self.api}: 503 unavailable")
+        return delay
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"calls": self.calls, "failures": dict(self.failures)}
+
+_INJECTORS: Dict[str, FaultInjector] = {}
+_INJECTORS_LOCK = threading.Lock()
+
+def injector(api: str) -> FaultInjector:
+    with _INJECTORS_LOCK:
+        if api not in _INJECTORS:
+            _INJECTORS[api] = FaultInjector(api)
+        return _INJECTORS[api]
+
+def reset() -> None:
+    """Forget injectors (re-read FAKE_* on next use)."""
+    with _INJECTORS_LOCK:
+        _INJECTORS.clear()
+
+def stats() -> Dict[str, Dict]:
+    with _INJECTORS_LOCK:
+        return {api: inj.stats() for api, inj in _INJECTORS.items()}
+
+# ----- generation -----
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+def _tips_json(prompt: str) -> str:
+    """A valid tips payload; focus_order lists the subjects found in the prompt's subject table."""
+    names = [line.split("|")[0].strip() for line in prompt.splitlines()
+             if line.count("|") >= 3 and not line.endswith(":")][:8]
+    out = {
+        "study_principles": ["active recall", "spaced repetition", "interleaving"],
+        "focus_order": names,
+        "breaks": {"work": 50, "break": 10},
+        "daily_checklist": [f"Review {n}" for n in names[:3]] or ["Review notes"],
+        "rag_suggestions": [],
+        "citations": [],
+    }
+    if "Overbooked: True" in prompt:
+        out["if_overbooked"] = {"strategy": "hybrid", "actions": ["Trim low-weight topics"]}
+    return json.dumps(out)
+
+class FakeModel:
+    """GenerativeModel look-alike: generate_content (optionally stream=True) and generate_content_async."""
+    def __init__(self, model_name: str = "fake", system_instruction: str = ""):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        delay = injector("LLM").draw()
+        text = _tips_json(prompt)
+        if not stream:
+            time.sleep(delay)
+            return _Response(text)
+        return self._stream(text, delay)
+
+    def _stream(self, text: str, delay: float, parts: int = 4) -> Iterator[_Response]:
+        step = -(-len(text) // parts)
+        for i in range(0, len(text), step):
+            time.sleep(delay / parts)
+            yield _Response(text[i:i + step])
+
+    async def generate_content_async(self, prompt: str):
+        delay = injector("LLM").draw()
+        await asyncio.sleep(delay)
+        return _Response(_tips_json(prompt))
+
+# ----- embeddings -----
+class FakeEmbedder:
+    """Hash-embedding vectors behind the injected latency/failures, one draw per batch request."""
+    def __init__(self, dim: int = 256, batch_size: int = 100, concurrency: int = 4, max_retries: int = 5):
+        from tools.embeddings import HashEmbedder
+        self._hash = HashEmbedder(dim=dim)
+        self.dim = dim
+        self.model = f"fake-{dim}"
+        self.batch_size = max(1, min(batch_size, 100))
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+
+    def _embed_batch(self, batch: List[str]) -> List:
+        time.sleep(injector("EMBED").draw())
+        return self._hash._embed_batch(batch)
+
+    def embed(self, texts: List[str]):
+        import numpy as np
+        from tools.embeddings import embed_in_batches
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        vecs = embed_in_batches(self._embed_batch, texts, self.batch_size, self.concurrency, self.max_retries)
+        return np.vstack(vecs).astype("float32", copy=False)
@@ -0,0 +1,92 @@
+# utils/json_stream.py
+import json
+from typing import Any, List, Tuple
+
+_START, _KEY, _COLON, _VALUE, _AFTER, _DONE = range(6)
+_SPACE = " \t\r\n"
+
+class JsonFieldStream:
+    """
+    Incremental parser for a single JSON object arriving in text chunks.
+    feed() returns the (key, value) pairs of every top-level member that was
+    completed by that chunk, so callers can act on "study_principles" before
+    "citations" has even been generated. Each character is scanned once;
+    consumed text is dropped as members complete. Malformed input raises
+    ValueError.
+    """
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._state = _START
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._start = -1  # start of the current key or value in _text
+        self._key = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        out = []
+        text = self._text + chunk
+        pos, state, depth = self._pos, self._state, self._depth
+        in_str, esc, start = self._in_str, self._esc, self._start
+        n = len(text)
+        while pos < n:
+            c = text[pos]
+            if in_str:
+                if esc:
+                    esc = False
+                elif c == "\\":
+                    esc = True
+                elif c == '"':
+                    in_str = False
+                    if state == _KEY:
+                        self._key = json.loads(text[start:pos + 1])
+                        state = _COLON
+                    elif depth == 0:  # a top-level string value just closed
+                        out.append((self._key, json.loads(text[start:pos + 1])))
+                        state = _AFTER
+                pos += 1
+                continue
+            if state == _VALUE:
+                if start < 0:
+                    if c in _SPACE:
+                        pos += 1
+                        continue
+                    start = pos
+                if c == '"':
+                    in_str = True
+                elif c in "[{":
+                    depth += 1
+                elif depth > 0 and c in "]}":
+                    depth -= 1
+                    if depth == 0:
+                        out.append((self._key, json.loads(text[start:pos + 1])))
+                        state = _AFTER
+                elif depth == 0 and c in ",}":  # end of a number / true / false / null
+                    out.append((self._key, json.loads(text[start:pos])))
+                    state = _KEY if c == "," else _DONE
+            elif c in _SPACE:
+                pass
+            elif state == _START and c == "{":
+                state = _KEY
+            elif state == _KEY and c == '"':
+                in_str, start = True, pos
+            elif state == _KEY and c == "}" and self._key is None:
+                state = _DONE  # empty object
+            elif state == _COLON and c == ":":
+                state, start = _VALUE, -1
+            elif state == _AFTER and c in ",}":
+                state = _KEY if c == "," else _DONE
+            else:
+                raise ValueError(f"Unexpected {c!r} in JSON stream")
+            if state in (_AFTER, _DONE) and depth == 0 and not in_str:
+                # drop everything consumed so far; nothing before pos is needed again
+                text, pos, start, n = text[pos + 1:], -1, -1, n - pos - 1
+            pos += 1
+        self._text, self._pos, self._state, self._depth = text, pos, state, depth
+        self._in_str, self._esc, self._start = in_str, esc, start
+        return out
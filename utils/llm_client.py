@@ -1,36 +1,205 @@
 # utils/llm_client.py
-import os, json
+import os, json, time, random, asyncio, threading, weakref
+from typing import Any, Dict, Iterator, Optional, Tuple
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except Exception:
     pass
 
-import google.generativeai as genai
+from utils.json_stream import JsonFieldStream
+from utils.fake_backend import FakeModel, is_fake
+from utils.response_cache import get_response_cache
+from utils.retry import is_retryable
+from utils import telemetry
+from utils.telemetry import span
 
 _GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# google.generativeai takes most of a second to import; load it on first model use
+genai = None
+_MODEL_POOL_MAX = 32
+
+# configured GenerativeModel objects, reused across calls
+_MODELS: Dict[Tuple[str, str], "genai.GenerativeModel"] = {}
+_MODELS_LOCK = threading.Lock()
+_CONFIGURED_KEY: Optional[str] = None
+# asyncio primitives belong to one event loop, so keep one semaphore per loop
+_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def _genai():
+    global genai
+    if genai is None:
+        import google.generativeai
+        genai = google.generativeai
+    return genai
 
 def _get_model(system_instruction: str = ""):
+    """
+    Pooled model per (model name, system instruction). genai.configure runs
+    only when the API key changes, not on every call. GEMINI_MODEL=fake gives
+    the local stand-in (utils.fake_backend) instead.
+    """
+    global _CONFIGURED_KEY
+    if is_fake(_GEMINI_MODEL):
+        return FakeModel(_GEMINI_MODEL, system_instruction)
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise RuntimeError("GOOGLE_API_KEY is not set. Put it in a .env file or your shell env.")
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel(
-        model_name=_GEMINI_MODEL,
-        system_instruction=system_instruction,
-        generation_config={
-            "response_mime_type": "application/json",
-            "temperature": 0
-        }
-    )
+    key = (_GEMINI_MODEL, system_instruction)
+    genai = _genai()
+    with _MODELS_LOCK:
+        if api_key != _CONFIGURED_KEY:
+            genai.configure(api_key=api_key)
+            _CONFIGURED_KEY = api_key
+            _MODELS.clear()
+        model = _MODELS.get(key)
+        if model is None:
+            if len(_MODELS) >= _MODEL_POOL_MAX:
+                _MODELS.pop(next(iter(_MODELS)))  # oldest first
+            model = _MODELS[key] = genai.GenerativeModel(
+                model_name=_GEMINI_MODEL,
+                system_instruction=system_instruction,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "temperature": 0
+                }
+            )
+    return model
+
+def _parse(system_prompt: str, user_prompt: str, text: str, latency: float) -> dict:
+    try:
+        out = json.loads(text)
+    except Exception:
+        return {"error": "Invalid JSON from Gemini", "raw": text}
+    cache = get_response_cache()
+    if cache is not None:
+        cache.put(_GEMINI_MODEL, system_prompt, user_prompt, text, latency)
+    return out
+
+def _cached(system_prompt: str, user_prompt: str) -> Optional[dict]:
+    cache = get_response_cache()
+    return cache.get(_GEMINI_MODEL, system_prompt, user_prompt) if cache is not None else None
 
 def gemini_json(system_prompt: str, user_prompt: str) -> dict:
     """
     Calls Gemini and enforces JSON response (via response_mime_type).
+    Identical (model, system, user) prompts are served from the response cache;
+    responses that fail to parse are never cached. Rate-limit/unavailable
+    errors are retried like gemini_json_async (LLM_MAX_RETRIES, 3).
     """
-    model = _get_model(system_prompt)
-    resp = model.generate_content(user_prompt)
+    with span("llm.gemini_json", prompt_chars=len(system_prompt) + len(user_prompt), model=_GEMINI_MODEL) as sp:
+        hit = _cached(system_prompt, user_prompt)
+        sp["cache_hit"] = int(hit is not None)
+        if hit is not None:
+            return hit
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        model = _get_model(system_prompt)
+        for attempt in range(max_retries + 1):
+            sp["attempts"] = attempt + 1
+            try:
+                t = time.perf_counter()
+                resp = model.generate_content(user_prompt)
+                sp["response_chars"] = len(resp.text)
+                return _parse(system_prompt, user_prompt, resp.text, time.perf_counter() - t)
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e):
+                    raise
+                telemetry.incr("retry.llm")
+                time.sleep(0.5 * (2 ** attempt) * (0.5 + random.random()))
+        return {}  # unreachable
+
+def gemini_json_stream(system_prompt: str, user_prompt: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming gemini_json: yields (field, value) for each top-level field as
+    soon as it is complete. Collecting the pairs into a dict gives the same
+    result as gemini_json, including the {"error", "raw"} fields on bad JSON.
+    """
+    # the span is current only while this generator works, not while the consumer handles a field
+    rec = telemetry.start_span("llm.gemini_json_stream", prompt_chars=len(system_prompt) + len(user_prompt),
+                               model=_GEMINI_MODEL)
+    sp, error = rec["attributes"], None
     try:
-        return json.loads(resp.text)
-    except Exception:
-        return {"error": "Invalid JSON from Gemini", "raw": resp.text}
+        with telemetry.resume(rec):
+            hit = _cached(system_prompt, user_prompt)
+            sp["cache_hit"] = int(hit is not None)
+        if hit is not None:
+            yield from hit.items()
+            return
+        with telemetry.resume(rec):
+            t = time.perf_counter()
+            chunks = iter(_get_model(system_prompt).generate_content(user_prompt, stream=True))
+        parser = JsonFieldStream()
+        parts = []
+        ok = True
+        while True:
+            with telemetry.resume(rec):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                parts.append(chunk.text)
+                fields = []
+                if ok:
+                    try:
+                        fields = parser.feed(chunk.text)
+                    except ValueError:
+                        ok = False
+                    if fields and "first_field_ms" not in sp:
+                        sp["first_field_ms"] = round((time.perf_counter() - t) * 1000, 1)
+            yield from fields
+        text = "".join(parts)
+        sp["response_chars"] = len(text)
+        if ok and parser.done:
+            cache = get_response_cache()
+            if cache is not None:
+                cache.put(_GEMINI_MODEL, system_prompt, user_prompt, text, time.perf_counter() - t)
+        else:
+            yield "error", "Invalid JSON from Gemini"
+            yield "raw", text
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        telemetry.end_span(rec, error)
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _SEMAPHORES.get(loop)
+    if sem is None:
+        sem = _SEMAPHORES[loop] = asyncio.Semaphore(max(1, int(os.getenv("LLM_CONCURRENCY", "8"))))
+    return sem
+
+async def gemini_json_async(
+    system_prompt: str,
+    user_prompt: str,
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    base_delay: float = 0.5,
+) -> dict:
+    """
+    Async gemini_json. At most LLM_CONCURRENCY (8) requests are in flight per
+    event loop. Each attempt is cut off after `timeout` seconds (LLM_TIMEOUT, 60);
+    timeouts and rate-limit/unavailable errors are retried up to `max_retries`
+    times (LLM_MAX_RETRIES, 3) with jittered exponential backoff.
+    """
+    with span("llm.gemini_json_async", prompt_chars=len(system_prompt) + len(user_prompt), model=_GEMINI_MODEL) as sp:
+        hit = _cached(system_prompt, user_prompt)
+        sp["cache_hit"] = int(hit is not None)
+        if hit is not None:
+            return hit
+        timeout = float(os.getenv("LLM_TIMEOUT", "60")) if timeout is None else timeout
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", "3")) if max_retries is None else max_retries
+        model = _get_model(system_prompt)
+        for attempt in range(max_retries + 1):
+            sp["attempts"] = attempt + 1
+            try:
+                async with _semaphore():  # backoff sleeps happen outside, so they don't hold a slot
+                    t = time.perf_counter()
+                    resp = await asyncio.wait_for(model.generate_content_async(user_prompt), timeout)
+                sp["response_chars"] = len(resp.text)
+                return _parse(system_prompt, user_prompt, resp.text, time.perf_counter() - t)
+            except Exception as e:
+                if attempt >= max_retries or not (isinstance(e, asyncio.TimeoutError) or is_retryable(e)):
+                    raise
+                telemetry.incr("retry.llm")
+                await asyncio.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+        return {}  # unreachable
@@ -0,0 +1,133 @@
+# utils/response_cache.py
+import os, sqlite3, hashlib, json, threading, time
+from collections import OrderedDict
+from typing import Optional
+
+def _key(model: str, system: str, user: str) -> bytes:
+    # whitespace-normalized: re-indented prompt templates still hit
+    norm = "\x00".join((model, " ".join(system.split()), " ".join(user.split())))
+    return hashlib.sha256(norm.encode("utf-8")).digest()
+
+class ResponseCache:
+    """
+    Persistent cache of LLM JSON responses keyed by (model, system prompt,
+    sha256 of the normalized user prompt). Rows older than `ttl` seconds are
+    treated as misses (ttl <= 0 keeps them forever); least-recently-used rows
+    are evicted beyond `max_entries`. A small in-process LRU sits in front of
+    SQLite so repeat hits skip the database entirely.
+    Each row remembers how long the original call took, so hits can report
+    the latency they saved.
+    """
+    def __init__(self, path: str, max_entries: int = 10_000, ttl: float = 7 * 86400, memory_entries: int = 512):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._hit_seconds = 0.0
+        self._mem = OrderedDict()  # key -> (text, created, latency)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key BLOB PRIMARY KEY, model TEXT NOT NULL, body TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL, latency REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        self._db.commit()
+
+    def _fresh(self, created: float, now: float) -> bool:
+        return self.ttl <= 0 or now - created <= self.ttl
+
+    def get(self, model: str, system: str, user: str) -> Optional[dict]:
+        t = time.perf_counter()
+        key = _key(model, system, user)
+        now = time.time()
+        with self._lock:
+            row = self._mem.get(key)
+            if row is not None and self._fresh(row[1], now):
+                self._mem.move_to_end(key)
+            else:
+                self._mem.pop(key, None)
+                row = self._db.execute(
+                    "SELECT body, created, latency FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._fresh(row[1], now):
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    return None
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._remember(key, row)
+            out = json.loads(row[0])  # fresh object per hit, callers may mutate it
+            self.hits += 1
+            self.seconds_saved += row[2]
+            self._hit_seconds += time.perf_counter() - t
+        return out
+
+    def put(self, model: str, system: str, user: str, body: str, latency: float = 0.0) -> None:
+        """Store a raw JSON response body. Bodies that don't parse are not cached."""
+        try:
+            json.loads(body)
+        except ValueError:
+            return
+        key = _key(model, system, user)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, model, body, now, now, latency))
+            n = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if n > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN"
+                    " (SELECT key FROM responses ORDER BY last_used LIMIT ?)", (n - self.max_entries,))
+                self._mem.clear()  # cheaper than working out which evicted keys were hot
+            self._db.commit()
+            self._remember(key, (body, now, latency))
+
+    def _remember(self, key: bytes, row) -> None:
+        self._mem[key] = tuple(row)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._mem.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            hits, misses, saved, hit_seconds = self.hits, self.misses, self.seconds_saved, self._hit_seconds
+        total = hits + misses
+        return {"entries": n, "hits": hits, "misses": misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "seconds_saved": round(saved, 3),
+                "avg_hit_us": round(hit_seconds / hits * 1e6, 1) if hits else 0.0}
+
+_CACHES = {}
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Shared cache selected by env:
+      LLM_CACHE=1 (default) | 0 to disable
+      LLM_CACHE_PATH (.cache/llm.sqlite), LLM_CACHE_MAX_ENTRIES (10000),
+      LLM_CACHE_TTL seconds (604800 = 7 days; 0 = never expire)
+    """
+    if os.getenv("LLM_CACHE", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    path = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm.sqlite"))
+    if path not in _CACHES:
+        _CACHES[path] = ResponseCache(path, int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+                                      float(os.getenv("LLM_CACHE_TTL", str(7 * 86400))))
+    return _CACHES[path]
@@ -0,0 +1,14 @@
+# utils/retry.py
+"""Which API errors are worth retrying, shared by the embedding and LLM clients."""
+
+# matched by class name so we don't have to import google.api_core
+RETRYABLE = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "DeadlineExceeded", "InternalServerError", "RateLimitError",
+}
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, overloads and timeouts (by class name or HTTP code 429/503)."""
+    if any(cls.__name__ in RETRYABLE for cls in type(exc).__mro__):
+        return True
+    return getattr(exc, "code", None) in (429, 503)
@@ -0,0 +1,254 @@
+# utils/telemetry.py
+"""
+In-process tracing and latency histograms.
+
+    with span("embed", texts=len(texts)) as sp:
+        ...
+        sp["cache_hits"] = hits
+
+Every span records its wall time into a histogram keyed by span name, plus one
+histogram per numeric attribute (payload sizes, cache hits, ...). Finished
+spans are kept in a bounded buffer with trace/parent ids (OpenTelemetry-style)
+and, if TELEMETRY_SPANS_FILE is set, appended to that file as JSONL.
+incr() counts events that aren't spans (retries). prometheus_text() renders
+everything in the Prometheus exposition format.
+TELEMETRY=0 turns spans into no-ops.
+
+Generators must not hold a span open across a yield: the span would stay the
+"current" one while the consumer runs, and become the parent of its spans.
+They use start_span() / resume() around each stretch of their own work and
+end_span() once, when they finish or are closed.
+"""
+import bisect, contextvars, json, os, secrets, threading, time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# seconds, Prometheus client defaults plus a couple of slow LLM buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# counts / sizes (texts, bytes, hits): 1-2-5 steps up to 10M
+SIZE_BUCKETS = tuple(m * 10 ** e for e in range(7) for m in (1, 2, 5)) + (10_000_000,)
+MAX_SPANS = 10_000
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics: le = upper bound)."""
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.count += 1
+        self.sum += v
+
+    def snapshot(self) -> "Histogram":
+        h = Histogram(self.buckets)
+        h.counts, h.count, h.sum = list(self.counts), self.count, self.sum
+        return h
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if it's the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+_LOCK = threading.Lock()
+_FILE_LOCK = threading.Lock()  # only orders whole lines in TELEMETRY_SPANS_FILE; never held with _LOCK
+_LATENCY: Dict[str, Histogram] = {}
+_ATTRS: Dict[Tuple[str, str], Histogram] = {}
+_ERRORS: Dict[str, int] = {}
+_COUNTERS: Dict[str, int] = {}
+_SPANS: "deque[Dict]" = deque(maxlen=MAX_SPANS)
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("telemetry_span", default=None)
+
+def enabled() -> bool:
+    return os.getenv("TELEMETRY", "1").lower() not in ("0", "false", "no", "off")
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict]:
+    """
+    Time a block. Yields the attribute dict so the body can add results
+    (sizes, cache hits) before the span closes. Nested spans share a trace id.
+    """
+    rec = start_span(name, **attrs)
+    error = None
+    try:
+        with resume(rec):
+            yield rec["attributes"]
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        end_span(rec, error)
+
+def start_span(name: str, **attrs) -> Dict:
+    """
+    Open a span without making it current (child of the current span, if any).
+    Work inside `with resume(rec):` is attributed to it; close it with end_span().
+    """
+    if not enabled():
+        return {"attributes": attrs, "_off": True}
+    parent = _CURRENT.get()
+    return {
+        "trace_id": parent["trace_id"] if parent else secrets.token_hex(16),
+        "span_id": secrets.token_hex(8),
+        "parent_span_id": parent["span_id"] if parent else None,
+        "name": name,
+        "start_time_unix_nano": time.time_ns(),
+        "attributes": attrs,
+        "status": "OK",
+        "_t0": time.perf_counter(),
+    }
+
+@contextmanager
+def resume(rec: Dict) -> Iterator[Dict]:
+    """Make a span from start_span() current for the block (never across a yield)."""
+    if rec.get("_off"):
+        yield rec["attributes"]
+        return
+    token = _CURRENT.set(rec)
+    try:
+        yield rec["attributes"]
+    finally:
+        _CURRENT.reset(token)
+
+def end_span(rec: Dict, error: Optional[BaseException] = None) -> None:
+    """
+    Close and record a span. GeneratorExit (a consumer that stopped reading
+    early) isn't an error.
+    """
+    if rec.pop("_off", False) or "_t0" not in rec:
+        return
+    elapsed = time.perf_counter() - rec.pop("_t0")
+    if error is not None and not isinstance(error, GeneratorExit):
+        rec["status"] = "ERROR"
+        rec["attributes"]["error"] = type(error).__name__
+    rec["end_time_unix_nano"] = rec["start_time_unix_nano"] + int(elapsed * 1e9)
+    rec["duration_ms"] = round(elapsed * 1000, 3)
+    _record(rec, elapsed)
+
+def _record(rec: Dict, elapsed: float) -> None:
+    name = rec["name"]
+    with _LOCK:
+        h = _LATENCY.get(name)
+        if h is None:
+            h = _LATENCY[name] = Histogram(LATENCY_BUCKETS)
+        h.observe(elapsed)
+        for k, v in rec["attributes"].items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                a = _ATTRS.get((name, k))
+                if a is None:
+                    a = _ATTRS[(name, k)] = Histogram(SIZE_BUCKETS)
+                a.observe(v)
+        if rec["status"] != "OK":
+            _ERRORS[name] = _ERRORS.get(name, 0) + 1
+        _SPANS.append(rec)
+    path = os.getenv("TELEMETRY_SPANS_FILE")
+    if path:
+        # serialize and write after releasing _LOCK, so slow disks don't stall every other span
+        line = json.dumps(rec, default=str) + "\n"
+        with _FILE_LOCK, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+def incr(name: str, n: int = 1) -> None:
+    """Add n to a named event counter (no-op with TELEMETRY=0)."""
+    if not enabled():
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+def counters() -> Dict[str, int]:
+    with _LOCK:
+        return dict(_COUNTERS)
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def wrap(fn):
+        @wraps(fn)
+        def run(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+def current_trace_id() -> Optional[str]:
+    cur = _CURRENT.get()
+    return cur["trace_id"] if cur else None
+
+def spans(trace_id: Optional[str] = None) -> List[Dict]:
+    """Finished spans (oldest first), optionally only those of one trace."""
+    with _LOCK:
+        out = list(_SPANS)
+    return [s for s in out if trace_id is None or s["trace_id"] == trace_id]
+
+def export_spans(path: str, trace_id: Optional[str] = None) -> int:
+    """Write finished spans as JSONL (one OpenTelemetry-style span per line). Returns the count."""
+    rows = spans(trace_id)
+    with open(path, "w", encoding="utf-8") as f:
+        for s in rows:
+            f.write(json.dumps(s, default=str) + "\n")
+    return len(rows)
+
+def summary() -> Dict[str, Dict]:
+    """Per span name: calls, errors, total/mean seconds and p50/p95 bucket bounds (ms)."""
+    with _LOCK:
+        items = [(k, h.count, h.sum, h.quantile(0.5), h.quantile(0.95)) for k, h in _LATENCY.items()]
+        errors = dict(_ERRORS)
+    return {k: {"calls": n, "errors": errors.get(k, 0), "total_s": round(s, 4),
+                "mean_ms": round(s / n * 1000, 3) if n else 0.0,
+                "p50_ms": p50 * 1000, "p95_ms": p95 * 1000}
+            for k, n, s, p50, p95 in items}
+
+def _escape(v) -> str:
+    """Label value escaping from the exposition format: backslash, double quote, newline."""
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**kv) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kv.items()) + "}"
+
+def _hist_lines(metric: str, h: Histogram, labels: Dict) -> List[str]:
+    out, cum = [], 0
+    for b, c in zip(h.buckets + (float("inf"),), h.counts):
+        cum += c
+        out.append(f"{metric}_bucket{_labels(**labels, le='+Inf' if b == float('inf') else f'{b:g}')} {cum}")
+    out.append(f"{metric}_sum{_labels(**labels)} {h.sum:g}")
+    out.append(f"{metric}_count{_labels(**labels)} {h.count}")
+    return out
+
+def prometheus_text() -> str:
+    """All histograms and error counters in the Prometheus text exposition format."""
+    with _LOCK:  # copies: spans keep landing in the live histograms while the text is built
+        lat = sorted((k, h.snapshot()) for k, h in _LATENCY.items())
+        attrs = sorted((k, h.snapshot()) for k, h in _ATTRS.items())
+        errors = sorted(_ERRORS.items())
+        counts = sorted(_COUNTERS.items())
+    lines = ["# HELP study_span_duration_seconds Wall time per instrumented span.",
+             "# TYPE study_span_duration_seconds histogram"]
+    for name, h in lat:
+        lines += _hist_lines("study_span_duration_seconds", h, {"span": name})
+    lines += ["# HELP study_span_attribute Numeric span attributes (payload sizes, cache hits).",
+              "# TYPE study_span_attribute histogram"]
+    for (name, attr), h in attrs:
+        lines += _hist_lines("study_span_attribute", h, {"span": name, "attr": attr})
+    lines += ["# HELP study_span_errors_total Spans that ended with an exception.",
+              "# TYPE study_span_errors_total counter"]
+    lines += [f"study_span_errors_total{_labels(span=name)} {n}" for name, n in errors]
+    lines += ["# HELP study_events_total Counted events (retries, ...).", "# TYPE study_events_total counter"]
+    lines += [f"study_events_total{_labels(event=name)} {n}" for name, n in counts]
+    return "\n".join(lines) + "\n"
+
+def reset() -> None:
+    with _LOCK:
+        _LATENCY.clear()
+        _ATTRS.clear()
+        _ERRORS.clear()
+        _COUNTERS.clear()
+        _SPANS.clear()